@@ -0,0 +1,210 @@
+# batch.py
+"""
+Batch mode: run a JSONL file of instructions through the compiled agent.
+
+Each input line is an object with an "instruction" (or "user_input") and
+optionally an "id" and a conversation "thread_id". Every line gets its own
+checkpoint thread, so a crash loses at most the lines in flight: on restart,
+lines already written to the output with status "ok" are skipped, and a line
+whose checkpoint already reached the review is recovered without re-running.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from src.utils import run_options
+
+def read_instructions(input_path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line number, item) for each non-empty line; invalid lines yield an "error" item."""
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                item = {"error": f"invalid JSON: {e}"}
+            if isinstance(item, str):
+                item = {"instruction": item}
+            if not isinstance(item, dict):
+                item = {"error": "expected a JSON object"}
+            yield line_no, item
+
+def finished_ids(out_path: str) -> Set[str]:
+    """IDs already written with status "ok" (a truncated last line is ignored)."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    # A crash can cut the last line inside a multibyte character
+    with open(out_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "ok":
+                done.add(str(record.get("id")))
+    return done
+
+def run_prefix_for(input_path: str, out_path: str) -> str:
+    """
+    Checkpoint thread prefix of a batch: the input name plus a hash of both
+    absolute paths, so batches with the same file name never share threads.
+    """
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    paths = f"{os.path.abspath(input_path)}|{os.path.abspath(out_path)}"
+    return f"batch-{name}-{hashlib.sha256(paths.encode('utf-8')).hexdigest()[:12]}"
+
+def terminate_last_line(path: str):
+    """Terminate a line truncated by a crash so the next record starts cleanly."""
+    if not os.path.exists(path):
+        return
+    # Binary: the cut may fall inside a multibyte character
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+def _record(item_id: str, checkpoint_id: str, instruction: str, values: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": item_id,
+        "checkpoint_thread_id": checkpoint_id,
+        "instruction": instruction,
+        "status": "ok",
+        "intent": values.get("intent"),
+        "draft": values.get("draft"),
+        "subject": (values.get("draft_metadata") or {}).get("subject"),
+        "review_approved": values.get("review_approved"),
+        "review_issues": values.get("review_issues", []),
+        "review_suggestions": values.get("review_suggestions", []),
+    }
+
+def run_instruction(
+    app,
+    item_id: str,
+    item: Dict[str, Any],
+    run_prefix: str = "batch",
+    callbacks: Optional[List[Any]] = None
+) -> Dict[str, Any]:
+    """
+    Run one instruction until the review pause and return its output record.
+
+    Node timings are the wall-clock time between consecutive node updates of
+    the graph stream.
+    """
+    instruction = item.get("instruction") or item.get("user_input") or ""
+    checkpoint_id = f"{run_prefix}:{item_id}"
+    config: Dict[str, Any] = {"configurable": {"thread_id": checkpoint_id}}
+    if callbacks:
+        config["callbacks"] = callbacks
+
+    # A previous run may have reached the review before the crash
+    snap = app.get_state(config)
+    values = getattr(snap, "values", None) or {}
+    if "review_approved" in values:
+        record = _record(item_id, checkpoint_id, instruction, values)
+        record.update({"timings": {}, "total_seconds": 0.0, "recovered": True})
+        return record
+
+    inputs = {"user_input": instruction, "history": [], "step_count": 0}
+    if item.get("thread_id"):
+        inputs["thread_id"] = item["thread_id"]
+
+    timings: Dict[str, float] = {}
+    start = last = time.perf_counter()
+    # Resume from the checkpoint if a previous run stopped mid-graph
+    resume = bool(values) and bool(getattr(snap, "next", ()))
+    for chunk in app.stream(None if resume else inputs, config=config, stream_mode="updates", **run_options(app)):
+        now = time.perf_counter()
+        for node in chunk:
+            if not node.startswith("__"):
+                timings[node] = round(timings.get(node, 0.0) + now - last, 4)
+        last = now
+
+    values = getattr(app.get_state(config), "values", {}) or {}
+    record = _record(item_id, checkpoint_id, instruction, values)
+    record.update({"timings": timings, "total_seconds": round(time.perf_counter() - start, 4)})
+    return record
+
+def run_batch(
+    app,
+    input_path: str,
+    out_path: str,
+    workers: int = 4,
+    langfuse_handler=None
+) -> Dict[str, int]:
+    """
+    Run every instruction of `input_path` with a bounded worker pool.
+
+    Records are appended to `out_path` as they complete (one JSON object per
+    line, flushed and synced), so the file is always a valid resume point.
+
+    Returns:
+        Counters: {"total", "skipped", "ok", "error"}
+    """
+    done = finished_ids(out_path)
+    run_prefix = run_prefix_for(input_path, out_path)
+    callbacks = [langfuse_handler] if langfuse_handler else None
+
+    pending = []
+    counts = {"total": 0, "skipped": 0, "ok": 0, "error": 0}
+    for line_no, item in read_instructions(input_path):
+        counts["total"] += 1
+        item_id = str(item.get("id", line_no))
+        if item_id in done:
+            counts["skipped"] += 1
+            continue
+        pending.append((line_no, item_id, item))
+
+    if counts["skipped"]:
+        print(f"⏭️  Skipping {counts['skipped']} finished line(s) from {out_path}")
+    print(f"📦 Batch: {len(pending)} instruction(s), {workers} worker(s)")
+
+    write_lock = threading.Lock()
+    terminate_last_line(out_path)
+    with open(out_path, "a", encoding="utf-8") as out:
+        def write(record: Dict[str, Any]):
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+
+        def work(line_no: int, item_id: str, item: Dict[str, Any]) -> Dict[str, Any]:
+            if "error" in item:
+                raise ValueError(item["error"])
+            if not (item.get("instruction") or item.get("user_input")):
+                raise ValueError("missing \"instruction\"")
+            return run_instruction(app, item_id, item, run_prefix, callbacks)
+
+        executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="email-batch")
+        try:
+            futures = {executor.submit(work, *job): job for job in pending}
+            for finished, future in enumerate(as_completed(futures), start=1):
+                line_no, item_id, _ = futures[future]
+                try:
+                    record = future.result()
+                    record["line"] = line_no
+                    counts["ok"] += 1
+                    print(f"✅ [{finished}/{len(pending)}] {item_id} ({record['total_seconds']:.1f}s)")
+                except Exception as e:
+                    record = {"id": item_id, "line": line_no, "status": "error", "error": str(e)}
+                    counts["error"] += 1
+                    print(f"❌ [{finished}/{len(pending)}] {item_id}: {e}")
+                write(record)
+        except KeyboardInterrupt:
+            print("\n⏹️  Interrupted; finished lines are saved, rerun to resume.")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+
+    print(f"📦 Batch done: {counts['ok']} ok, {counts['error']} error(s), {counts['skipped']} skipped")
+    return counts
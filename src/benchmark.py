@@ -0,0 +1,613 @@
+# benchmark.py
+"""
+Offline benchmark of the compiled graph.
+
+The real graph from `build_workflow` runs end to end with deterministic
+stand-ins for the external services: a scripted chat model with configurable
+latency, a hashing embedder and a fake search tool, so no API key is needed.
+Scenarios cover every intent (plus a NEW_EMAIL that needs web search).
+
+The report (JSON) holds throughput, end-to-end and per-node latency
+percentiles, checkpoint DB growth and peak memory. Regression checks compare
+it against absolute thresholds and/or a baseline report; the exit code is 1
+when one fails.
+
+Usage:
+    python -m src.benchmark --requests 40 --concurrency 4 --out bench.json
+    python -m src.benchmark --baseline bench.json --tolerance 0.15
+    python -m src.benchmark --thresholds thresholds.json
+        {"throughput_rps": {"min": 5}, "latency.all.p95": {"max": 2.0},
+         "nodes.drafter.p95": {"max": 0.5}, "memory.peak_rss_mb": {"max": 600}}
+    python -m src.benchmark --cassette prod.jsonl.gz --cassette-timing recorded \
+        --instructions instructions.jsonl
+
+With --cassette, LLM and search calls are answered from a cassette recorded in
+production (see cassette.py): exact prompts first, else the next recorded
+response of the same node, so response sizes and (with recorded timing)
+latencies are the production ones. Calls the cassette cannot answer fall back
+to the stand-ins; embeddings always stay local.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
+
+try:
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, BaseMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+except Exception:
+    raise ImportError("Missing dependency: langchain-core. Try: pip install langchain-core")
+
+from src.utils import build_workflow, get_checkpointer, get_async_checkpointer, run_options
+from src.vector_db import get_vector_store, BM25Index, lexical_tokens
+from src.retrieval import CorpusDirectory
+from src.intent import IntentClassifier
+from src.llm_cache import LLMCache
+from src.search_cache import SearchCache, CachedSearchTool
+from src.review_rules import ReviewRules
+from src.metrics import NodeMetrics, percentile
+from src.batch import read_instructions
+from src.checkpointer import DURABILITY_MODES
+from src.cassette import Cassette, CassetteChatModel, CassetteSearchTool, CASSETTE_TIMINGS
+
+# (name, instruction) - one scenario per intent, plus a web-search email
+SCENARIOS: List[Tuple[str, str]] = [
+    ("reply", "Reply to Sophie to confirm the Q4 meeting and the slides"),
+    ("new_email", "Write an email to Mathias about the next milestones of project X"),
+    ("new_email_web", "Write an email to a client about the latest news from Microsoft"),
+    ("summarize", "Summarize the conversation with Mme Rossi about the contract renewal"),
+]
+
+# Metrics compared with --baseline: (dotted path, True if higher is better)
+BASELINE_METRICS: List[Tuple[str, bool]] = [
+    ("throughput_rps", True),
+    ("latency.all.p50", False),
+    ("latency.all.p95", False),
+    ("latency.all.p99", False),
+    ("checkpoint.bytes_per_request", False),
+    ("memory.peak_rss_mb", False),
+]
+
+# --- Stand-ins ---------------------------------------------------------
+
+def _user_request(prompt: str) -> str:
+    match = re.search(r"User (?:request|instruction): \"?(.+?)\"?\n", prompt)
+    return match.group(1) if match else ""
+
+def scripted_response(prompt: str) -> str:
+    """Deterministic answer to each prompt of the graph, recognised by its wording."""
+    request = _user_request(prompt)
+    lowered = request.lower()
+    if "classify it into" in prompt:
+        if re.search(r"\b(summar|recap)", lowered):
+            return "SUMMARIZE_THREAD"
+        return "REPLY_EMAIL" if re.search(r"\b(reply|respond|answer)\b", lowered) else "NEW_EMAIL"
+    if "You are a decision agent" in prompt:
+        return "YES" if re.search(r"\b(latest|news|recent|current)\b", lowered) else "NO"
+    if "generate an optimal web search query" in prompt:
+        return " ".join(re.findall(r"(?<!^)\b[A-Z][a-z]+", request)[:3] + ["latest", "news"])
+    if "Review the following email draft" in prompt:
+        return "APPROVED: yes\nISSUES: none\nSUGGESTIONS: none"
+    if "Summarize the following email conversation" in prompt:
+        return (
+            "Main topics: contract renewal terms and the updated pricing grid.\n"
+            "Key decisions: the renewal is accepted for twelve months.\n"
+            "Deadlines: signed documents are expected by the end of the month.\n"
+            "Next steps: legal reviews the final version and sends it for signature."
+        )
+    topic = request[:80] or "our recent exchange"
+    return (
+        f"Subject: Follow-up: {topic}\n\n"
+        f"Hello,\n\n"
+        f"Thank you for your message. Following your request ({topic}), here is a short update: "
+        f"the points we discussed are confirmed and the next steps are planned for the coming weeks. "
+        f"Let me know if you need anything else before then.\n\n"
+        f"Best regards,\nThe team"
+    )
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that answers with `scripted_response` after a simulated delay
+    (`latency` seconds per call plus `seconds_per_token` per output token).
+    """
+
+    model_name: str = "scripted"
+    temperature: float = 0.0
+    latency: float = 0.05
+    seconds_per_token: float = 0.0
+    calls: int = 0
+    _calls_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _result(self, messages: List[BaseMessage]) -> Tuple[ChatResult, float]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        content = scripted_response(prompt)
+        output_tokens = max(1, len(content) // 4)
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": max(1, len(prompt) // 4),
+                "output_tokens": output_tokens,
+                "total_tokens": max(1, len(prompt) // 4) + output_tokens,
+            }
+        )
+        with self._calls_lock:
+            self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=message)]), self.latency + self.seconds_per_token * output_tokens
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result, delay = self._result(messages)
+        time.sleep(delay)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result, delay = self._result(messages)
+        await asyncio.sleep(delay)
+        return result
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashing embedder over words and word bigrams (deterministic, offline)."""
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}"
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = lexical_tokens(text)
+        vector = [0.0] * self.dimensions
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector))
+        return [x / norm for x in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+class FakeSearchTool:
+    """Search tool returning deterministic Tavily-shaped results after a delay."""
+
+    name = "web_search"
+
+    def __init__(self, latency: float = 0.1, results: int = 5):
+        self.latency = latency
+        self.results = results
+        self.calls = 0
+
+    def _results(self, tool_input: Any) -> Dict[str, Any]:
+        query = tool_input.get("query", "") if isinstance(tool_input, dict) else str(tool_input)
+        self.calls += 1
+        return {"query": query, "results": [
+            {
+                "url": f"https://news.example.com/{i}",
+                "title": f"{query} - article {i}",
+                "content": " ".join(
+                    f"Paragraph {p} of article {i} about {query}: the company announced new products, "
+                    f"partnerships and quarterly figures, analysts expect further growth."
+                    for p in range(6)
+                ),
+            }
+            for i in range(self.results)
+        ]}
+
+    def invoke(self, tool_input: Any, config=None, **kwargs) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return self._results(tool_input)
+
+    async def ainvoke(self, tool_input: Any, config=None, **kwargs) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        return self._results(tool_input)
+
+# --- Harness -----------------------------------------------------------
+
+def _db_bytes(db_path: str) -> int:
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4) if ordered else 0.0,
+        "p50": round(percentile(ordered, 50), 4),
+        "p95": round(percentile(ordered, 95), 4),
+        "p99": round(percentile(ordered, 99), 4),
+    }
+
+def build_benchmark_workflow(
+    work_dir: str,
+    data_dir: str = "data/vector_data",
+    llm_latency: float = 0.05,
+    seconds_per_token: float = 0.0,
+    search_latency: float = 0.1,
+    enable_llm_cache: bool = False,
+    enable_search_cache: bool = False,
+    use_async: bool = False,
+    cassette: Optional[Cassette] = None
+):
+    """
+    Build the real workflow on the offline stand-ins (behind `cassette` if given).
+
+    Returns:
+        (workflow, services) where services holds "llm", "search", "metrics"
+    """
+    embeddings = HashingEmbeddings()
+    lexical_index = BM25Index()
+    vector_store = get_vector_store(
+        persist_directory=os.path.join(work_dir, "chroma"),
+        data_dir=data_dir,
+        embedding_cache_dir=os.path.join(work_dir, "embedding_cache"),
+        lexical_index=lexical_index,
+        embeddings=embeddings
+    )
+    llm = ScriptedChatModel(latency=llm_latency, seconds_per_token=seconds_per_token)
+    search = FakeSearchTool(latency=search_latency)
+    llm_tool = CassetteChatModel(llm, cassette) if cassette else llm
+    search_tool = CassetteSearchTool(search, cassette) if cassette else search
+    if enable_search_cache:
+        search_tool = CachedSearchTool(search_tool, SearchCache(os.path.join(work_dir, "search_cache.db")))
+    metrics = NodeMetrics(os.path.join(work_dir, "metrics.db"))
+    workflow = build_workflow(
+        llm_tool,
+        vector_store=vector_store,
+        search_tool=search_tool,
+        intent_classifier=IntentClassifier(embeddings=embeddings),
+        llm_cache=LLMCache(os.path.join(work_dir, "llm_cache.db")) if enable_llm_cache else None,
+        decision_llm=llm_tool,
+        corpus_directory=CorpusDirectory.from_vector_store(vector_store),
+        lexical_index=lexical_index,
+        embeddings=vector_store.embeddings,
+        use_async=use_async,
+        review_rules=ReviewRules(),
+        metrics=metrics
+    )
+    return workflow, {"llm": llm, "search": search, "metrics": metrics}
+
+def _run_sync(app, jobs: List[Tuple[str, str, str]], concurrency: int) -> List[Tuple[str, float, Optional[str]]]:
+    def run(job):
+        thread_id, scenario, instruction = job
+        config = {"configurable": {"thread_id": thread_id}}
+        start = time.perf_counter()
+        try:
+            app.invoke({"user_input": instruction, "history": [], "step_count": 0}, config=config, **run_options(app))
+            return scenario, time.perf_counter() - start, None
+        except Exception as e:
+            return scenario, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="email-bench") as pool:
+        return list(pool.map(run, jobs))
+
+async def _run_async(app, jobs: List[Tuple[str, str, str]], concurrency: int) -> List[Tuple[str, float, Optional[str]]]:
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(job):
+        thread_id, scenario, instruction = job
+        config = {"configurable": {"thread_id": thread_id}}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await app.ainvoke({"user_input": instruction, "history": [], "step_count": 0}, config=config,
+                                     **run_options(app))
+                return scenario, time.perf_counter() - start, None
+            except Exception as e:
+                return scenario, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+    return await asyncio.gather(*(run(job) for job in jobs))
+
+def run_benchmark(
+    requests: int = 40,
+    concurrency: int = 4,
+    llm_latency: float = 0.05,
+    seconds_per_token: float = 0.0,
+    search_latency: float = 0.1,
+    enable_llm_cache: bool = False,
+    enable_search_cache: bool = False,
+    use_async: bool = False,
+    checkpointer: str = "sqlite",
+    durability: str = "async",
+    data_dir: str = "data/vector_data",
+    trace_memory: bool = False,
+    work_dir: Optional[str] = None,
+    scenarios: Optional[List[Tuple[str, str]]] = None,
+    cassette_path: Optional[str] = None,
+    cassette_timing: str = "instant"
+) -> Dict[str, Any]:
+    """
+    Run `requests` instructions (cycling through `scenarios`, SCENARIOS by
+    default) and return the report.
+
+    Every run uses its own checkpoint thread and stops at the review pause,
+    as in production (interrupt_after=["reviewer"]).
+    """
+    scenarios = scenarios or SCENARIOS
+    cassette = None
+    if cassette_path:
+        cassette = Cassette(cassette_path, mode="replay", timing=cassette_timing, match="node", passthrough=True)
+    with tempfile.TemporaryDirectory(prefix="email-bench-") as tmp:
+        work_dir = work_dir or tmp
+        workflow, services = build_benchmark_workflow(
+            work_dir,
+            data_dir=data_dir,
+            llm_latency=llm_latency,
+            seconds_per_token=seconds_per_token,
+            search_latency=search_latency,
+            enable_llm_cache=enable_llm_cache,
+            enable_search_cache=enable_search_cache,
+            use_async=use_async,
+            cassette=cassette
+        )
+        jobs = [
+            (f"bench-{i}", *scenarios[i % len(scenarios)])
+            for i in range(requests)
+        ]
+        db_path = os.path.join(work_dir, "checkpoints.db")
+        if trace_memory:
+            tracemalloc.start()
+
+        if use_async:
+            async def _main():
+                async with get_async_checkpointer(db_path, durability=durability) as saver:
+                    app = workflow.compile(checkpointer=saver, interrupt_after=["reviewer"])
+                    before = _db_bytes(db_path)
+                    start = time.perf_counter()
+                    results = await _run_async(app, jobs, concurrency)
+                    return results, time.perf_counter() - start, before
+            results, wall, db_before = asyncio.run(_main())
+            saver_stats = {}
+        else:
+            if checkpointer == "memory":
+                from langgraph.checkpoint.memory import MemorySaver
+                saver_cm = nullcontext(MemorySaver())
+            else:
+                saver_cm = get_checkpointer(db_path, durability=durability)
+            with saver_cm as saver:
+                app = workflow.compile(checkpointer=saver, interrupt_after=["reviewer"])
+                db_before = _db_bytes(db_path)
+                start = time.perf_counter()
+                results = _run_sync(app, jobs, concurrency)
+                wall = time.perf_counter() - start
+            saver_stats = saver.stats() if hasattr(saver, "stats") else {}
+
+        traced_peak = None
+        if trace_memory:
+            traced_peak = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+        db_after = _db_bytes(db_path)
+
+        ok = [(scenario, seconds) for scenario, seconds, error in results if error is None]
+        errors = [error for _, _, error in results if error is not None]
+        per_scenario: Dict[str, List[float]] = {}
+        for scenario, seconds in ok:
+            per_scenario.setdefault(scenario, []).append(seconds)
+
+        nodes = {}
+        for row in services["metrics"].node_percentiles():
+            nodes[row.pop("node")] = {k: round(v, 4) if isinstance(v, float) else v for k, v in row.items()}
+
+        return {
+            "config": {
+                "requests": requests,
+                "concurrency": concurrency,
+                "llm_latency": llm_latency,
+                "seconds_per_token": seconds_per_token,
+                "search_latency": search_latency,
+                "llm_cache": enable_llm_cache,
+                "search_cache": enable_search_cache,
+                "async": use_async,
+                "checkpointer": "async_sqlite" if use_async else checkpointer,
+                "durability": durability,
+                "scenarios": len(scenarios),
+                "cassette": cassette_path,
+                "cassette_timing": cassette_timing if cassette_path else None,
+            },
+            "completed": len(ok),
+            "errors": len(errors),
+            "error_samples": errors[:3],
+            "wall_seconds": round(wall, 4),
+            "throughput_rps": round(len(ok) / wall, 3) if wall else 0.0,
+            "latency": {
+                "all": _latency_summary([s for _, s in ok]),
+                **{name: _latency_summary(values) for name, values in sorted(per_scenario.items())},
+            },
+            "nodes": nodes,
+            "llm_calls": services["llm"].calls,
+            "search_calls": services["search"].calls,
+            "checkpoint": {
+                "db_bytes_before": db_before,
+                "db_bytes_after": db_after,
+                "bytes_per_request": round((db_after - db_before) / len(ok)) if ok else 0,
+                "writes": saver_stats.get("writes"),
+                "commits": saver_stats.get("commits"),
+            },
+            "memory": {"peak_rss_mb": _peak_rss_mb(), "traced_peak_mb": traced_peak},
+            "cassette": cassette.stats() if cassette else None,
+        }
+
+# --- Regression checks -------------------------------------------------
+
+def _lookup(report: Dict[str, Any], path: str) -> Any:
+    value: Any = report
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+def check_thresholds(report: Dict[str, Any], thresholds: Dict[str, Dict[str, float]]) -> List[str]:
+    """Failures against absolute {"metric.path": {"min": x, "max": y}} bounds."""
+    failures = []
+    for path, bounds in thresholds.items():
+        value = _lookup(report, path)
+        if not isinstance(value, (int, float)):
+            failures.append(f"{path}: missing from the report")
+            continue
+        if "min" in bounds and value < bounds["min"]:
+            failures.append(f"{path}: {value} < min {bounds['min']}")
+        if "max" in bounds and value > bounds["max"]:
+            failures.append(f"{path}: {value} > max {bounds['max']}")
+    return failures
+
+def compare_baseline(
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = 0.1,
+    min_delta_seconds: float = 0.005
+) -> List[str]:
+    """
+    Failures for BASELINE_METRICS (and per-node p95) worse than the baseline by
+    more than `tolerance`; latency changes below `min_delta_seconds` are noise.
+    """
+    metrics = list(BASELINE_METRICS)
+    metrics += [(f"nodes.{node}.p95", False) for node in (baseline.get("nodes") or {})]
+    failures = []
+    for path, higher_is_better in metrics:
+        old, new = _lookup(baseline, path), _lookup(report, path)
+        if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or old == 0:
+            continue
+        is_latency = path.startswith(("latency.", "nodes."))
+        if is_latency and abs(new - old) < min_delta_seconds:
+            continue
+        change = (new - old) / abs(old)
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            failures.append(f"{path}: {old} -> {new} ({change:+.0%}, tolerance {tolerance:.0%})")
+    return failures
+
+def print_report(report: Dict[str, Any]):
+    config = report["config"]
+    print(f"\n📊 {report['completed']} run(s), {report['errors']} error(s) in {report['wall_seconds']:.2f}s "
+          f"-> {report['throughput_rps']:.2f} req/s (concurrency {config['concurrency']}, "
+          f"{'async' if config['async'] else 'threads'}, {config['checkpointer']} checkpointer, "
+          f"{config['durability']} durability)")
+    for name, summary in report["latency"].items():
+        print(f"  {name:<16} p50 {summary['p50']:.3f}s  p95 {summary['p95']:.3f}s  p99 {summary['p99']:.3f}s")
+    print("  per node:")
+    for node, stats in report["nodes"].items():
+        print(f"    {node:<18} p50 {stats['p50']:.3f}s  p95 {stats['p95']:.3f}s  p99 {stats['p99']:.3f}s  "
+              f"total {stats['total_seconds']:.2f}s")
+    checkpoint = report["checkpoint"]
+    print(f"  checkpoint DB: +{checkpoint['db_bytes_after'] - checkpoint['db_bytes_before']} bytes "
+          f"({checkpoint['bytes_per_request']} per request)"
+          + (f", {checkpoint['writes']} writes in {checkpoint['commits']} commits" if checkpoint.get("commits") else ""))
+    memory = report["memory"]
+    print(f"  peak RSS: {memory['peak_rss_mb']} MB"
+          + (f", traced peak: {memory['traced_peak_mb']} MB" if memory["traced_peak_mb"] is not None else ""))
+    cassette = report.get("cassette")
+    if cassette:
+        print(f"  cassette: {cassette['replayed']} exact, {cassette['node_matched']} node-matched, "
+              f"{cassette['missed']} stand-in call(s)")
+
+def load_scenarios(path: str) -> List[Tuple[str, str]]:
+    """(name, instruction) pairs from a batch-format JSONL file ("scenario" or "id" names them)."""
+    scenarios = []
+    for line_no, item in read_instructions(path):
+        instruction = item.get("instruction") or item.get("user_input")
+        if instruction:
+            scenarios.append((str(item.get("scenario") or item.get("id") or f"line-{line_no}"), instruction))
+    if not scenarios:
+        raise ValueError(f"{path}: no instructions")
+    return scenarios
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the email agent graph")
+    parser.add_argument("--requests", type=int, default=40, help="Instructions to run (cycling through the scenarios)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Instructions in flight at the same time")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds per LLM call")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0,
+                        help="Simulated seconds per generated token")
+    parser.add_argument("--search-latency", type=float, default=0.1, help="Simulated seconds per web search")
+    parser.add_argument("--llm-cache", action="store_true", help="Enable the LLM response cache")
+    parser.add_argument("--search-cache", action="store_true", help="Enable the web search cache")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Run the async node variants on an event loop")
+    parser.add_argument("--checkpointer", choices=("sqlite", "memory"), default="sqlite",
+                        help="Checkpointer of the sync runs")
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default="async",
+                        help="Checkpoint durability of the SQLite checkpointers")
+    parser.add_argument("--data", default="data/vector_data", help="Conversations indexed for retrieval")
+    parser.add_argument("--instructions", metavar="JSONL",
+                        help="Run these instructions (batch format) instead of the built-in scenarios")
+    parser.add_argument("--cassette", metavar="PATH",
+                        help="Replay LLM and search responses from a recorded cassette")
+    parser.add_argument("--cassette-timing", choices=CASSETTE_TIMINGS, default="instant",
+                        help="Replay instantly or at the recorded latencies")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also report the tracemalloc peak (slows the run down)")
+    parser.add_argument("--out", help="Write the JSON report to this file")
+    parser.add_argument("--thresholds", help="JSON file of {\"metric.path\": {\"min\"/\"max\": value}}")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative degradation allowed against the baseline")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        llm_latency=args.llm_latency,
+        seconds_per_token=args.seconds_per_token,
+        search_latency=args.search_latency,
+        enable_llm_cache=args.llm_cache,
+        enable_search_cache=args.search_cache,
+        use_async=args.use_async,
+        checkpointer=args.checkpointer,
+        durability=args.durability,
+        data_dir=args.data,
+        trace_memory=args.trace_memory,
+        scenarios=load_scenarios(args.instructions) if args.instructions else None,
+        cassette_path=args.cassette,
+        cassette_timing=args.cassette_timing
+    )
+
+    failures = []
+    if args.thresholds:
+        with open(args.thresholds, "r", encoding="utf-8") as f:
+            failures += check_thresholds(report, json.load(f))
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures += compare_baseline(report, json.load(f), args.tolerance)
+    if report["errors"]:
+        failures.append(f"{report['errors']} run(s) failed: {report['error_samples']}")
+    report["regressions"] = failures
+
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Report written to {args.out}")
+    if failures:
+        print("❌ Regressions:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("✅ No regression")
+
+if __name__ == "__main__":
+    main()
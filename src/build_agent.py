@@ -4,12 +4,29 @@ Build and compile the email automation agent with all integrations.
 """
 
 import os
+import argparse
+import tempfile
 from dotenv import load_dotenv
+from langchain_openai import OpenAIEmbeddings
 from typing import Optional
 
 from src.utils import make_llm, build_workflow, get_checkpointer
-from src.vector_db import get_vector_store
+from src.vector_db import get_vector_store, BM25Index
 from src.tools import get_web_search_tool
+from src.intent import IntentClassifier
+from src.llm_cache import LLMCache, default_cache_path
+from src.semantic_cache import SemanticCache
+from src.search_cache import SearchCache, CachedSearchTool
+from src.clients import ClientRegistry
+from src.retrieval import CorpusDirectory
+from src.context import DEFAULT_COMPRESSION_RATIOS
+from src.review_rules import ReviewRules, DEFAULT_REVIEW_RULES, SKIP_LLM_POLICIES
+from src.model_router import ModelRouter, load_model_config, parse_assignments
+from src.metrics import NodeMetrics
+from src.checkpointer import DURABILITY_MODES
+from src.cassette import (
+    Cassette, CassetteChatModel, CassetteEmbeddings, CassetteSearchTool, CASSETTE_MODES, CASSETTE_TIMINGS
+)
 
 # Load environment variables
 load_dotenv()
@@ -17,9 +34,32 @@ load_dotenv()
 def build_email_agent(
     db_path: str = "email_agent.db",
     vector_db_path: str = "./chroma_db",
-    vector_data_dir: str = "vector_data",
+    vector_data_dir: str = "data/vector_data",
     model: str = "gpt-4o-mini",
-    enable_langfuse: bool = True
+    enable_langfuse: bool = True,
+    intent_threshold: float = 0.75,
+    enable_llm_cache: bool = True,
+    llm_cache_ttl: Optional[float] = 7 * 24 * 3600,
+    enable_semantic_cache: bool = True,
+    semantic_threshold: float = 0.92,
+    max_connections: int = 20,
+    max_keepalive_connections: int = 10,
+    compression_ratio: Optional[float] = None,
+    use_async: bool = False,
+    enable_search_cache: bool = True,
+    search_cache_ttl: Optional[float] = 6 * 3600,
+    max_revisions: int = 2,
+    enable_review_rules: bool = True,
+    review_skip_llm: str = "never",
+    disabled_review_rules: tuple = (),
+    fast_model: str = "gpt-4o-mini",
+    models_config: Optional[str] = None,
+    node_tiers: Optional[dict] = None,
+    latency_slo: Optional[dict] = None,
+    enable_metrics: bool = True,
+    cassette_path: Optional[str] = None,
+    cassette_mode: str = "record",
+    cassette_timing: str = "instant"
 ):
     """
     Build and compile the complete email automation agent.
@@ -28,41 +68,212 @@ def build_email_agent(
         db_path: Path to SQLite database for persistence
         vector_db_path: Path to ChromaDB persistence directory
         vector_data_dir: Directory containing markdown files for vector DB
-        model: OpenAI model to use
+        model: OpenAI model of the "quality" tier (drafter and reviewer by default)
         enable_langfuse: Whether to enable Langfuse monitoring
+        intent_threshold: Confidence below which intent classification falls back to the LLM
+        enable_llm_cache: Whether to cache LLM responses in SQLite next to db_path
+        llm_cache_ttl: Lifetime of cached LLM responses in seconds (None = no expiry)
+        enable_semantic_cache: Whether to reuse decisions for near-duplicate requests
+        semantic_threshold: Cosine similarity above which a request counts as a duplicate
+        max_connections: Size of the shared HTTP connection pool for LLM clients
+        max_keepalive_connections: Idle keep-alive connections kept in the pool
+        compression_ratio: Share of the context tokens kept before drafting
+            (None = per-intent defaults, 0 or >= 1 disables compression)
+        use_async: Build the graph from the async node variants (drive it with
+            ainvoke/astream under an event loop, with get_async_checkpointer)
+        enable_search_cache: Whether to cache web search results in SQLite next to db_path
+        search_cache_ttl: Lifetime of cached search results in seconds (None = no expiry)
+        max_revisions: Reviewer-requested revisions of a draft before it goes to the human as is
+        enable_review_rules: Whether to run the local pre-review rules before the LLM reviewer
+        review_skip_llm: "never", or "low_risk" to approve short drafts that trip no rule
+            without the LLM reviewer
+        disabled_review_rules: Names of pre-review rules to turn off
+        fast_model: OpenAI model of the "fast" tier (classification, decisions, query rewriting)
+        models_config: JSON file with model tiers and per-node/per-intent routes
+            (see model_router.py)
+        node_tiers: Node -> tier overrides (take precedence over models_config)
+        latency_slo: Node -> latency SLO in seconds, above which the node falls
+            back to a faster tier
+        enable_metrics: Whether to record per-node latency, LLM calls, tokens and
+            cache hits in SQLite next to db_path
+        cassette_path: Cassette file recording (or replaying) the LLM, embedding and
+            search calls (see cassette.py); None disables it. With a cassette the
+            LLM, semantic, search and embedding caches are off and the vector index
+            is rebuilt in a scratch directory, so every call reaches the cassette
+        cassette_mode: "record" (real calls, appended to the cassette) or "replay"
+        cassette_timing: "instant" or "recorded" (replay waits for the original latencies)
     
     Returns:
-        Compiled LangGraph agent
+        (workflow, llm, vector_store, search_tool, langfuse_handler, services)
+        where services holds shared helpers ("llm_cache", "semantic_cache", "search_cache",
+        "review_rules", "model_router", "metrics", "clients", "embeddings", "cassette",
+        "cassette_index" (scratch index directory, removed when released))
     """
     print("🔧 Building email automation agent...")
     
+    # Record/replay of the external calls (replay needs no API key)
+    cassette = None
+    cassette_index = None
+    if cassette_path:
+        cassette = Cassette(cassette_path, mode=cassette_mode, timing=cassette_timing)
+        if cassette_mode == "replay":
+            # Clients are still constructed, they just never send a request
+            os.environ.setdefault("OPENAI_API_KEY", "cassette-replay")
+        # A call answered by a local cache would be missing from the recording
+        # (or skip the replayed one): keep every cache out of the way
+        enable_llm_cache = enable_semantic_cache = enable_search_cache = False
+        cassette_index = tempfile.TemporaryDirectory(prefix="cassette-index-")
+        vector_db_path = cassette_index.name
+        print(f"✅ Cassette {cassette_mode}: {cassette_path} (caches off, scratch vector index)")
+    
+    def taped(llm):
+        return CassetteChatModel(llm, cassette) if cassette else llm
+    
+    # Shared client registry (one keep-alive connection pool for every LLM client)
+    clients = ClientRegistry(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections
+    )
+    
     # Initialize LLM
-    llm = make_llm(model=model)
+    llm = taped(make_llm(model=model, clients=clients))
     print(f"✅ LLM initialized: {model}")
     
-    # Initialize vector store
+    # Per-node model tiers (raises on an invalid config rather than guessing)
+    model_router = ModelRouter.from_config(
+        model,
+        fast_model,
+        lambda name, temperature, purpose: taped(make_llm(
+            model=name, temperature=temperature, clients=clients, purpose=purpose
+        )),
+        config=load_model_config(models_config) if models_config else None,
+        node_tiers=node_tiers,
+        latency_slo=latency_slo
+    )
+    routes = ", ".join(
+        f"{node}={route['tier']}" for node, route in model_router.stats()["nodes"].items()
+    )
+    print(f"✅ Model routing: {routes}")
+    
+    # Initialize vector store (and the BM25 index kept in sync with it)
+    lexical_index = BM25Index()
     try:
         vector_store = get_vector_store(
             persist_directory=vector_db_path,
-            data_dir=vector_data_dir
+            data_dir=vector_data_dir,
+            lexical_index=lexical_index,
+            embeddings=CassetteEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small"), cassette)
+            if cassette else None,
+            enable_embedding_cache=cassette is None
         )
-        print("✅ Vector store initialized")
+        print(f"✅ Vector store initialized (lexical index: {len(lexical_index)} documents)")
     except Exception as e:
         print(f"⚠️  Vector store error: {e}")
         vector_store = None
+        lexical_index = None
+    
+    # Conversations / correspondents used to scope retrieval
+    corpus_directory = None
+    if vector_store is not None:
+        try:
+            corpus_directory = CorpusDirectory.from_vector_store(vector_store)
+            print(f"✅ Corpus directory: {len(corpus_directory.sources)} conversations, "
+                  f"{len(corpus_directory.people)} correspondents")
+        except Exception as e:
+            print(f"⚠️  Corpus directory error: {e}")
     
     # Initialize web search tool
     search_tool = get_web_search_tool()
+    if cassette and (search_tool or cassette_mode == "replay"):
+        search_tool = CassetteSearchTool(search_tool, cassette)
     if search_tool:
         print("✅ Web search tool initialized")
     else:
         print("⚠️  Web search tool not available")
     
+    # Search result cache (TTL + single-flight for identical queries)
+    search_cache = None
+    if search_tool and enable_search_cache:
+        try:
+            search_cache = SearchCache(default_cache_path(db_path, "search_cache.db"), ttl_seconds=search_cache_ttl)
+            search_tool = CachedSearchTool(search_tool, search_cache)
+            print(f"✅ Search cache enabled: {search_cache.db_path}")
+        except Exception as e:
+            print(f"⚠️  Search cache error: {e}")
+            search_cache = None
+    
+    # Local intent classifier (reuses the vector store embeddings for the centroids)
+    embeddings = getattr(vector_store, "embeddings", None)
+    intent_classifier = IntentClassifier(
+        embeddings=embeddings,
+        threshold=intent_threshold
+    )
+    
+    # LLM response cache (shared by all nodes except the opted-out ones)
+    llm_cache = None
+    if enable_llm_cache:
+        try:
+            llm_cache = LLMCache(default_cache_path(db_path), ttl_seconds=llm_cache_ttl)
+            print(f"✅ LLM cache enabled: {llm_cache.db_path}")
+        except Exception as e:
+            print(f"⚠️  LLM cache error: {e}")
+            llm_cache = None
+    
+    # Semantic cache for the classifier / web-search decision prompts
+    semantic_cache = None
+    if enable_semantic_cache and embeddings is not None:
+        try:
+            semantic_cache = SemanticCache(
+                default_cache_path(db_path, "semantic_cache.db"),
+                embeddings,
+                threshold=semantic_threshold
+            )
+            print(f"✅ Semantic cache enabled: {semantic_cache.db_path}")
+        except Exception as e:
+            print(f"⚠️  Semantic cache error: {e}")
+            semantic_cache = None
+    
+    # Context compression before drafting
+    enable_compression = compression_ratio is None or 0 < compression_ratio < 1
+    compression_ratios = None
+    if compression_ratio is not None and enable_compression:
+        compression_ratios = {intent: compression_ratio for intent in DEFAULT_COMPRESSION_RATIOS}
+    
+    # Local pre-review rules (clear failures skip the LLM reviewer)
+    review_rules = None
+    if enable_review_rules:
+        review_rules = ReviewRules(disabled=disabled_review_rules, skip_llm=review_skip_llm)
+        print(f"✅ Pre-review rules: {len(review_rules.rules)} active (LLM skip: {review_skip_llm})")
+    
+    # Per-node instrumentation (local, no external tracing needed)
+    metrics = None
+    if enable_metrics:
+        try:
+            metrics = NodeMetrics(default_cache_path(db_path, "metrics.db"))
+            print(f"✅ Node metrics enabled: {metrics.db_path}")
+        except Exception as e:
+            print(f"⚠️  Node metrics error: {e}")
+            metrics = None
+    
     # Build workflow
     workflow = build_workflow(
         llm=llm,
         vector_store=vector_store,
-        search_tool=search_tool
+        search_tool=search_tool,
+        intent_classifier=intent_classifier,
+        llm_cache=llm_cache,
+        semantic_cache=semantic_cache,
+        clients=clients,
+        corpus_directory=corpus_directory,
+        lexical_index=lexical_index,
+        embeddings=embeddings,
+        compression_ratios=compression_ratios,
+        enable_compression=enable_compression,
+        use_async=use_async,
+        max_revisions=max_revisions,
+        review_rules=review_rules,
+        model_router=model_router,
+        metrics=metrics
     )
     print("✅ Workflow built")
     
@@ -86,11 +297,112 @@ def build_email_agent(
     # Return workflow and components (checkpointer will be handled in main)
     print("✅ Workflow ready for compilation")
     
-    return workflow, llm, vector_store, search_tool, langfuse_handler
+    services = {
+        "llm_cache": llm_cache,
+        "semantic_cache": semantic_cache,
+        "search_cache": search_cache,
+        "review_rules": review_rules,
+        "model_router": model_router,
+        "metrics": metrics,
+        "clients": clients,
+        "embeddings": embeddings,
+        "cassette": cassette,
+        "cassette_index": cassette_index
+    }
+    
+    return workflow, llm, vector_store, search_tool, langfuse_handler, services
+
+def add_agent_arguments(parser: argparse.ArgumentParser):
+    """Command-line options shared by the entry points that build the agent."""
+    parser.add_argument("--db", default="email_agent.db", help="SQLite database path")
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default=None,
+                        help="Checkpoint durability (default: step, async in batch mode): "
+                             "commit every step, only when the graph pauses, "
+                             "or in background batches")
+    parser.add_argument("--vector-db", default="./chroma_db", help="ChromaDB directory")
+    parser.add_argument("--vector-data", default="data/vector_data", help="Vector data directory")
+    parser.add_argument("--model", default="gpt-4o-mini",
+                        help="OpenAI model of the quality tier (drafter and reviewer)")
+    parser.add_argument("--fast-model", default="gpt-4o-mini",
+                        help="OpenAI model of the fast tier (classification, decisions, query rewriting)")
+    parser.add_argument("--models-config", metavar="JSON",
+                        help="Model tiers and per-node/per-intent routes (see src/model_router.py)")
+    parser.add_argument("--node-tier", action="append", default=[], metavar="NODE=TIER",
+                        help="Route a node to a tier, e.g. reviewer=fast (repeatable)")
+    parser.add_argument("--latency-slo", action="append", default=[], metavar="NODE=SECONDS",
+                        help="Fall back to a faster tier while a node is slower than this (repeatable)")
+    parser.add_argument("--no-metrics", action="store_true",
+                        help="Disable per-node latency/token instrumentation")
+    parser.add_argument("--cassette", metavar="PATH",
+                        help="Record or replay the LLM, embedding and search calls (.jsonl or .jsonl.gz)")
+    parser.add_argument("--cassette-mode", choices=CASSETTE_MODES, default="record",
+                        help="Record real calls into the cassette, or replay them without API access")
+    parser.add_argument("--cassette-timing", choices=CASSETTE_TIMINGS, default="instant",
+                        help="Replay instantly or at the recorded latencies")
+    parser.add_argument("--no-langfuse", action="store_true", help="Disable Langfuse monitoring")
+    parser.add_argument("--intent-threshold", type=float, default=0.75,
+                        help="Local intent classifier confidence below which the LLM is used")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Disable the LLM response cache")
+    parser.add_argument("--llm-cache-ttl", type=float, default=7 * 24 * 3600,
+                        help="LLM cache entry lifetime in seconds")
+    parser.add_argument("--no-semantic-cache", action="store_true",
+                        help="Disable reuse of decisions for near-duplicate requests")
+    parser.add_argument("--semantic-threshold", type=float, default=0.92,
+                        help="Cosine similarity above which two requests are near-duplicates")
+    parser.add_argument("--max-connections", type=int, default=20,
+                        help="Shared HTTP connection pool size for LLM clients")
+    parser.add_argument("--max-keepalive", type=int, default=10,
+                        help="Idle keep-alive connections kept in the pool")
+    parser.add_argument("--compression-ratio", type=float, default=None,
+                        help="Share of the retrieved context kept before drafting (0 disables compression)")
+    parser.add_argument("--no-search-cache", action="store_true", help="Disable the web search result cache")
+    parser.add_argument("--search-cache-ttl", type=float, default=6 * 3600,
+                        help="Web search cache entry lifetime in seconds")
+    parser.add_argument("--max-revisions", type=int, default=2,
+                        help="Reviewer-requested revisions of a draft before it is handed over as is")
+    parser.add_argument("--no-review-rules", action="store_true",
+                        help="Disable the local pre-review rules (every draft goes to the LLM reviewer)")
+    parser.add_argument("--review-skip-llm", choices=SKIP_LLM_POLICIES, default="never",
+                        help="Skip the LLM reviewer for short drafts that trip no rule (low_risk)")
+    parser.add_argument("--disable-review-rule", action="append", default=[],
+                        choices=sorted(DEFAULT_REVIEW_RULES), metavar="RULE",
+                        help=f"Turn off one pre-review rule (repeatable): {', '.join(DEFAULT_REVIEW_RULES)}")
+
+def agent_options(args: argparse.Namespace) -> dict:
+    """`build_email_agent` keyword arguments from the options of `add_agent_arguments`."""
+    return {
+        "db_path": args.db,
+        "vector_db_path": args.vector_db,
+        "vector_data_dir": args.vector_data,
+        "model": args.model,
+        "enable_langfuse": not args.no_langfuse,
+        "intent_threshold": args.intent_threshold,
+        "enable_llm_cache": not args.no_llm_cache,
+        "llm_cache_ttl": args.llm_cache_ttl,
+        "enable_semantic_cache": not args.no_semantic_cache,
+        "semantic_threshold": args.semantic_threshold,
+        "max_connections": args.max_connections,
+        "max_keepalive_connections": args.max_keepalive,
+        "compression_ratio": args.compression_ratio,
+        "enable_search_cache": not args.no_search_cache,
+        "search_cache_ttl": args.search_cache_ttl,
+        "max_revisions": args.max_revisions,
+        "enable_review_rules": not args.no_review_rules,
+        "review_skip_llm": args.review_skip_llm,
+        "disabled_review_rules": tuple(args.disable_review_rule),
+        "fast_model": args.fast_model,
+        "models_config": args.models_config,
+        "node_tiers": parse_assignments(args.node_tier),
+        "latency_slo": parse_assignments(args.latency_slo, float),
+        "enable_metrics": not args.no_metrics,
+        "cassette_path": args.cassette,
+        "cassette_mode": args.cassette_mode,
+        "cassette_timing": args.cassette_timing,
+    }
 
 if __name__ == "__main__":
     # Test build
-    workflow, llm, vector_store, search_tool, langfuse_handler = build_email_agent()
+    workflow, llm, vector_store, search_tool, langfuse_handler, services = build_email_agent()
     from utils import get_checkpointer
     with get_checkpointer("email_agent.db") as checkpointer:
         agent = workflow.compile(
@@ -0,0 +1,334 @@
+# cassette.py
+"""
+Record/replay of the external calls: chat model, embeddings and web search.
+
+In "record" mode the wrappers call the real backend and append each
+request/response pair, with its latency and the graph node that made it, to a
+cassette file (JSON lines, gzip-compressed when the path ends in ".gz";
+vectors are stored as base64 float32). In "replay" mode they answer from the
+cassette, either instantly or after the recorded latency.
+
+Matching is on the request content (prompt text, embedded text, normalized
+search query). With match="node", a request that was never recorded gets the
+next recorded response of the same node and kind instead, which keeps replays
+production-shaped (response sizes, latencies) when prompts drift.
+"""
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.messages import AIMessage
+except Exception:
+    raise ImportError("Missing dependency: langchain-core. Try: pip install langchain-core")
+
+from src.llm_cache import _prompt_text, model_identity
+from src.search_cache import normalize_query
+
+CASSETTE_MODES = ("record", "replay")
+CASSETTE_TIMINGS = ("instant", "recorded")
+CASSETTE_MATCHES = ("exact", "node")
+
+class CassetteMiss(KeyError):
+    """A replayed request has no recorded response."""
+
+def _encode_vector(vector: List[float]) -> str:
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+def _decode_vector(data: str) -> List[float]:
+    values = array("f")
+    values.frombytes(base64.b64decode(data))
+    return list(values)
+
+def _key(kind: str, text: str) -> str:
+    return hashlib.sha256(f"{kind}|{text}".encode("utf-8")).hexdigest()
+
+def _current_node() -> Optional[str]:
+    """Graph node running the call, if any (from the LangGraph run config)."""
+    try:
+        from langgraph.config import get_config
+        return (get_config().get("metadata") or {}).get("langgraph_node")
+    except Exception:
+        return None
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+class Cassette:
+    """
+    Recorded calls of one cassette file.
+
+    Args:
+        path: Cassette file (".gz" for gzip compression)
+        mode: "record" appends calls to the file, "replay" answers from it
+        timing: "instant" or "recorded" (replay waits for the original latency)
+        time_scale: Multiplier applied to recorded latencies
+        match: "exact" (request content) or "node" (exact, else the node's next response)
+        passthrough: On a replay miss, call the real backend instead of raising
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "replay",
+        timing: str = "instant",
+        time_scale: float = 1.0,
+        match: str = "exact",
+        passthrough: bool = False
+    ):
+        for name, value, allowed in (("mode", mode, CASSETTE_MODES), ("timing", timing, CASSETTE_TIMINGS),
+                                     ("match", match, CASSETTE_MATCHES)):
+            if value not in allowed:
+                raise ValueError(f"Cassette {name} must be one of {allowed}, got {value!r}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.time_scale = time_scale
+        self.match = match
+        self.passthrough = passthrough
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_node: Dict[Tuple[str, Optional[str]], List[Dict[str, Any]]] = {}
+        self._cursors: Dict[Any, int] = {}
+        self._counters = {"recorded": 0, "replayed": 0, "node_matched": 0, "missed": 0}
+        self._file = None
+        if mode == "replay":
+            self._load()
+        else:
+            self._file = _open(path, "a")
+
+    def _load(self):
+        with _open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # truncated last line of an interrupted recording
+                self._by_key.setdefault(entry["key"], []).append(entry)
+                self._by_node.setdefault((entry["kind"], entry.get("node")), []).append(entry)
+
+    def _next(self, cursor_key: Any, entries: List[Dict[str, Any]], cycle: bool) -> Dict[str, Any]:
+        # Repeated requests get the recorded responses in order, then the last one
+        # again; node-matched requests cycle through the node's responses
+        index = self._cursors.get(cursor_key, 0)
+        self._cursors[cursor_key] = index + 1
+        return entries[index % len(entries)] if cycle else entries[min(index, len(entries) - 1)]
+
+    def lookup(self, kind: str, key: str, node: Optional[str] = None, by_node: bool = True) -> Optional[Dict[str, Any]]:
+        """Recorded entry for a request, or None (counted as a miss)."""
+        with self._lock:
+            entries = self._by_key.get(key)
+            if entries:
+                self._counters["replayed"] += 1
+                return self._next(("key", key), entries, cycle=False)
+            if self.match == "node" and by_node:
+                entries = self._by_node.get((kind, node))
+                if entries:
+                    self._counters["node_matched"] += 1
+                    return self._next(("node", kind, node), entries, cycle=True)
+            self._counters["missed"] += 1
+            return None
+
+    def record(self, kind: str, key: str, response: Any, seconds: float, node: Optional[str] = None, **extra: Any):
+        """Append one call to the cassette (flushed so an interrupted recording stays usable)."""
+        entry = {"kind": kind, "key": key, "node": node, "seconds": round(seconds, 4), "response": response, **extra}
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._counters["recorded"] += 1
+
+    def delay(self, entry: Dict[str, Any]) -> float:
+        return entry.get("seconds", 0.0) * self.time_scale if self.timing == "recorded" else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": self.mode, "path": self.path, **self._counters}
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class CassetteChatModel:
+    """
+    Chat model wrapper that records or replays `invoke` / `ainvoke`.
+
+    Replayed responses are plain `AIMessage`s with the recorded usage metadata.
+    Every other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, llm, cassette: Cassette):
+        self.llm = llm
+        self.cassette = cassette
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def _replayed(self, entry: Dict[str, Any]) -> "AIMessage":
+        return AIMessage(
+            content=entry["response"],
+            usage_metadata=entry.get("usage"),
+            response_metadata={"cassette": True}
+        )
+
+    def _lookup(self, prompt: Any) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
+        key = _key("llm", _prompt_text(prompt))
+        node = _current_node()
+        entry = self.cassette.lookup("llm", key, node) if self.cassette.mode == "replay" else None
+        if entry is None and self.cassette.mode == "replay" and not self.cassette.passthrough:
+            raise CassetteMiss(f"No recorded LLM response for this prompt (node {node}) in {self.cassette.path}")
+        return key, node, entry
+
+    def _record(self, key: str, node: Optional[str], prompt: Any, response, seconds: float):
+        if self.cassette.mode != "record" or not isinstance(response.content, str):
+            return
+        usage = getattr(response, "usage_metadata", None)
+        self.cassette.record(
+            "llm", key, response.content, seconds, node,
+            model=model_identity(self.llm)["model"],
+            prompt=_prompt_text(prompt),
+            usage=dict(usage) if usage else None
+        )
+
+    def invoke(self, prompt: Any, config=None, **kwargs) -> "AIMessage":
+        key, node, entry = self._lookup(prompt)
+        if entry is not None:
+            time.sleep(self.cassette.delay(entry))
+            return self._replayed(entry)
+        start = time.perf_counter()
+        response = self.llm.invoke(prompt, config=config, **kwargs)
+        self._record(key, node, prompt, response, time.perf_counter() - start)
+        return response
+
+    async def ainvoke(self, prompt: Any, config=None, **kwargs) -> "AIMessage":
+        key, node, entry = self._lookup(prompt)
+        if entry is not None:
+            await asyncio.sleep(self.cassette.delay(entry))
+            return self._replayed(entry)
+        start = time.perf_counter()
+        response = await self.llm.ainvoke(prompt, config=config, **kwargs)
+        self._record(key, node, prompt, response, time.perf_counter() - start)
+        return response
+
+class CassetteEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that records or replays vectors, one entry per text
+    (so replay does not depend on how texts were batched).
+    """
+
+    def __init__(self, embeddings: Embeddings, cassette: Cassette):
+        self.embeddings = embeddings
+        self.cassette = cassette
+        # Keep the wrapped model name so embedding caches stay shared
+        self.model = str(getattr(embeddings, "model", None) or type(embeddings).__name__)
+
+    def _key(self, text: str) -> str:
+        return _key("embed", f"{self.model}|{text}")
+
+    def _embed(self, texts: List[str], call) -> List[List[float]]:
+        keys = [self._key(t) for t in texts]
+        if self.cassette.mode == "replay":
+            node = _current_node()
+            vectors: List[Optional[List[float]]] = []
+            wait = 0.0
+            for text, key in zip(texts, keys):
+                # Vectors are only meaningful for their exact text: no node matching
+                entry = self.cassette.lookup("embed", key, node, by_node=False)
+                vectors.append(_decode_vector(entry["response"]) if entry else None)
+                wait += self.cassette.delay(entry) if entry else 0.0
+            missing = [i for i, v in enumerate(vectors) if v is None]
+            if missing and not self.cassette.passthrough:
+                raise CassetteMiss(f"{len(missing)} text(s) without recorded embeddings (node {node}) "
+                                   f"in {self.cassette.path}")
+            if missing:
+                fresh = call([texts[i] for i in missing])
+                for i, vector in zip(missing, fresh):
+                    vectors[i] = vector
+            time.sleep(wait)
+            return vectors
+
+        start = time.perf_counter()
+        vectors = call(texts)
+        seconds = (time.perf_counter() - start) / max(1, len(texts))
+        node = _current_node()
+        for key, vector in zip(keys, vectors):
+            self.cassette.record("embed", key, _encode_vector(vector), seconds, node, model=self.model)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+class CassetteSearchTool:
+    """
+    Search tool wrapper that records or replays `invoke` / `ainvoke`.
+
+    `tool` may be None when replaying without a search API key.
+    """
+
+    name = "web_search"
+
+    def __init__(self, tool, cassette: Cassette):
+        self.tool = tool
+        self.cassette = cassette
+        if tool is not None and getattr(tool, "name", None):
+            self.name = tool.name
+
+    def __getattr__(self, name):
+        if self.tool is None:
+            raise AttributeError(name)
+        return getattr(self.tool, name)
+
+    @staticmethod
+    def _query(tool_input: Any) -> str:
+        return tool_input.get("query", "") if isinstance(tool_input, dict) else str(tool_input)
+
+    def _lookup(self, tool_input: Any) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
+        query = self._query(tool_input)
+        key = _key("search", normalize_query(query))
+        node = _current_node()
+        entry = self.cassette.lookup("search", key, node) if self.cassette.mode == "replay" else None
+        if entry is None and self.cassette.mode == "replay" and (self.tool is None or not self.cassette.passthrough):
+            raise CassetteMiss(f"No recorded search results for {query!r} in {self.cassette.path}")
+        return key, node, entry
+
+    def invoke(self, tool_input: Any, config=None, **kwargs) -> Any:
+        key, node, entry = self._lookup(tool_input)
+        if entry is not None:
+            time.sleep(self.cassette.delay(entry))
+            return entry["response"]
+        start = time.perf_counter()
+        results = self.tool.invoke(tool_input, config=config, **kwargs)
+        if self.cassette.mode == "record":
+            self.cassette.record("search", key, results, time.perf_counter() - start, node,
+                                 query=self._query(tool_input))
+        return results
+
+    async def ainvoke(self, tool_input: Any, config=None, **kwargs) -> Any:
+        key, node, entry = self._lookup(tool_input)
+        if entry is not None:
+            await asyncio.sleep(self.cassette.delay(entry))
+            return entry["response"]
+        start = time.perf_counter()
+        results = await self.tool.ainvoke(tool_input, config=config, **kwargs)
+        if self.cassette.mode == "record":
+            self.cassette.record("search", key, results, time.perf_counter() - start, node,
+                                 query=self._query(tool_input))
+        return results
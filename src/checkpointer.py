@@ -0,0 +1,214 @@
+# checkpointer.py
+"""
+SQLite checkpointer with selectable durability.
+
+LangGraph saves a checkpoint (the full state) after every node. With a plain
+SqliteSaver each save is its own transaction and fsync on the request's
+critical path. `WriteBehindSqliteSaver` keeps the SqliteSaver schema and adds
+three durability modes:
+
+    "step"       every checkpoint is committed before the next node runs
+                 (WAL, synchronous=FULL)
+    "interrupt"  the graph only saves when it pauses (review) or finishes,
+                 one committed checkpoint per run (WAL, synchronous=FULL)
+    "async"      saves are queued to a writer thread that commits them in
+                 batches (WAL, synchronous=NORMAL); a crash loses at most the
+                 last `commit_interval` seconds of checkpoints
+
+The graph-side half of each mode is LangGraph's `durability` run option,
+given by `GRAPH_DURABILITY` (see `run_options` in utils.py).
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except Exception:
+    raise ImportError("Missing dependency: langgraph-checkpoint-sqlite. Try: pip install langgraph-checkpoint-sqlite")
+
+DURABILITY_MODES = ("step", "interrupt", "async")
+
+# LangGraph `durability` run option of each mode
+GRAPH_DURABILITY: Dict[str, str] = {"step": "sync", "interrupt": "exit", "async": "async"}
+
+# PRAGMA synchronous of each mode (WAL: NORMAL only risks the last commits on power loss)
+SYNCHRONOUS: Dict[str, str] = {"step": "FULL", "interrupt": "FULL", "async": "NORMAL"}
+
+def tune_connection(conn: sqlite3.Connection, durability: str):
+    """WAL journal and the mode's synchronous level."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={SYNCHRONOUS[durability]}")
+
+class WriteBehindSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver with durability modes and, in "async" mode, a background writer.
+
+    Queued writes are applied in order on the saver's connection, so reads
+    (which first wait for the queue) always see them, committed or not.
+
+    Args:
+        conn: SQLite connection (check_same_thread=False)
+        durability: One of DURABILITY_MODES
+        commit_interval: Longest time a queued write waits for its commit ("async")
+        max_batch: Writes per commit at most ("async")
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        durability: str = "step",
+        commit_interval: float = 0.05,
+        max_batch: int = 256,
+        **kwargs: Any
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Checkpoint durability must be one of {DURABILITY_MODES}, got {durability!r}")
+        super().__init__(conn, **kwargs)
+        self.durability = durability
+        self.graph_durability = GRAPH_DURABILITY[durability]
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        tune_connection(conn, durability)
+        self._queue: "queue.Queue[Optional[Callable[[], Any]]]" = queue.Queue()
+        self._applied = threading.Condition()
+        self._unapplied = 0
+        self._error: Optional[BaseException] = None
+        self._counters = {"writes": 0, "commits": 0}
+        self._closed = durability != "async"
+        self._writer: Optional[threading.Thread] = None
+        if durability == "async":
+            self._writer = threading.Thread(target=self._write_loop, name="checkpoint-writer", daemon=True)
+            self._writer.start()
+
+    @classmethod
+    @contextmanager
+    def from_conn_string(cls, conn_string: str, durability: str = "step", **kwargs: Any) -> Iterator["WriteBehindSqliteSaver"]:
+        with closing(sqlite3.connect(conn_string, check_same_thread=False)) as conn:
+            saver = cls(conn, durability=durability, **kwargs)
+            try:
+                yield saver
+            finally:
+                saver.close()
+
+    # --- Writer thread ---------------------------------------------------
+
+    def _write_loop(self):
+        stop = False
+        while not stop:
+            write = self._queue.get()
+            deadline = time.monotonic() + self.commit_interval
+            batch = 0
+            while True:
+                if write is None:
+                    stop = True
+                    break
+                self._apply(write)
+                batch += 1
+                if batch >= self.max_batch:
+                    break
+                try:
+                    write = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._commit()
+
+    def _apply(self, write: Callable[[], Any]):
+        try:
+            write()
+        except Exception as e:
+            print(f"⚠️  Checkpoint write failed: {e}")
+            self._error = e
+        finally:
+            with self._applied:
+                self._unapplied -= 1
+                self._applied.notify_all()
+
+    def _commit(self):
+        with self.lock:
+            self.conn.commit()
+            self._counters["commits"] += 1
+
+    def _enqueue(self, write: Callable[[], Any]) -> bool:
+        """Queue a write for the writer thread; False once the saver is closed."""
+        self._raise_error()
+        with self._applied:
+            self._counters["writes"] += 1
+            if self._closed:
+                return False
+            self._unapplied += 1
+            self._queue.put(write)
+            return True
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("A queued checkpoint write failed") from error
+
+    def _wait_applied(self):
+        with self._applied:
+            while self._unapplied:
+                self._applied.wait()
+
+    # --- SqliteSaver overrides ---------------------------------------------
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        # The writer thread leaves commits to its batch; any other caller first
+        # waits for the queued writes so it reads (and commits) after them
+        on_writer = threading.current_thread() is self._writer
+        if not on_writer:
+            self._wait_applied()
+        with self.lock:
+            self.setup()
+            cur = self.conn.cursor()
+            try:
+                yield cur
+            finally:
+                if transaction and not on_writer:
+                    self.conn.commit()
+                    self._counters["commits"] += 1
+                cur.close()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        # LangGraph hands over a copy of the checkpoint, safe to write later
+        if not self._enqueue(lambda: SqliteSaver.put(self, config, checkpoint, metadata, new_versions)):
+            return super().put(config, checkpoint, metadata, new_versions)
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": config["configurable"]["checkpoint_ns"],
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config, writes, task_id, task_path: str = ""):
+        writes = list(writes)
+        if not self._enqueue(lambda: SqliteSaver.put_writes(self, config, writes, task_id, task_path)):
+            super().put_writes(config, writes, task_id, task_path)
+
+    # --- Control -------------------------------------------------------------
+
+    def flush(self):
+        """Apply and commit every queued write."""
+        self._wait_applied()
+        self._commit()
+        self._raise_error()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"durability": self.durability, "queued": self._unapplied, **self._counters}
+
+    def close(self):
+        """Commit the queued writes and stop the writer thread."""
+        with self._applied:
+            was_open, self._closed = not self._closed, True
+        if was_open:
+            self._queue.put(None)
+            self._writer.join()
+        self._commit()
+        self._raise_error()
@@ -0,0 +1,74 @@
+# clients.py
+"""
+Shared chat model clients.
+
+All ChatOpenAI instances are built once and share one keep-alive HTTP
+connection pool, so nodes never pay client construction or TLS handshakes
+on the request path.
+"""
+
+import threading
+from typing import Dict, Tuple
+
+try:
+    import httpx
+    from langchain_openai import ChatOpenAI
+except Exception:
+    raise ImportError("Missing dependency: langchain_openai. Try: pip install langchain-openai")
+
+class ClientRegistry:
+    """
+    Registry of chat model clients keyed by (model, temperature, purpose).
+
+    Args:
+        max_connections: Maximum open connections in the shared pool
+        max_keepalive_connections: Idle connections kept alive for reuse
+        keepalive_expiry: Seconds an idle connection stays in the pool
+        timeout: Request timeout in seconds
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0
+    ):
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self._clients: Dict[Tuple[str, float, str], ChatOpenAI] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str, temperature: float, purpose: str = "default") -> ChatOpenAI:
+        """Return the client for (model, temperature, purpose), building it on first use."""
+        key = (model, temperature, purpose)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    http_client=self.http_client,
+                    http_async_client=self.http_async_client
+                )
+                self._clients[key] = client
+            return client
+
+    def keys(self):
+        with self._lock:
+            return list(self._clients)
+
+    def close(self):
+        """Close the shared connection pool."""
+        self.http_client.close()
+        try:
+            import asyncio
+            asyncio.run(self.http_async_client.aclose())
+        except RuntimeError:
+            # Already inside a running loop: let the caller close it asynchronously
+            pass
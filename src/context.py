@@ -0,0 +1,391 @@
+# context.py
+"""
+Context assembly for the drafter prompt.
+
+Retrieved passages are selected by maximal marginal relevance (relevant to the
+request, not redundant with what is already selected) under a token budget
+per intent, counted with the model tokenizer. The selected context is then
+compressed sentence by sentence before drafting.
+"""
+
+import math
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.retrieval import normalize_text
+
+# Token budget for the retrieved (internal) context, per intent
+DEFAULT_CONTEXT_BUDGETS: Dict[str, int] = {
+    "REPLY_EMAIL": 1500,
+    "NEW_EMAIL": 1200,
+    "SUMMARIZE_THREAD": 3000,
+}
+
+# Passages at least this similar to an already selected one are duplicates
+DUPLICATE_SIMILARITY = 0.95
+
+# --- Tokens --------------------------------------------------------------
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use (fails offline)
+        print(f"⚠️  Tokenizer unavailable ({e}); estimating tokens from length.")
+        return None
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Count tokens with the model tokenizer (about 4 characters per token without tiktoken)."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+# --- Similarity ----------------------------------------------------------
+
+def word_set(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]{2,}", normalize_text(text)))
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+def _cached_similarities(embeddings, query: str, texts: List[str]) -> Optional[List[float]]:
+    """
+    Cosine similarity of each text to the query, from the embedding cache only.
+
+    Returns None unless every vector (the query's included) is already cached:
+    new text is scored lexically rather than embedded on the request path.
+    """
+    lookup = getattr(embeddings, "cached_vectors", None)
+    if lookup is None:
+        return None
+    try:
+        vectors = lookup([query] + texts)
+    except Exception as e:
+        print(f"⚠️  Embedding cache error: {e}")
+        return None
+    if any(v is None for v in vectors):
+        return None
+    return [_cosine(vectors[0], v) for v in vectors[1:]]
+
+def _describe(doc) -> Dict[str, Any]:
+    meta = doc.metadata or {}
+    return {"source": meta.get("source"), "email_index": meta.get("email_index")}
+
+# --- Packing -------------------------------------------------------------
+
+def pack_context(
+    docs: List[Any],
+    query: str,
+    budget_tokens: int,
+    embeddings=None,
+    model: str = "gpt-4o-mini",
+    lambda_mult: float = 0.7,
+    separator: str = "\n\n"
+) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Select passages by maximal marginal relevance under a token budget.
+
+    Relevance and redundancy use embeddings when available (cached, so the
+    indexed passages are not re-embedded) and word overlap otherwise. The input
+    order (retrieval rank) breaks ties.
+
+    Returns:
+        (selected documents in selection order, report) where the report lists
+        the budget, tokens used and every dropped passage with its reason.
+    """
+    report: Dict[str, Any] = {"budget_tokens": budget_tokens, "used_tokens": 0, "selected": [], "dropped": []}
+    if not docs:
+        return [], report
+
+    texts = [doc.page_content for doc in docs]
+    vectors = None
+    if embeddings is not None:
+        try:
+            vectors = embeddings.embed_documents(texts)
+            query_vector = embeddings.embed_query(query)
+        except Exception as e:
+            print(f"⚠️  Context packing embedding error: {e}")
+            vectors = None
+    if vectors is not None:
+        relevance = [_cosine(query_vector, v) for v in vectors]
+        similarity = lambda i, j: _cosine(vectors[i], vectors[j])
+    else:
+        words = [word_set(t) for t in texts]
+        query_words = word_set(query)
+        # Word overlap with the query, plus a small prior for the retrieval rank
+        relevance = [
+            len(query_words & w) / (len(query_words) or 1) + 0.1 / (rank + 1)
+            for rank, w in enumerate(words)
+        ]
+        similarity = lambda i, j: _jaccard(words[i], words[j])
+
+    tokens = [count_tokens(t, model) for t in texts]
+    separator_tokens = count_tokens(separator, model)
+    remaining = list(range(len(docs)))
+    selected: List[int] = []
+    used = 0
+    while remaining:
+        def mmr(i: int) -> float:
+            redundancy = max((similarity(i, j) for j in selected), default=0.0)
+            return lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+        best = max(remaining, key=mmr)
+        remaining.remove(best)
+        if any(similarity(best, j) >= DUPLICATE_SIMILARITY for j in selected):
+            report["dropped"].append({**_describe(docs[best]), "reason": "duplicate", "tokens": tokens[best]})
+            continue
+        cost = tokens[best] + (separator_tokens if selected else 0)
+        if used + cost > budget_tokens:
+            report["dropped"].append({**_describe(docs[best]), "reason": "budget", "tokens": tokens[best]})
+            continue
+        selected.append(best)
+        used += cost
+
+    report["used_tokens"] = used
+    report["selected"] = [_describe(docs[i]) for i in selected]
+    return [docs[i] for i in selected], report
+
+# --- Compression ---------------------------------------------------------
+
+# Share of the context tokens kept by the compression stage, per intent
+DEFAULT_COMPRESSION_RATIOS: Dict[str, float] = {
+    "REPLY_EMAIL": 0.5,
+    "NEW_EMAIL": 0.5,
+    "SUMMARIZE_THREAD": 0.7,
+}
+
+# Contexts shorter than this are passed through unchanged
+MIN_COMPRESSION_TOKENS = 200
+
+EXTERNAL_MARKER = "--- External Information ---"
+
+# Lines kept verbatim: thread titles, email headers, subjects, web result headers
+HEADER_RE = re.compile(r"^(#{1,6}\s|\*\*Objet\*\*|\*\*Subject\*\*|Source:|Title:|--- .+ ---$)")
+
+# Greetings, closings, signatures and quoted text carry nothing for the draft
+BOILERPLATE_RE = re.compile(
+    r"^(>|-{3,}$|\[[^\]]*\]\s*$|"
+    r"(bonjour|bonsoir|hello|hi|dear|cher|chere)\b[^.!?]{0,30}[,!]?$|"
+    r"(bien a vous|bien cordialement|cordialement|merci d'avance|merci par avance|a bientot|bonne journee|"
+    r"best regards|kind regards|regards|thanks|thank you|cheers)\b[^.!?]{0,20}[,.!]?$|"
+    r"(j'espere que (vous allez|tu vas) bien|i hope (you are|you're) (well|doing well))[^.!?]{0,10}[.!]?$)"
+)
+
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])(?<!\b\d\.)\s+")
+
+def _split_units(text: str) -> List[Tuple[int, str, str]]:
+    """Split text into (line number, kind, text) units: "header", "boilerplate" or "sentence"."""
+    units = []
+    seen = set()
+    for line_no, line in enumerate(text.splitlines()):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if HEADER_RE.match(stripped):
+            units.append((line_no, "header", stripped))
+            continue
+        for sentence in SENTENCE_SPLIT_RE.split(stripped):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            plain = normalize_text(sentence).replace("’", "'").strip("*_ ")
+            # Repeated sentences (quoted replies) are dropped like boilerplate
+            kind = "boilerplate" if BOILERPLATE_RE.match(plain) or plain in seen else "sentence"
+            seen.add(plain)
+            units.append((line_no, kind, sentence))
+    return units
+
+def compress_text(
+    text: str,
+    query: str,
+    ratio: float,
+    embeddings=None,
+    model: str = "gpt-4o-mini",
+    min_tokens: int = MIN_COMPRESSION_TOKENS
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Keep the sentences most relevant to the query, about `ratio` of the tokens.
+
+    Headers (thread title, email header and subject, web source) are always
+    kept and boilerplate is always dropped. The remaining sentences are scored
+    by word overlap with the query and, when the embedding cache already holds
+    every sentence, cosine similarity; the best ones are kept in their
+    original order.
+
+    Returns:
+        (compressed text, report with token counts and sentence counts)
+    """
+    original_tokens = count_tokens(text, model)
+    report: Dict[str, Any] = {
+        "original_tokens": original_tokens,
+        "compressed_tokens": original_tokens,
+        "sentences_total": 0,
+        "sentences_kept": 0,
+    }
+    if not text or ratio >= 1 or original_tokens < min_tokens:
+        return text, report
+
+    units = _split_units(text)
+    candidates = [i for i, (_, kind, _) in enumerate(units) if kind == "sentence"]
+    report["sentences_total"] = len(candidates)
+    if not candidates:
+        return text, report
+
+    sentences = [units[i][2] for i in candidates]
+    query_words = word_set(query)
+    scores = [
+        len(query_words & word_set(s)) / (len(query_words) or 1)
+        # Dates, amounts and deadlines are usually worth keeping
+        + (0.1 if re.search(r"\d", s) else 0.0)
+        for s in sentences
+    ]
+    similarities = _cached_similarities(embeddings, query, sentences)
+    if similarities is not None:
+        scores = [0.5 * s + c for s, c in zip(scores, similarities)]
+
+    header_tokens = sum(count_tokens(u[2], model) for u in units if u[1] == "header")
+    target = max(0, int(original_tokens * ratio) - header_tokens)
+    kept = set()
+    used = 0
+    for rank in sorted(range(len(candidates)), key=lambda r: (-scores[r], r)):
+        if used >= target:
+            break
+        kept.add(candidates[rank])
+        used += count_tokens(sentences[rank], model)
+
+    lines: Dict[int, List[str]] = {}
+    for i, (line_no, kind, unit) in enumerate(units):
+        if kind == "header" or i in kept:
+            lines.setdefault(line_no, []).append(unit)
+    output = []
+    for line_no in sorted(lines):
+        line = " ".join(lines[line_no])
+        # Keep a blank line before each section so the structure stays readable
+        if output and line.startswith(("#", "Source:", EXTERNAL_MARKER)):
+            output.append("")
+        output.append(line)
+    compressed = "\n".join(output)
+
+    report["compressed_tokens"] = count_tokens(compressed, model)
+    report["sentences_kept"] = len(kept)
+    return compressed, report
+
+# --- Web passages --------------------------------------------------------
+
+# Token budget for the web results appended to the context
+DEFAULT_WEB_BUDGET = 600
+
+# Target passage size when splitting a web result
+PASSAGE_TOKENS = 80
+
+# Page text read per web result (pages can be very long; the start is usually the article)
+RAW_CONTENT_CHARS = 8000
+
+def split_passages(text: str, max_tokens: int = PASSAGE_TOKENS, model: str = "gpt-4o-mini") -> List[str]:
+    """Split text into passages of whole sentences, about `max_tokens` each."""
+    sentences = [s.strip() for s in SENTENCE_SPLIT_RE.split(" ".join(text.split())) if s.strip()]
+    passages: List[str] = []
+    current: List[str] = []
+    size = 0
+    for sentence in sentences:
+        tokens = count_tokens(sentence, model)
+        if current and size + tokens > max_tokens:
+            passages.append(" ".join(current))
+            current, size = [], 0
+        current.append(sentence)
+        size += tokens
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+def pack_web_results(
+    results: List[Dict[str, Any]],
+    query: str,
+    budget_tokens: int = DEFAULT_WEB_BUDGET,
+    embeddings=None,
+    model: str = "gpt-4o-mini",
+    min_relative_score: float = 0.25
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Rank passages of the web results against the query and pack the best ones.
+
+    Passages come from each result's snippet and the start of its page text
+    (`raw_content`, up to RAW_CONTENT_CHARS) when the search returned it.
+    Passages are scored by word overlap with the query and, when the embedding
+    cache already holds every passage, cosine similarity, plus a small prior
+    for the search rank.
+    Near-duplicate passages and passages scoring below `min_relative_score`
+    of the best one are skipped, so the budget is a cap, not a target.
+    Selected passages are grouped under their source ("Source:/Title:/Content:")
+    in search rank order, and the headers count against the budget.
+
+    Returns:
+        (formatted web information, report with tokens used and per-source passage counts)
+    """
+    report: Dict[str, Any] = {
+        "budget_tokens": budget_tokens, "used_tokens": 0,
+        "results": len(results), "passages": 0, "selected": 0, "sources": []
+    }
+    passages: List[Tuple[int, str]] = []
+    for rank, result in enumerate(results):
+        for content in (result.get("content"), (result.get("raw_content") or "")[:RAW_CONTENT_CHARS]):
+            if content:
+                passages.extend((rank, p) for p in split_passages(content, model=model))
+    report["passages"] = len(passages)
+    if not passages:
+        return "", report
+
+    texts = [p for _, p in passages]
+    query_words = word_set(query)
+    words = [word_set(t) for t in texts]
+    scores = [
+        len(query_words & w) / (len(query_words) or 1) + 0.1 / (rank + 1)
+        for (rank, _), w in zip(passages, words)
+    ]
+    similarities = _cached_similarities(embeddings, query, texts)
+    if similarities is not None:
+        scores = [s + c for s, c in zip(scores, similarities)]
+
+    def header(rank: int) -> str:
+        result = results[rank]
+        return f"Source: {result.get('url', 'N/A')}\nTitle: {result.get('title', 'N/A')}\nContent:"
+
+    selected: Dict[int, List[int]] = {}
+    used = 0
+    floor = max(scores) * min_relative_score
+    for i in sorted(range(len(passages)), key=lambda i: -scores[i]):
+        rank, text = passages[i]
+        if scores[i] < floor:
+            break
+        if any(_jaccard(words[i], words[j]) >= 0.8 for chosen in selected.values() for j in chosen):
+            continue
+        cost = count_tokens(text, model) + (0 if rank in selected else count_tokens(header(rank), model) + 2)
+        if used + cost > budget_tokens:
+            continue
+        selected.setdefault(rank, []).append(i)
+        used += cost
+
+    blocks = []
+    for rank in sorted(selected):
+        # Passages of one source keep their original order
+        content = " … ".join(passages[i][1] for i in sorted(selected[rank]))
+        blocks.append(f"{header(rank)} {content}")
+        report["sources"].append({"url": results[rank].get("url"), "passages": len(selected[rank])})
+    web_info = "\n\n".join(blocks)
+    report["used_tokens"] = count_tokens(web_info, model)
+    report["selected"] = sum(len(v) for v in selected.values())
+    return web_info, report
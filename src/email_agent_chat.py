@@ -6,8 +6,9 @@ Interactive chat interface for the persistent email automation agent.
 import os
 import uuid
 import argparse
-from src.build_agent import build_email_agent
-from src.utils import get_checkpointer, reviewer_node
+from src.build_agent import build_email_agent, add_agent_arguments, agent_options
+from src.utils import get_checkpointer, reviewer_node, graph_events, run_options
+from src.batch import run_batch
 
 HELP = """
 Commands:
@@ -18,6 +19,11 @@ Commands:
   /edit <text>          Edit the draft with new text
   /id                   Show current thread_id
   /intent               Show detected intent
+  /cache                Show LLM, semantic, embedding and search cache counters
+  /rules                Show pre-review rule hit counts
+  /models               Show the model tier of each node and SLO fallbacks
+  /stats [--all]        Per-node time, LLM calls, tokens and cache hits for this
+                        thread (--all: p50/p95/p99 per node over every thread)
   /help                 Show this help
   /exit                 Quit
 """
@@ -85,7 +91,140 @@ def print_state(app, config):
     print("  ❓ /help  - Show all commands")
     print("  🚪 /exit  - Quit")
 
-def run_chat(app, db_path: str, llm, langfuse_handler=None):
+def print_cache_stats(llm_cache, semantic_cache=None, embeddings=None, search_cache=None):
+    """Print LLM, semantic, embedding and web search cache counters."""
+    if not llm_cache:
+        print("LLM cache disabled.")
+    else:
+        stats = llm_cache.stats()
+        print(f"LLM cache: {stats['entries']} entries, {stats['hits']} hits, "
+              f"{stats['misses']} misses (hit rate {stats['hit_rate']:.0%})")
+        for node, counters in sorted(stats["per_node"].items()):
+            print(f"  {node}: {counters['hits']} hits / {counters['misses']} misses")
+    if not semantic_cache:
+        print("Semantic cache disabled.")
+    else:
+        stats = semantic_cache.stats()
+        print(f"Semantic cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.0%})")
+        for node, size in sorted(stats["entries"].items()):
+            print(f"  {node}: {size} entries")
+    if embeddings is not None and hasattr(embeddings, "stats"):
+        stats = embeddings.stats()
+        print(f"Embedding cache: {stats['entries']} vectors, {stats['hits']} hits, {stats['misses']} misses")
+    if search_cache:
+        stats = search_cache.stats()
+        print(f"Search cache: {stats['entries']} queries, {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['coalesced']} coalesced (hit rate {stats['hit_rate']:.0%})")
+
+def print_rule_stats(review_rules):
+    """Print pre-review counters and hits per rule."""
+    if not review_rules:
+        print("Pre-review rules disabled.")
+        return
+    stats = review_rules.stats()
+    print(f"Pre-review: {stats['checks']} checks, {stats['rejected']} rejected without LLM, "
+          f"{stats['skipped_llm']} approved without LLM (policy: {stats['skip_llm']})")
+    for rule, hits in sorted(stats["hits"].items(), key=lambda item: -item[1]):
+        print(f"  {rule} ({stats['severities'][rule]}): {hits} hits")
+
+def print_model_routes(model_router):
+    """Print each node's tier, model, calls and latency-SLO fallbacks."""
+    if not model_router:
+        print("Model routing disabled.")
+        return
+    stats = model_router.stats()
+    print("Model tiers: " + ", ".join(f"{name}={spec['model']}" for name, spec in stats["tiers"].items()))
+    for node, route in stats["nodes"].items():
+        line = f"  {node}: {route['tier']} ({route['model']})"
+        if route["intents"]:
+            line += " | " + ", ".join(f"{intent}->{tier}" for intent, tier in route["intents"].items())
+        if route["slo"] is not None:
+            latency = f"{route['latency']:.1f}s" if route["latency"] is not None else "n/a"
+            line += (f" | SLO {route['slo']:.1f}s, latency {latency}, {route['fallbacks']} fallback(s)"
+                     + (" [on fallback]" if route["degraded"] else ""))
+        if route["calls"]:
+            line += " | calls " + ", ".join(f"{tier}: {n}" for tier, n in sorted(route["calls"].items()))
+        print(line)
+
+def print_node_stats(metrics, thread_id: str, all_threads: bool = False):
+    """Print per-node metrics of one thread, or latency percentiles over every thread."""
+    if not metrics:
+        print("Node metrics disabled.")
+        return
+    if all_threads:
+        rows = metrics.node_percentiles()
+        if not rows:
+            print("No node runs recorded yet.")
+            return
+        print(f"{'node':<18}{'runs':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'total':>10}"
+              f"{'calls':>7}{'tok in':>8}{'tok out':>8}{'hits':>6}")
+        for r in rows:
+            print(f"{r['node']:<18}{r['runs']:>6}{r['p50']:>8.2f}s{r['p95']:>8.2f}s{r['p99']:>8.2f}s"
+                  f"{r['total_seconds']:>9.1f}s{r['avg_llm_calls']:>7.1f}{r['avg_prompt_tokens']:>8.0f}"
+                  f"{r['avg_completion_tokens']:>8.0f}{r['avg_cache_hits']:>6.1f}")
+        print("(calls, tokens and hits are averages per run)")
+        return
+    rows = metrics.thread_stats(thread_id)
+    if not rows:
+        print("No node runs recorded for this thread yet.")
+        return
+    total = sum(r["seconds"] for r in rows) or 1.0
+    print(f"{'node':<18}{'runs':>6}{'time':>9}{'share':>7}{'calls':>7}{'tok in':>8}{'tok out':>8}{'hits':>6}")
+    for r in rows:
+        print(f"{r['node']:<18}{r['runs']:>6}{r['seconds']:>8.2f}s{r['seconds'] / total:>7.0%}"
+              f"{r['llm_calls']:>7}{r['prompt_tokens']:>8}{r['completion_tokens']:>8}{r['cache_hits']:>6}"
+              + (f"  ({r['errors']} error(s))" if r["errors"] else ""))
+
+# Progress line printed when each node finishes (streaming mode)
+NODE_LABELS = {
+    "intent_classifier": "🧭 Intent",
+    "retrieval": "📚 Retrieval",
+    "web_search": "🌐 Web search",
+    "compression": "✂️  Compression",
+    "drafter": "✍️  Draft",
+    "reviewer": "🔎 Review",
+}
+
+def stream_graph(app, inputs, config):
+    """
+    Run the graph and print progress as it happens.
+    
+    Each node prints a line when it finishes, the drafter's tokens are
+    printed as they arrive and the reviewer verdict follows the draft.
+    """
+    in_draft = False
+    for event in graph_events(app, inputs, config):
+        if event["type"] == "token":
+            if not in_draft:
+                print("\n[DRAFT]")
+                in_draft = True
+            print(event["text"], end="", flush=True)
+            continue
+        if in_draft:
+            print()
+            in_draft = False
+        if event["type"] == "done":
+            if event["first_token"] is not None:
+                print(f"⏱️  First draft token after {event['first_token']:.1f}s, "
+                      f"finished in {event['elapsed']:.1f}s")
+            continue
+        
+        node = event["node"]
+        if node not in NODE_LABELS:
+            continue
+        if node == "drafter" and not event["streamed"] and event["draft"]:
+            # Cached or non-streaming model: show the whole draft at once
+            print(f"\n[DRAFT]\n{event['draft']}")
+        if node == "reviewer":
+            status = "✅ Approved" if event["review_approved"] else "❌ Needs revision"
+            print(f"\n{NODE_LABELS[node]}: {status} ({event['elapsed']:.1f}s)")
+            if event["review_issues"]:
+                print(f"   Issues: {', '.join(event['review_issues'])}")
+            continue
+        print(f"{NODE_LABELS[node]}: {event['detail']} ({event['elapsed']:.1f}s)", flush=True)
+
+def run_chat(app, db_path: str, llm, langfuse_handler=None, services=None, stream: bool = True):
     """Main REPL loop."""
     print("\n✅ Email automation agent ready.")
     print(f"Persistence DB: {db_path}")
@@ -96,6 +235,7 @@ def run_chat(app, db_path: str, llm, langfuse_handler=None):
     if langfuse_handler:
         config["callbacks"] = [langfuse_handler]
     current_input = None
+    services = services or {}
 
     print(f"\nCurrent thread_id: {thread_id}")
     while True:
@@ -121,13 +261,31 @@ def run_chat(app, db_path: str, llm, langfuse_handler=None):
                 values = getattr(snap, "values", snap)
                 intent = values.get("intent", "Not classified yet")
                 confidence = values.get("intent_confidence", 0)
-                print(f"Intent: {intent} (confidence: {confidence:.2f})")
+                source = values.get("intent_source", "llm")
+                print(f"Intent: {intent} (confidence: {confidence:.2f}, via {source})")
             else:
                 print("No state yet. Start with /new")
             continue
         if cmd == "/show":
             print_state(app, config)
             continue
+        if cmd == "/cache":
+            print_cache_stats(
+                services.get("llm_cache"),
+                services.get("semantic_cache"),
+                services.get("embeddings"),
+                services.get("search_cache")
+            )
+            continue
+        if cmd == "/rules":
+            print_rule_stats(services.get("review_rules"))
+            continue
+        if cmd in ("/stats", "/stats --all"):
+            print_node_stats(services.get("metrics"), thread_id, all_threads=cmd.endswith("--all"))
+            continue
+        if cmd == "/models":
+            print_model_routes(services.get("model_router"))
+            continue
 
         if cmd.startswith("/new "):
             current_input = cmd[5:].strip()
@@ -145,10 +303,11 @@ def run_chat(app, db_path: str, llm, langfuse_handler=None):
                 invoke_config = config.copy()
                 if langfuse_handler:
                     invoke_config["callbacks"] = [langfuse_handler]
-                result = app.invoke(
-                    {"user_input": current_input, "history": [], "step_count": 0},
-                    config=invoke_config
-                )
+                inputs = {"user_input": current_input, "history": [], "step_count": 0}
+                if stream:
+                    stream_graph(app, inputs, invoke_config)
+                else:
+                    result = app.invoke(inputs, config=invoke_config, **run_options(app))
                 print("\n⏸️  Paused for human review. Use /show to see the draft, then /approve or /edit")
             except Exception as e:
                 print(f"❌ Error: {e}")
@@ -159,7 +318,10 @@ def run_chat(app, db_path: str, llm, langfuse_handler=None):
                 invoke_config = config.copy()
                 if langfuse_handler:
                     invoke_config["callbacks"] = [langfuse_handler]
-                result = app.invoke(None, config=invoke_config)
+                if stream:
+                    stream_graph(app, None, invoke_config)
+                else:
+                    result = app.invoke(None, config=invoke_config, **run_options(app))
                 snap = app.get_state(config)
                 if snap:
                     values = getattr(snap, "values", snap)
@@ -221,7 +383,9 @@ def run_chat(app, db_path: str, llm, langfuse_handler=None):
                 # Re-run reviewer on the updated draft so [REVIEW STATUS] is refreshed
                 snap = app.get_state(config)
                 values = getattr(snap, "values", snap)
-                review_update = reviewer_node(values, llm)
+                router = services.get("model_router")
+                review_llm = router.bind("reviewer", values.get("intent")) if router else llm
+                review_update = reviewer_node(values, review_llm, rules=services.get("review_rules"))
                 app.update_state(config, review_update)
                 print("🔁 Review updated. Use /show to see the new [REVIEW STATUS].")
             except Exception as e:
@@ -232,12 +396,15 @@ def run_chat(app, db_path: str, llm, langfuse_handler=None):
 
 def main():
     parser = argparse.ArgumentParser(description="Email Automation Agent CLI")
-    parser.add_argument("--db", default="email_agent.db", help="SQLite database path")
-    parser.add_argument("--vector-db", default="./chroma_db", help="ChromaDB directory")
-    parser.add_argument("--vector-data", default="vector_data", help="Vector data directory")
-    parser.add_argument("--model", default="gpt-4o-mini", help="OpenAI model to use")
+    add_agent_arguments(parser)
     parser.add_argument("--fresh", action="store_true", help="Start with fresh database")
-    parser.add_argument("--no-langfuse", action="store_true", help="Disable Langfuse monitoring")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="Print results only when the graph pauses instead of streaming progress")
+    parser.add_argument("--batch", metavar="INPUT_JSONL",
+                        help="Run the instructions of a JSONL file instead of the interactive chat")
+    parser.add_argument("--out", default="results.jsonl",
+                        help="Batch output JSONL (finished lines are skipped when rerun)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent instructions in batch mode")
     args = parser.parse_args()
 
     if args.fresh and os.path.exists(args.db):
@@ -246,22 +413,26 @@ def main():
 
     # Build workflow components
     try:
-        workflow, llm, vector_store, search_tool, langfuse_handler = build_email_agent(
-            db_path=args.db,
-            vector_db_path=args.vector_db,
-            vector_data_dir=args.vector_data,
-            model=args.model,
-            enable_langfuse=not args.no_langfuse
+        workflow, llm, vector_store, search_tool, langfuse_handler, services = build_email_agent(
+            **agent_options(args)
         )
         
-        # Compile and run chat interface (with checkpointer in context)
-        with get_checkpointer(args.db) as checkpointer:
+        # Compile and run chat interface (with checkpointer in context); a batch
+        # can be re-run, so it trades per-step commits for throughput by default
+        durability = args.durability or ("async" if args.batch else "step")
+        with get_checkpointer(args.db, durability=durability) as checkpointer:
             agent = workflow.compile(
                 checkpointer=checkpointer,
                 interrupt_after=["reviewer"]  # Show review status before human approval
             )
-            # Store langfuse_handler and llm for use in run_chat
-            run_chat(agent, args.db, llm, langfuse_handler)
+            if args.batch:
+                run_batch(agent, args.batch, args.out, workers=args.workers, langfuse_handler=langfuse_handler)
+            else:
+                # Store langfuse_handler and llm for use in run_chat
+                run_chat(agent, args.db, llm, langfuse_handler, services, stream=not args.no_stream)
+        
+        if services.get("clients"):
+            services["clients"].close()
         
     except Exception as e:
         print(f"❌ Error building agent: {e}")
@@ -0,0 +1,205 @@
+# embedding_cache.py
+"""
+Persistent embedding cache shared by indexing and querying.
+
+Vectors are stored as fixed-size float32 rows in one binary file per
+(model, dimension); an SQLite index maps the content hash of each text to its
+row. Identical text is therefore never embedded twice, whether it comes from
+a `./chroma_db` rebuild or from a repeated query.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+try:
+    from langchain_core.embeddings import Embeddings
+except Exception:
+    raise ImportError("Missing dependency: langchain-core. Try: pip install langchain-core")
+
+def _model_name(embeddings) -> str:
+    return str(getattr(embeddings, "model", None) or type(embeddings).__name__)
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by an on-disk vector store.
+
+    Args:
+        embeddings: Underlying LangChain embeddings (e.g. OpenAIEmbeddings)
+        cache_dir: Directory holding `index.sqlite` and the `*.f32` vector files
+        max_entries: LRU bound on the number of cached vectors
+    """
+
+    def __init__(self, embeddings: Embeddings, cache_dir: str, max_entries: int = 50000):
+        self.embeddings = embeddings
+        self.model = _model_name(embeddings)
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._files: Dict[int, object] = {}
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " slot INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_lru ON embeddings(model, dim, last_used)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS free_slots (model TEXT, dim INTEGER, slot INTEGER, PRIMARY KEY (model, dim, slot))"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS models (model TEXT PRIMARY KEY, dim INTEGER NOT NULL)")
+        self._conn.commit()
+        row = self._conn.execute("SELECT dim FROM models WHERE model = ?", (self.model,)).fetchone()
+        self.dim: Optional[int] = row[0] if row else None
+
+    # --- Storage -----------------------------------------------------------
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}|{self.dim}|{text}".encode("utf-8")).hexdigest()
+
+    def _file(self):
+        handle = self._files.get(self.dim)
+        if handle is None:
+            safe_model = re.sub(r"[^A-Za-z0-9._-]", "_", self.model)
+            path = os.path.join(self.cache_dir, f"{safe_model}-{self.dim}.f32")
+            if not os.path.exists(path):
+                open(path, "wb").close()
+            handle = open(path, "r+b")
+            self._files[self.dim] = handle
+        return handle
+
+    def _read(self, slot: int) -> List[float]:
+        handle = self._file()
+        handle.seek(slot * self.dim * 4)
+        values = array("f")
+        values.frombytes(handle.read(self.dim * 4))
+        return list(values)
+
+    def _write(self, slot: int, vector: List[float]):
+        handle = self._file()
+        handle.seek(slot * self.dim * 4)
+        handle.write(array("f", vector).tobytes())
+
+    def _next_slot(self) -> int:
+        row = self._conn.execute(
+            "SELECT slot FROM free_slots WHERE model = ? AND dim = ? LIMIT 1", (self.model, self.dim)
+        ).fetchone()
+        if row:
+            self._conn.execute(
+                "DELETE FROM free_slots WHERE model = ? AND dim = ? AND slot = ?", (self.model, self.dim, row[0])
+            )
+            return row[0]
+        handle = self._file()
+        handle.seek(0, os.SEEK_END)
+        return handle.tell() // (self.dim * 4)
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count <= self.max_entries:
+            return
+        victims = self._conn.execute(
+            "SELECT key, model, dim, slot FROM embeddings ORDER BY last_used ASC LIMIT ?",
+            (count - self.max_entries,)
+        ).fetchall()
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(v[0],) for v in victims])
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO free_slots (model, dim, slot) VALUES (?, ?, ?)", [v[1:] for v in victims]
+        )
+
+    def _lookup(self, texts: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the texts that are present."""
+        if self.dim is None:
+            return {}
+        found = {}
+        now = time.time()
+        keys = {self._key(t): t for t in texts}
+        with self._lock:
+            for key, text in keys.items():
+                row = self._conn.execute(
+                    "SELECT slot FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    found[text] = self._read(row[0])
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, self._key(t)) for t in found]
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]):
+        if not vectors:
+            return
+        now = time.time()
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(next(iter(vectors.values())))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO models (model, dim) VALUES (?, ?)", (self.model, self.dim)
+                )
+            for text, vector in vectors.items():
+                key = self._key(text)
+                if self._conn.execute("SELECT 1 FROM embeddings WHERE key = ?", (key,)).fetchone():
+                    continue
+                slot = self._next_slot()
+                self._write(slot, vector)
+                self._conn.execute(
+                    "INSERT INTO embeddings (key, model, dim, slot, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, self.model, self.dim, slot, now)
+                )
+            self._file().flush()
+            self._evict()
+            self._conn.commit()
+
+    # --- Embeddings interface ----------------------------------------------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached = self._lookup(texts)
+        missing = list(dict.fromkeys(t for t in texts if t not in cached))
+        self.hits += sum(1 for t in texts if t in cached)
+        self.misses += len(missing)
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            self._store(computed)
+            cached.update(computed)
+        return [cached[t] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        cached = self._lookup([text])
+        if text in cached:
+            self.hits += 1
+            return cached[text]
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self._store({text: vector})
+        return vector
+
+    def cached_vectors(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Vectors already in the cache (None for the others), without calling the model."""
+        cached = self._lookup(texts)
+        return [cached.get(t) for t in texts]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return {"entries": size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            for handle in self._files.values():
+                handle.close()
+            self._files.clear()
+            self._conn.close()
@@ -0,0 +1,175 @@
+# intent.py
+"""
+Local (in-process) intent classification.
+
+Keyword/regex rules catch the unambiguous requests ("Reply to...", "Summarize...");
+a nearest-centroid model over embeddings of labelled examples handles the rest.
+The LLM is only needed when neither is confident enough.
+"""
+
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+INTENTS = ("REPLY_EMAIL", "NEW_EMAIL", "SUMMARIZE_THREAD")
+
+# (pattern, intent, confidence) - patterns are matched case-insensitively
+INTENT_RULES: List[Tuple[str, str, float]] = [
+    (r"^\s*(reply|respond|answer)\b", "REPLY_EMAIL", 0.95),
+    (r"^\s*(réponds|reponds|répondre|repondre|réponse|reponse)\b", "REPLY_EMAIL", 0.95),
+    (r"\b(reply|replying|respond|responding|answer|answering) to\b", "REPLY_EMAIL", 0.85),
+    (r"\b(réponds|reponds|répondre|repondre) à\b", "REPLY_EMAIL", 0.85),
+    (r"^\s*(summari[sz]e|summary of|recap|tl;?dr)\b", "SUMMARIZE_THREAD", 0.95),
+    (r"^\s*(résume|résumer|resumer|synthétise|synthetise)\b", "SUMMARIZE_THREAD", 0.95),
+    (r"\b(summari[sz]e|summary|recap|résumé|résumer|synthèse)\b", "SUMMARIZE_THREAD", 0.8),
+    (r"^\s*(write|draft|compose|send|create)\b.*\b(e-?mail|mail|message|note)\b", "NEW_EMAIL", 0.9),
+    (r"^\s*(écris|ecris|écrire|ecrire|rédige|redige|envoie|prépare|prepare)\b.*\b(e-?mail|mail|message)\b", "NEW_EMAIL", 0.9),
+    (r"\b(new|nouvel|nouveau) (e-?mail|mail|message)\b", "NEW_EMAIL", 0.8),
+]
+
+LABELLED_EXAMPLES: Dict[str, List[str]] = {
+    "REPLY_EMAIL": [
+        "Reply to this email confirming the meeting",
+        "Respond to Sophie's message about the Q4 plan",
+        "Answer the client and accept the renewal proposal",
+        "Write back to Mathias to say the deadline works for us",
+        "Réponds à Mme Rossi pour confirmer le renouvellement",
+        "Fais une réponse à Sophie pour valider la présentation",
+    ],
+    "NEW_EMAIL": [
+        "Write an email to thank a client for their business",
+        "Draft an email inviting the team to the kickoff meeting",
+        "Send a follow-up email to a prospect about our offer",
+        "Write an email about the latest news from Microsoft",
+        "Ecris un mail à Sophie pour faire un point sur le plan Q4",
+        "Rédige un email de relance pour le client Rossi",
+    ],
+    "SUMMARIZE_THREAD": [
+        "Summarize the conversation with Mathias about project X",
+        "Give me a summary of the thread with Mme Rossi",
+        "What was decided in the Q4 meeting emails?",
+        "Recap the key points and next steps of this thread",
+        "Résume la conversation avec Sophie sur la réunion Q4",
+        "Fais une synthèse des échanges sur le projet X",
+    ],
+}
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    """Cosine similarity between two vectors."""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+class IntentClassifier:
+    """
+    Rules + nearest-centroid intent classifier.
+
+    Args:
+        embeddings: LangChain embeddings object (optional; rules only if missing)
+        threshold: Minimum confidence to trust the local prediction
+        examples: Labelled examples per intent (defaults to LABELLED_EXAMPLES)
+        rules: (pattern, intent, confidence) rules (defaults to INTENT_RULES)
+        temperature: Softmax temperature applied to centroid similarities
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        threshold: float = 0.75,
+        examples: Optional[Dict[str, List[str]]] = None,
+        rules: Optional[List[Tuple[str, str, float]]] = None,
+        temperature: float = 0.05
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.examples = examples or LABELLED_EXAMPLES
+        self.rules = [(re.compile(p, re.IGNORECASE), intent, conf) for p, intent, conf in (rules or INTENT_RULES)]
+        self.temperature = temperature
+        self._centroids: Optional[Dict[str, List[float]]] = None
+        self._lock = threading.Lock()
+
+    # --- Rules ---------------------------------------------------------
+
+    def classify_rules(self, text: str) -> Tuple[Optional[str], float]:
+        """Return (intent, confidence) from the regex rules, or (None, 0.0)."""
+        best: Dict[str, float] = {}
+        for pattern, intent, conf in self.rules:
+            if pattern.search(text):
+                best[intent] = max(best.get(intent, 0.0), conf)
+        if not best:
+            return None, 0.0
+        ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)
+        intent, conf = ranked[0]
+        if len(ranked) > 1:
+            # Conflicting rules (e.g. "write a reply summarizing...") lower the confidence
+            conf = conf * (1.0 - ranked[1][1] / 2)
+        return intent, conf
+
+    # --- Nearest centroid ----------------------------------------------
+
+    def _get_centroids(self) -> Dict[str, List[float]]:
+        """Embed the labelled examples once and cache one centroid per intent."""
+        with self._lock:
+            if self._centroids is None:
+                centroids = {}
+                for intent, texts in self.examples.items():
+                    vectors = self.embeddings.embed_documents(texts)
+                    mean = [sum(col) / len(vectors) for col in zip(*vectors)]
+                    centroids[intent] = _normalize(mean)
+                self._centroids = centroids
+            return self._centroids
+
+    def embed(self, text: str) -> Optional[List[float]]:
+        """Embed the user input (None if no embeddings are configured)."""
+        if not self.embeddings:
+            return None
+        return self.embeddings.embed_query(text)
+
+    def classify_centroid(self, text: str, vector: Optional[List[float]] = None) -> Tuple[Optional[str], float]:
+        """Return (intent, confidence) from the nearest centroid, or (None, 0.0)."""
+        if not self.embeddings:
+            return None, 0.0
+        centroids = self._get_centroids()
+        vector = vector if vector is not None else self.embed(text)
+        sims = {intent: _cosine(vector, centroid) for intent, centroid in centroids.items()}
+        # Softmax over similarities: the confidence reflects the margin to the other intents
+        top = max(sims.values())
+        weights = {intent: math.exp((s - top) / self.temperature) for intent, s in sims.items()}
+        total = sum(weights.values())
+        intent = max(weights, key=weights.get)
+        return intent, weights[intent] / total
+
+    # --- Combined ------------------------------------------------------
+
+    def classify(self, text: str) -> Tuple[Optional[str], float, str]:
+        """
+        Classify the request locally.
+
+        Returns:
+            (intent, confidence, method) where method is "rules", "centroid" or
+            "rules+centroid". The caller should fall back to the LLM when the
+            confidence is below `threshold`.
+        """
+        rule_intent, rule_conf = self.classify_rules(text)
+        if rule_intent and rule_conf >= self.threshold:
+            return rule_intent, rule_conf, "rules"
+
+        try:
+            centroid_intent, centroid_conf = self.classify_centroid(text)
+        except Exception as e:
+            print(f"⚠️  Intent embedding error: {e}")
+            centroid_intent, centroid_conf = None, 0.0
+
+        if rule_intent and centroid_intent == rule_intent:
+            # Independent signals agree: combine them
+            return rule_intent, 1.0 - (1.0 - rule_conf) * (1.0 - centroid_conf), "rules+centroid"
+        if centroid_intent and centroid_conf >= rule_conf:
+            return centroid_intent, centroid_conf, "centroid"
+        if rule_intent:
+            return rule_intent, rule_conf, "rules"
+        return None, 0.0, "none"
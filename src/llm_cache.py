@@ -0,0 +1,188 @@
+# llm_cache.py
+"""
+Persistent, content-addressed cache for LLM responses.
+
+Entries are keyed on (model, temperature, prompt hash) and stored in SQLite,
+with TTL expiry and LRU size eviction. Nodes get a `CachedChatModel` wrapper
+around the model built by `make_llm`; nodes that should not be cached (e.g. the
+drafter at temperature 0.7) simply get the raw model.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+try:
+    from langchain_core.messages import AIMessage
+except Exception:
+    raise ImportError("Missing dependency: langchain-core. Try: pip install langchain-core")
+
+def default_cache_path(db_path: str, filename: str = "llm_cache.db") -> str:
+    """Place a cache file next to the persistence DB (e.g. email_agent.db)."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), filename)
+
+def _prompt_text(prompt: Any) -> str:
+    """Stable text representation of a prompt (string or list of messages)."""
+    if isinstance(prompt, str):
+        return prompt
+    if isinstance(prompt, (list, tuple)):
+        return json.dumps(
+            [[getattr(m, "type", "human"), getattr(m, "content", m)] for m in prompt],
+            ensure_ascii=False,
+            default=str
+        )
+    return str(prompt)
+
+def model_identity(llm) -> Dict[str, Any]:
+    """Extract (model, temperature) from a chat model for cache keys."""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    temperature = getattr(llm, "temperature", None)
+    return {"model": str(model), "temperature": temperature}
+
+class LLMCache:
+    """
+    SQLite-backed LLM response store.
+
+    Args:
+        db_path: SQLite file for the cache
+        ttl_seconds: Entries older than this are ignored and purged (None = no expiry)
+        max_entries: LRU bound on the number of stored responses
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: Optional[float] = 7 * 24 * 3600, max_entries: int = 5000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " node TEXT,"
+            " model TEXT,"
+            " content TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+        self._conn.commit()
+        # node -> {"hits": int, "misses": int}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(model: str, temperature: Optional[float], prompt: Any) -> str:
+        """Content address of a request."""
+        prompt_hash = hashlib.sha256(_prompt_text(prompt).encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{model}|{temperature}|{prompt_hash}".encode("utf-8")).hexdigest()
+
+    def _count(self, node: Optional[str], field: str):
+        counters = self._counters.setdefault(node or "default", {"hits": 0, "misses": 0})
+        counters[field] += 1
+
+    def get(self, key: str, node: Optional[str] = None) -> Optional[str]:
+        """Return the cached content for `key`, or None on miss/expiry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self._count(node, "misses")
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._count(node, "hits")
+            return row[0]
+
+    def put(self, key: str, content: str, node: Optional[str] = None, model: Optional[str] = None):
+        """Store a response and enforce the TTL/LRU bounds."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, node, model, content, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, node, model, content, now, now)
+            )
+            if self.ttl_seconds is not None:
+                self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    " SELECT key FROM llm_cache ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per node (since process start) and current size."""
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        hits = sum(c["hits"] for c in self._counters.values())
+        misses = sum(c["misses"] for c in self._counters.values())
+        return {
+            "entries": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "per_node": {node: dict(c) for node, c in self._counters.items()},
+        }
+
+    def clear(self):
+        """Drop every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class CachedChatModel:
+    """
+    Chat model wrapper that serves `invoke` / `ainvoke` from an `LLMCache`.
+
+    Only the response text is cached: hits come back as a plain `AIMessage`.
+    Every other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, llm, cache: LLMCache, node: Optional[str] = None):
+        self.llm = llm
+        self.cache = cache
+        self.node = node
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def _key(self, prompt: Any) -> str:
+        identity = model_identity(self.llm)
+        return self.cache.make_key(identity["model"], identity["temperature"], prompt)
+
+    def invoke(self, prompt: Any, config=None, **kwargs) -> "AIMessage":
+        key = self._key(prompt)
+        cached = self.cache.get(key, self.node)
+        if cached is not None:
+            return AIMessage(content=cached, response_metadata={"cache_hit": True})
+        response = self.llm.invoke(prompt, config=config, **kwargs)
+        if isinstance(response.content, str):
+            self.cache.put(key, response.content, self.node, model_identity(self.llm)["model"])
+        return response
+
+    async def ainvoke(self, prompt: Any, config=None, **kwargs) -> "AIMessage":
+        key = self._key(prompt)
+        cached = self.cache.get(key, self.node)
+        if cached is not None:
+            return AIMessage(content=cached, response_metadata={"cache_hit": True})
+        response = await self.llm.ainvoke(prompt, config=config, **kwargs)
+        if isinstance(response.content, str):
+            self.cache.put(key, response.content, self.node, model_identity(self.llm)["model"])
+        return response
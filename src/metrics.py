@@ -0,0 +1,219 @@
+# metrics.py
+"""
+Local per-node instrumentation.
+
+Every node run records its wall time, LLM calls, prompt/completion tokens and
+cache hits (LLM, semantic and search caches) in SQLite, per conversation
+thread, so the slow node can be found without an external tracing service.
+
+Counters are collected through a context variable set around the node: the
+`MeteredChatModel` wrapper and the caches report into whichever node run is
+active in the current context (branch threads of `run_branches` inherit it).
+"""
+
+import contextvars
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.context import count_tokens
+from src.llm_cache import _prompt_text, model_identity
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar("email_agent_node_run", default=None)
+
+COUNTERS = ("llm_calls", "prompt_tokens", "completion_tokens", "cache_hits")
+
+class NodeRun:
+    """Counters of one node execution (shared by the threads it spawns)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {name: 0 for name in COUNTERS}
+
+    def add(self, **counts: int):
+        with self._lock:
+            for name, value in counts.items():
+                self.counters[name] += value
+
+def count(**counts: int):
+    """Add to the counters of the active node run (no-op outside an instrumented node)."""
+    run = _current_run.get()
+    if run is not None:
+        run.add(**counts)
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))  # ceil
+    return sorted_values[int(rank) - 1]
+
+class NodeMetrics:
+    """
+    SQLite store of node runs.
+
+    Args:
+        db_path: SQLite file for the measurements
+        max_rows: Oldest runs beyond this bound are deleted
+    """
+
+    def __init__(self, db_path: str, max_rows: int = 100000):
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS node_runs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " thread_id TEXT,"
+            " node TEXT NOT NULL,"
+            " intent TEXT,"
+            " started_at REAL NOT NULL,"
+            " seconds REAL NOT NULL,"
+            " llm_calls INTEGER NOT NULL,"
+            " prompt_tokens INTEGER NOT NULL,"
+            " completion_tokens INTEGER NOT NULL,"
+            " cache_hits INTEGER NOT NULL,"
+            " error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_node_runs_thread ON node_runs(thread_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_node_runs_node ON node_runs(node)")
+        self._conn.commit()
+        self._inserts = 0
+
+    @contextmanager
+    def measure(self, node: str, thread_id: Optional[str] = None, intent: Optional[str] = None) -> Iterator[NodeRun]:
+        """Time a node run and collect its counters; the row is written even if the node raises."""
+        run = NodeRun()
+        token = _current_run.set(run)
+        started_at = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield run
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            _current_run.reset(token)
+            self.record(node, thread_id, intent, started_at, seconds, run.counters, error)
+
+    def record(
+        self,
+        node: str,
+        thread_id: Optional[str],
+        intent: Optional[str],
+        started_at: float,
+        seconds: float,
+        counters: Dict[str, int],
+        error: Optional[str] = None
+    ):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO node_runs (thread_id, node, intent, started_at, seconds, llm_calls,"
+                " prompt_tokens, completion_tokens, cache_hits, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, node, intent, started_at, seconds, *(counters[name] for name in COUNTERS), error)
+            )
+            self._inserts += 1
+            # Trim occasionally rather than on every insert
+            if self._inserts % 500 == 0:
+                self._conn.execute(
+                    "DELETE FROM node_runs WHERE id <= (SELECT MAX(id) FROM node_runs) - ?", (self.max_rows,)
+                )
+            self._conn.commit()
+
+    def thread_stats(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Totals per node for one thread, in order of first execution."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT node, COUNT(*), SUM(seconds), SUM(llm_calls), SUM(prompt_tokens),"
+                " SUM(completion_tokens), SUM(cache_hits), SUM(error IS NOT NULL)"
+                " FROM node_runs WHERE thread_id = ? GROUP BY node ORDER BY MIN(id)",
+                (thread_id,)
+            ).fetchall()
+        return [
+            dict(zip(("node", "runs", "seconds", *COUNTERS, "errors"), row))
+            for row in rows
+        ]
+
+    def node_percentiles(self, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Latency p50/p95/p99 and average counters per node over every thread."""
+        query = "SELECT node, seconds, llm_calls, prompt_tokens, completion_tokens, cache_hits FROM node_runs"
+        params: tuple = ()
+        if since is not None:
+            query += " WHERE started_at >= ?"
+            params = (since,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id", params).fetchall()
+
+        per_node: Dict[str, List[tuple]] = {}
+        for row in rows:
+            per_node.setdefault(row[0], []).append(row[1:])
+        stats = []
+        for node, runs in per_node.items():
+            latencies = sorted(r[0] for r in runs)
+            n = len(runs)
+            stats.append({
+                "node": node,
+                "runs": n,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "total_seconds": sum(latencies),
+                **{f"avg_{name}": sum(r[i + 1] for r in runs) / n for i, name in enumerate(COUNTERS)},
+            })
+        return sorted(stats, key=lambda s: -s["total_seconds"])
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM node_runs")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class MeteredChatModel:
+    """
+    Chat model wrapper that reports each call to the active node run.
+
+    Cache hits (responses flagged "cache_hit" by `CachedChatModel`) count as
+    cache hits, not LLM calls. Token counts come from the provider's usage
+    metadata, or the tokenizer when the response has none (e.g. streamed).
+    Every other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def _report(self, prompt: Any, response):
+        if _current_run.get() is None:
+            return
+        if (getattr(response, "response_metadata", None) or {}).get("cache_hit"):
+            count(cache_hits=1)
+            return
+        usage = getattr(response, "usage_metadata", None) or {}
+        model = model_identity(self.llm)["model"]
+        content = response.content if isinstance(response.content, str) else str(response.content)
+        count(
+            llm_calls=1,
+            prompt_tokens=usage.get("input_tokens") or count_tokens(_prompt_text(prompt), model),
+            completion_tokens=usage.get("output_tokens") or count_tokens(content, model),
+        )
+
+    def invoke(self, prompt: Any, config=None, **kwargs):
+        response = self.llm.invoke(prompt, config=config, **kwargs)
+        self._report(prompt, response)
+        return response
+
+    async def ainvoke(self, prompt: Any, config=None, **kwargs):
+        response = await self.llm.ainvoke(prompt, config=config, **kwargs)
+        self._report(prompt, response)
+        return response
@@ -0,0 +1,274 @@
+# model_router.py
+"""
+Per-node model tiers.
+
+Each node is routed to a named tier ("fast", "quality", ...) that maps to a
+model; routes can depend on the intent (e.g. summaries drafted on the fast
+tier). The router tracks each node's recent latency and, when it exceeds the
+node's SLO, sends the node to its fallback tier for a cool-down period before
+trying the preferred tier again.
+
+Configuration comes from defaults, then an optional JSON file, then CLI flags:
+
+    {
+      "tiers": {"fast": {"model": "gpt-4o-mini"}, "quality": {"model": "gpt-4o"}},
+      "nodes": {"reviewer": "fast"},
+      "intents": {"drafter": {"SUMMARIZE_THREAD": "fast"}},
+      "temperatures": {"retrieval": 0.1},
+      "latency_slo": {"drafter": 6.0},
+      "fallback": {"quality": "fast"},
+      "cooldown_seconds": 60
+    }
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+ROUTED_NODES = ("intent_classifier", "retrieval", "web_search", "drafter", "reviewer")
+
+# Classification, the web-search decision and query rewriting are short,
+# constrained outputs: they do not need the drafting model
+DEFAULT_NODE_TIERS: Dict[str, str] = {
+    "intent_classifier": "fast",
+    "retrieval": "fast",
+    "web_search": "fast",
+    "drafter": "quality",
+    "reviewer": "quality",
+}
+
+# Per-node temperature overrides (the web-search decision is a YES/NO answer)
+DEFAULT_NODE_TEMPERATURES: Dict[str, float] = {"retrieval": 0.1}
+
+DEFAULT_FALLBACK: Dict[str, str] = {"quality": "fast"}
+
+DEFAULT_TEMPERATURE = 0.7
+
+# Weight of the newest call in a node's latency estimate
+LATENCY_SMOOTHING = 0.3
+
+def load_model_config(path: str) -> Dict[str, Any]:
+    """Read a JSON routing config (see the module docstring for the format)."""
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    return config
+
+def parse_assignments(values, cast: Callable[[str], Any] = str) -> Dict[str, Any]:
+    """Parse repeated NAME=VALUE command-line options."""
+    parsed = {}
+    for value in values or ():
+        name, sep, raw = value.partition("=")
+        if not sep or not name.strip() or not raw.strip():
+            raise ValueError(f"Expected NAME=VALUE, got {value!r}")
+        parsed[name.strip()] = cast(raw.strip())
+    return parsed
+
+class ModelRouter:
+    """
+    Route each node to a model tier, with latency-SLO fallback.
+
+    Args:
+        tiers: Tier name -> {"model": str, "temperature": float (optional)}
+        make_model: Factory (model, temperature, purpose) -> chat model
+        node_tiers: Node -> tier (defaults to DEFAULT_NODE_TIERS)
+        intent_tiers: Node -> {intent: tier} overrides
+        node_temperatures: Node -> temperature overrides
+        latency_slo: Node -> seconds; above it the node uses its fallback tier
+        fallback: Tier -> faster tier used while the SLO is exceeded
+        cooldown_seconds: How long a node stays on the fallback tier
+    """
+
+    def __init__(
+        self,
+        tiers: Dict[str, Dict[str, Any]],
+        make_model: Callable[[str, float, str], Any],
+        node_tiers: Optional[Dict[str, str]] = None,
+        intent_tiers: Optional[Dict[str, Dict[str, str]]] = None,
+        node_temperatures: Optional[Dict[str, float]] = None,
+        latency_slo: Optional[Dict[str, float]] = None,
+        fallback: Optional[Dict[str, str]] = None,
+        cooldown_seconds: float = 60.0
+    ):
+        self.tiers = tiers
+        self.make_model = make_model
+        self.node_tiers = {**DEFAULT_NODE_TIERS, **(node_tiers or {})}
+        self.intent_tiers = intent_tiers or {}
+        self.node_temperatures = {**DEFAULT_NODE_TEMPERATURES, **(node_temperatures or {})}
+        self.latency_slo = latency_slo or {}
+        self.fallback = DEFAULT_FALLBACK if fallback is None else fallback
+        self.cooldown_seconds = cooldown_seconds
+        self._validate()
+        self._lock = threading.Lock()
+        self._models: Dict[Tuple[str, float], Any] = {}
+        # node -> smoothed latency of its preferred tier / end of the fallback period
+        self._latency: Dict[str, float] = {}
+        self._degraded_until: Dict[str, float] = {}
+        # (node, tier) -> calls
+        self._calls: Dict[Tuple[str, str], int] = {}
+        self._fallbacks: Dict[str, int] = {}
+
+    @classmethod
+    def from_config(
+        cls,
+        model: str,
+        fast_model: str,
+        make_model: Callable[[str, float, str], Any],
+        config: Optional[Dict[str, Any]] = None,
+        node_tiers: Optional[Dict[str, str]] = None,
+        latency_slo: Optional[Dict[str, float]] = None
+    ) -> "ModelRouter":
+        """
+        Build a router from the base models, a parsed config file and CLI overrides.
+
+        `model` is the "quality" tier and `fast_model` the "fast" tier unless the
+        config file redefines them; `node_tiers` and `latency_slo` (CLI flags)
+        take precedence over the file.
+        """
+        config = config or {}
+        tiers = {"fast": {"model": fast_model}, "quality": {"model": model}}
+        for name, tier in (config.get("tiers") or {}).items():
+            tiers[name] = {"model": tier} if isinstance(tier, str) else dict(tier)
+        return cls(
+            tiers,
+            make_model,
+            node_tiers={**(config.get("nodes") or {}), **(node_tiers or {})},
+            intent_tiers=config.get("intents"),
+            node_temperatures=config.get("temperatures"),
+            latency_slo={**(config.get("latency_slo") or {}), **(latency_slo or {})},
+            fallback=config.get("fallback"),
+            cooldown_seconds=float(config.get("cooldown_seconds", 60.0))
+        )
+
+    def _validate(self):
+        for name, tier in self.tiers.items():
+            if not tier.get("model"):
+                raise ValueError(f"Model tier {name!r} has no model")
+        referenced = dict(self.node_tiers)
+        for node, routes in self.intent_tiers.items():
+            referenced.update({f"{node}/{intent}": tier for intent, tier in routes.items()})
+        referenced.update({f"fallback of {src}": dst for src, dst in self.fallback.items()})
+        for where, tier in referenced.items():
+            if tier not in self.tiers:
+                raise ValueError(f"Unknown model tier {tier!r} ({where}); known tiers: {', '.join(self.tiers)}")
+        unknown = (set(self.node_tiers) | set(self.intent_tiers) | set(self.latency_slo)) - set(ROUTED_NODES)
+        if unknown:
+            raise ValueError(f"Unknown node(s) in model routing: {', '.join(sorted(unknown))}")
+
+    def preferred_tier(self, node: str, intent: Optional[str] = None) -> str:
+        """Tier configured for the node (and intent), ignoring latency."""
+        routes = self.intent_tiers.get(node) or {}
+        return routes.get(intent) or self.node_tiers.get(node, "quality")
+
+    def select(self, node: str, intent: Optional[str] = None) -> str:
+        """Tier to use now: the preferred one, or its fallback while the SLO is exceeded."""
+        tier = self.preferred_tier(node, intent)
+        fallback = self.fallback.get(tier)
+        if fallback is None or node not in self.latency_slo:
+            return tier
+        with self._lock:
+            until = self._degraded_until.get(node)
+            if until is None:
+                return tier
+            if time.monotonic() < until:
+                return fallback
+            # Cool-down over: give the preferred tier a fresh chance
+            del self._degraded_until[node]
+            self._latency.pop(node, None)
+        return tier
+
+    def model(self, node: str, tier: str) -> Any:
+        """Chat model of a tier, at the node's temperature (built once)."""
+        spec = self.tiers[tier]
+        temperature = self.node_temperatures.get(node, spec.get("temperature", DEFAULT_TEMPERATURE))
+        key = (spec["model"], temperature)
+        with self._lock:
+            llm = self._models.get(key)
+            if llm is None:
+                llm = self.make_model(spec["model"], temperature, tier)
+                self._models[key] = llm
+            return llm
+
+    def record(self, node: str, tier: str, seconds: float):
+        """Record a call's latency; a preferred tier above the SLO triggers the fallback."""
+        with self._lock:
+            self._calls[(node, tier)] = self._calls.get((node, tier), 0) + 1
+            slo = self.latency_slo.get(node)
+            if slo is None or node in self._degraded_until or tier not in self.fallback:
+                return
+            previous = self._latency.get(node)
+            latency = seconds if previous is None else (
+                LATENCY_SMOOTHING * seconds + (1 - LATENCY_SMOOTHING) * previous
+            )
+            self._latency[node] = latency
+            if latency > slo:
+                self._degraded_until[node] = time.monotonic() + self.cooldown_seconds
+                self._fallbacks[node] = self._fallbacks.get(node, 0) + 1
+                print(f"⚠️  {node}: latency {latency:.1f}s above SLO {slo:.1f}s, "
+                      f"using tier {self.fallback[tier]!r} for {self.cooldown_seconds:.0f}s")
+
+    def bind(self, node: str, intent: Optional[str] = None, wrap: Optional[Callable[[str, Any], Any]] = None):
+        """Chat model for one node run (see `RoutedChatModel`)."""
+        return RoutedChatModel(self, node, intent, wrap)
+
+    def stats(self) -> Dict[str, Any]:
+        """Route, model, calls and fallbacks per node."""
+        now = time.monotonic()
+        with self._lock:
+            nodes = {}
+            for node in ROUTED_NODES:
+                tier = self.node_tiers.get(node, "quality")
+                nodes[node] = {
+                    "tier": tier,
+                    "model": self.tiers[tier]["model"],
+                    "intents": dict(self.intent_tiers.get(node) or {}),
+                    "slo": self.latency_slo.get(node),
+                    "latency": self._latency.get(node),
+                    "degraded": self._degraded_until.get(node, 0) > now,
+                    "fallbacks": self._fallbacks.get(node, 0),
+                    "calls": {t: count for (n, t), count in self._calls.items() if n == node},
+                }
+            return {"tiers": {name: dict(spec) for name, spec in self.tiers.items()}, "nodes": nodes}
+
+class RoutedChatModel:
+    """
+    Chat model facade for one node: each `invoke` / `ainvoke` picks the tier,
+    optionally wraps the model (e.g. with the LLM cache) and records the
+    latency of real (non cache-hit) calls. Other attributes are delegated to
+    the preferred tier's model.
+    """
+
+    def __init__(self, router: ModelRouter, node: str, intent: Optional[str] = None,
+                 wrap: Optional[Callable[[str, Any], Any]] = None):
+        self.router = router
+        self.node = node
+        self.intent = intent
+        self.wrap = wrap
+
+    def _pick(self):
+        tier = self.router.select(self.node, self.intent)
+        llm = self.router.model(self.node, tier)
+        return tier, (self.wrap(self.node, llm) if self.wrap else llm)
+
+    def __getattr__(self, name):
+        return getattr(self.router.model(self.node, self.router.preferred_tier(self.node, self.intent)), name)
+
+    def _record(self, tier: str, response, start: float):
+        if not (getattr(response, "response_metadata", None) or {}).get("cache_hit"):
+            self.router.record(self.node, tier, time.perf_counter() - start)
+
+    def invoke(self, prompt: Any, config=None, **kwargs):
+        tier, llm = self._pick()
+        start = time.perf_counter()
+        response = llm.invoke(prompt, config=config, **kwargs)
+        self._record(tier, response, start)
+        return response
+
+    async def ainvoke(self, prompt: Any, config=None, **kwargs):
+        tier, llm = self._pick()
+        start = time.perf_counter()
+        response = await llm.ainvoke(prompt, config=config, **kwargs)
+        self._record(tier, response, start)
+        return response
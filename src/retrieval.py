@@ -0,0 +1,142 @@
+# retrieval.py
+"""
+Retrieval helpers: scope resolution and result fusion.
+
+A request is first resolved to the conversations it is about (thread ID,
+source file name, or a correspondent named in the instruction) so the vector
+search can run within that scope instead of over the whole mailbox. Lexical
+(BM25) and vector results are then merged with reciprocal-rank fusion.
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Set
+
+# Tokens that never identify a correspondent on their own
+NAME_STOPWORDS = {
+    "toi", "moi", "me", "you", "mme", "mr", "mrs", "ms", "m", "madame", "monsieur",
+    "client", "cliente", "equipe", "team", "manager", "chef", "projet", "de", "du", "la", "le",
+}
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip accents ("Équipe" -> "equipe")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def _tokens(text: str) -> Set[str]:
+    return set(re.findall(r"[a-z0-9]+", normalize_text(text)))
+
+def _source_aliases(source: str) -> Set[str]:
+    """'conversation_mathias_projetX.md' -> {'conversation_mathias_projetx', 'mathias', 'projet x'}."""
+    stem = source.rsplit(".", 1)[0]
+    aliases = {normalize_text(stem), normalize_text(source)}
+    for part in stem.split("_"):
+        # Split camelCase parts so "reunionQ4" matches "réunion Q4"
+        words = normalize_text(re.sub(r"(?<=[a-z])(?=[A-Z0-9])", " ", part))
+        if words and words != "conversation" and words not in NAME_STOPWORDS and len(words) >= 3:
+            aliases.add(words)
+    return aliases
+
+class CorpusDirectory:
+    """
+    Index of conversations and correspondents, built from document metadata.
+
+    Args:
+        metadatas: Metadata dicts of the indexed documents (need "source";
+            "sender"/"recipient" come from the per-email chunking)
+    """
+
+    def __init__(self, metadatas: List[Dict[str, Any]]):
+        self.sources: Set[str] = set()
+        # alias -> sources
+        self.source_aliases: Dict[str, Set[str]] = {}
+        # person token -> sources
+        self.people: Dict[str, Set[str]] = {}
+        for meta in metadatas:
+            meta = meta or {}
+            source = meta.get("source")
+            if not source:
+                continue
+            self.sources.add(source)
+            for alias in _source_aliases(source):
+                self.source_aliases.setdefault(alias, set()).add(source)
+            for field in ("sender", "recipient"):
+                for token in _tokens(meta.get(field, "")):
+                    if token not in NAME_STOPWORDS and len(token) >= 3:
+                        self.people.setdefault(token, set()).add(source)
+
+    @classmethod
+    def from_vector_store(cls, vector_store) -> "CorpusDirectory":
+        """Build the directory from every document stored in a Chroma collection."""
+        stored = vector_store.get(include=["metadatas"])
+        return cls(stored.get("metadatas") or [])
+
+    def resolve_scope(self, user_input: str, thread_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Resolve the conversations a request is about.
+
+        Resolution order: the state's thread ID, a source file name mentioned in
+        the instruction, then correspondents named in the instruction
+        ("reply to Sophie").
+
+        Returns:
+            {"sources": [...], "reason": str} or None for a global search
+        """
+        if thread_id:
+            key = normalize_text(thread_id)
+            sources = self.source_aliases.get(key) or self.source_aliases.get(key.rsplit(".", 1)[0])
+            if sources and len(sources) == 1:
+                return {"sources": sorted(sources), "reason": f"thread {thread_id}"}
+
+        words = _tokens(user_input)
+        text = normalize_text(user_input)
+        spaced = " ".join(re.findall(r"[a-z0-9]+", text))
+        mentioned = set()
+        for alias, sources in self.source_aliases.items():
+            if alias in self.people:
+                # Person names are resolved as correspondents below
+                continue
+            if ("_" in alias and alias in text) or re.search(rf"\b{re.escape(alias)}\b", spaced):
+                mentioned |= sources
+        if mentioned:
+            return {"sources": sorted(mentioned), "reason": "file name"}
+
+        people = {token for token in words if token in self.people}
+        if people:
+            sources = set()
+            for token in people:
+                sources |= self.people[token]
+            return {"sources": sorted(sources), "reason": f"correspondent {', '.join(sorted(people))}"}
+        return None
+
+def scope_filter(scope: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Chroma metadata filter for a resolved scope."""
+    if not scope:
+        return None
+    sources = scope["sources"]
+    if len(sources) == 1:
+        return {"source": sources[0]}
+    return {"source": {"$in": sources}}
+
+def doc_key(doc) -> str:
+    """Identity of a retrieved document across retrievers (source + content)."""
+    source = (doc.metadata or {}).get("source", "")
+    return hashlib.sha1(f"{source}|{doc.page_content}".encode("utf-8")).hexdigest()
+
+def reciprocal_rank_fusion(result_lists: List[List[Any]], k: int = 5, rrf_k: int = 60) -> List[Any]:
+    """
+    Merge ranked document lists with reciprocal-rank fusion.
+
+    Each document scores sum(1 / (rrf_k + rank)) over the lists it appears in;
+    the top `k` documents are returned, best first.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Any] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in ranked]
@@ -0,0 +1,228 @@
+# review_rules.py
+"""
+Deterministic pre-review of drafts.
+
+Cheap local rules catch the defects the LLM reviewer would reject anyway: a
+missing "Subject:" line, leftover placeholders like "[Name]", a draft that is
+far too short or too long, and IBANs that were not in the user's request.
+Rule failures send the draft straight back to revision without an LLM call.
+Softer signals (no recognised greeting or closing, phone numbers or email
+addresses not in the request) are only warnings: valid drafts open with
+"Sophie," or sign off with a bare name. With the "low_risk" policy, short
+drafts that trip no rule at all are approved without the LLM either.
+"""
+
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SKIP_LLM_POLICIES = ("never", "low_risk")
+
+EMAIL_INTENTS = ("REPLY_EMAIL", "NEW_EMAIL")
+
+# rule -> (severity, intents it applies to); "fail" rejects the draft, "warn"
+# is reported to the human and prevents the low-risk skip
+DEFAULT_REVIEW_RULES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "subject": ("fail", ("NEW_EMAIL",)),
+    "placeholder": ("fail", EMAIL_INTENTS + ("SUMMARIZE_THREAD",)),
+    "length": ("fail", EMAIL_INTENTS + ("SUMMARIZE_THREAD",)),
+    "greeting": ("warn", EMAIL_INTENTS),
+    "closing": ("warn", EMAIL_INTENTS),
+    "iban": ("fail", EMAIL_INTENTS),
+    "phone": ("warn", EMAIL_INTENTS),
+    "email_address": ("warn", EMAIL_INTENTS),
+}
+
+# (min words, max words) of the draft body per intent
+DEFAULT_LENGTH_BOUNDS: Dict[str, Tuple[int, int]] = {
+    "REPLY_EMAIL": (15, 400),
+    "NEW_EMAIL": (20, 500),
+    "SUMMARIZE_THREAD": (15, 600),
+}
+
+# Drafts up to this many words that trip no rule count as low risk
+LOW_RISK_MAX_WORDS = 80
+
+SUBJECT_RE = re.compile(r"^\s*(subject|objet)\s*:\s*\S", re.IGNORECASE | re.MULTILINE)
+
+PLACEHOLDER_RE = re.compile(
+    r"\[[A-Za-zÀ-ÿ][^\[\]\n]{0,40}\](?!\()|"  # [Name], [Your Company] (not markdown links)
+    r"\{\{?\s*\w+\s*\}?\}|"                    # {name}, {{date}}
+    r"<\s*(name|nom|date|company|entreprise|client)\s*>|"
+    r"\bX{3,}\b|\bTBD\b|\blorem ipsum\b",
+    re.IGNORECASE
+)
+
+GREETING_RE = re.compile(
+    r"^\s*(hi|hello|hey|dear|good (morning|afternoon|evening)|greetings|to whom|"
+    r"bonjour|bonsoir|salut|madame|monsieur|cher|chère|chere)\b",
+    re.IGNORECASE
+)
+
+CLOSING_RE = re.compile(
+    r"\b(regards|sincerely|best|thanks|thank you|cheers|yours|"
+    r"cordialement|bien à vous|bien a vous|salutations|merci|bonne journée|bonne journee|"
+    r"à bientôt|a bientot)\b",
+    re.IGNORECASE
+)
+
+IBAN_RE = re.compile(r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?\b")
+
+PHONE_RE = re.compile(
+    r"(?<![\w+])(?:\+\d{1,3}[ .-]?(?:\(0\))?[ .-]?\d{1,4}(?:[ .-]?\d{2,4}){2,4}|0\d(?:[ .-]?\d{2}){4})(?!\w)"
+)
+
+EMAIL_ADDRESS_RE = re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")
+
+def _iban_valid(candidate: str) -> bool:
+    """ISO 13616 mod-97 check, so product codes and references are not flagged."""
+    iban = candidate.replace(" ", "")
+    if not 15 <= len(iban) <= 34:
+        return False
+    digits = "".join(str(int(c, 36)) for c in iban[4:] + iban[:4])
+    return int(digits) % 97 == 1
+
+def _split_draft(draft: str) -> Tuple[Optional[str], List[str]]:
+    """(subject, non-empty body lines)."""
+    lines = [line.strip() for line in draft.strip().splitlines()]
+    subject = None
+    if lines and SUBJECT_RE.match(lines[0]):
+        subject = lines[0].split(":", 1)[1].strip()
+        lines = lines[1:]
+    return subject, [line for line in lines if line]
+
+class ReviewRules:
+    """
+    Rule engine run before the LLM reviewer.
+
+    Args:
+        disabled: Rule names to skip (see DEFAULT_REVIEW_RULES)
+        severities: Per-rule severity overrides ("fail" or "warn")
+        length_bounds: Per-intent (min words, max words) overrides
+        skip_llm: "never" always asks the LLM reviewer after the rules pass;
+            "low_risk" approves short drafts that trip no rule without it
+        low_risk_max_words: Word count up to which a clean draft is low risk
+        low_risk_intents: Intents eligible for the low-risk skip
+    """
+
+    def __init__(
+        self,
+        disabled: Iterable[str] = (),
+        severities: Optional[Dict[str, str]] = None,
+        length_bounds: Optional[Dict[str, Tuple[int, int]]] = None,
+        skip_llm: str = "never",
+        low_risk_max_words: int = LOW_RISK_MAX_WORDS,
+        low_risk_intents: Tuple[str, ...] = EMAIL_INTENTS
+    ):
+        unknown = set(disabled) | set(severities or {})
+        unknown -= set(DEFAULT_REVIEW_RULES)
+        if unknown:
+            raise ValueError(f"Unknown review rule(s): {', '.join(sorted(unknown))}")
+        bad = {name: value for name, value in (severities or {}).items() if value not in ("fail", "warn")}
+        if bad:
+            raise ValueError(f"Review rule severity must be 'fail' or 'warn': {bad}")
+        if skip_llm not in SKIP_LLM_POLICIES:
+            raise ValueError(f"skip_llm must be one of {SKIP_LLM_POLICIES}, got {skip_llm!r}")
+        self.rules = {
+            name: ((severities or {}).get(name, severity), intents)
+            for name, (severity, intents) in DEFAULT_REVIEW_RULES.items()
+            if name not in set(disabled)
+        }
+        self.length_bounds = {**DEFAULT_LENGTH_BOUNDS, **(length_bounds or {})}
+        self.skip_llm = skip_llm
+        self.low_risk_max_words = low_risk_max_words
+        self.low_risk_intents = low_risk_intents
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {name: 0 for name in self.rules}
+        self._counters = {"checks": 0, "rejected": 0, "skipped_llm": 0}
+
+    def _findings(self, draft: str, intent: str, allowed_text: str) -> List[Tuple[str, str]]:
+        """(rule, message) for every rule the draft breaks."""
+        subject, lines = _split_draft(draft)
+        body = "\n".join(lines)
+        findings = []
+
+        def active(rule: str) -> bool:
+            return rule in self.rules and intent in self.rules[rule][1]
+
+        if active("subject") and not subject:
+            findings.append(("subject", "Missing 'Subject:' line"))
+        if active("placeholder"):
+            placeholders = sorted({m.group(0) for m in PLACEHOLDER_RE.finditer(draft)})
+            if placeholders:
+                findings.append(("placeholder", f"Leftover placeholder(s): {', '.join(placeholders[:5])}"))
+        if active("length"):
+            words = len(body.split())
+            low, high = self.length_bounds.get(intent, (0, 10 ** 6))
+            if words < low:
+                findings.append(("length", f"Draft too short ({words} words, minimum {low})"))
+            elif words > high:
+                findings.append(("length", f"Draft too long ({words} words, maximum {high})"))
+        if active("greeting") and not (lines and GREETING_RE.match(lines[0])):
+            findings.append(("greeting", "Missing greeting"))
+        if active("closing") and not any(CLOSING_RE.search(line) for line in lines[-4:]):
+            findings.append(("closing", "Missing closing"))
+
+        # Sensitive data is fine when the user supplied it in the request
+        sensitive = (
+            ("iban", "IBAN", [m.group(0) for m in IBAN_RE.finditer(body) if _iban_valid(m.group(0))]),
+            ("phone", "phone number", [m.group(0) for m in PHONE_RE.finditer(body)]),
+            ("email_address", "email address", [m.group(0) for m in EMAIL_ADDRESS_RE.finditer(body)]),
+        )
+        for rule, label, matches in sensitive:
+            leaked = sorted({m for m in matches if m not in allowed_text})
+            if active(rule) and leaked:
+                findings.append((rule, f"Sensitive data ({label}): {', '.join(leaked[:3])}"))
+        return findings
+
+    def check(self, draft: str, intent: str = "NEW_EMAIL", allowed_text: str = "") -> Dict[str, Any]:
+        """
+        Run the rules on a draft.
+
+        Args:
+            draft: Draft text ("Subject:" line included)
+            intent: Intent of the request (rules apply per intent)
+            allowed_text: Text the sensitive-data rules ignore matches from
+                (typically the user's instruction)
+
+        Returns:
+            {"failures", "warnings", "rules", "words", "verdict"} where verdict is
+            "reject" (failures), "approve" (low-risk skip) or "llm"
+        """
+        findings = self._findings(draft or "", intent, allowed_text or "")
+        failures = [message for rule, message in findings if self.rules[rule][0] == "fail"]
+        warnings = [message for rule, message in findings if self.rules[rule][0] != "fail"]
+        words = len("\n".join(_split_draft(draft or "")[1]).split())
+
+        if failures:
+            verdict = "reject"
+        elif (self.skip_llm == "low_risk" and not findings and intent in self.low_risk_intents
+              and words <= self.low_risk_max_words):
+            verdict = "approve"
+        else:
+            verdict = "llm"
+
+        with self._lock:
+            self._counters["checks"] += 1
+            self._counters["rejected"] += verdict == "reject"
+            self._counters["skipped_llm"] += verdict == "approve"
+            for rule, _ in findings:
+                self._hits[rule] += 1
+
+        return {
+            "failures": failures,
+            "warnings": warnings,
+            "rules": [rule for rule, _ in findings],
+            "words": words,
+            "verdict": verdict,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Check counters and hits per rule (since process start)."""
+        with self._lock:
+            return {
+                **self._counters,
+                "skip_llm": self.skip_llm,
+                "hits": dict(self._hits),
+                "severities": {name: severity for name, (severity, _) in self.rules.items()},
+            }
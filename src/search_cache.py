@@ -0,0 +1,241 @@
+# search_cache.py
+"""
+Persistent cache for web search results.
+
+Results are keyed on the normalized query ("Meta  latest news?" and
+"meta latest news" share an entry) and stored in SQLite with a TTL (news goes
+stale) and LRU size eviction. Concurrent identical queries are coalesced:
+only the first caller hits the search API, the others wait (bounded by
+`wait_timeout`) for its result.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+
+from src.retrieval import normalize_text
+from src import metrics
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", normalize_text(query)).split())
+
+class SearchCache:
+    """
+    SQLite-backed store of search results.
+
+    Args:
+        db_path: SQLite file for the cache
+        ttl_seconds: Entries older than this are ignored and purged (None = no expiry)
+        max_entries: LRU bound on the number of stored queries
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: Optional[float] = 6 * 3600, max_entries: int = 2000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            " key TEXT PRIMARY KEY,"
+            " query TEXT NOT NULL,"
+            " results TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_last_used ON search_cache(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(tool_name: str, query: str) -> str:
+        return hashlib.sha256(f"{tool_name}|{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[Any]:
+        """Return the cached results for `key`, or None on miss/expiry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._conn.execute("UPDATE search_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            metrics.count(cache_hits=1)
+            return json.loads(row[0])
+
+    def put(self, key: str, query: str, results: Any):
+        """Store results and enforce the TTL/LRU bounds."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, query, results, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, normalize_query(query), json.dumps(results, ensure_ascii=False, default=str), now, now)
+            )
+            if self.ttl_seconds is not None:
+                self._conn.execute("DELETE FROM search_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM search_cache WHERE key IN ("
+                    " SELECT key FROM search_cache ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class _Interrupted(Exception):
+    """The caller running a coalesced search was cancelled or interrupted."""
+
+class CachedSearchTool:
+    """
+    Search tool wrapper that serves `invoke` / `ainvoke` from a `SearchCache`.
+
+    Identical queries in flight at the same time (sync or async callers) share
+    one call to the wrapped tool; waiters give up after `wait_timeout` seconds
+    and take over the search if its caller was cancelled. Errors are not
+    cached. Every other attribute is delegated to the wrapped tool.
+    """
+
+    def __init__(self, tool, cache: SearchCache, wait_timeout: float = 60.0):
+        self.tool = tool
+        self.cache = cache
+        self.wait_timeout = wait_timeout
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.tool, name)
+
+    @staticmethod
+    def _query(tool_input: Any) -> str:
+        return tool_input.get("query", "") if isinstance(tool_input, dict) else str(tool_input)
+
+    def _claim(self, key: str) -> Tuple[Optional[Future], bool, Optional[Any]]:
+        """
+        Return (future, owner, cached): the caller that created the future runs
+        the search. `cached` is set when a search settled since the first lookup.
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.cache.coalesced += 1
+                metrics.count(cache_hits=1)
+                return future, False, None
+            # The previous owner stores before releasing the key: look again
+            cached = self.cache.get(key, count_miss=False)
+            if cached is not None:
+                return None, False, cached
+            future = Future()
+            self._inflight[key] = future
+            return future, True, None
+
+    def _settle(self, key: str, future: Future, query: str, results: Any = None, error: BaseException = None):
+        try:
+            # Store before releasing the key so a late caller finds the cache entry
+            if error is None and results:
+                self.cache.put(key, query, results)
+        except Exception as e:
+            print(f"⚠️  Search cache error: {e}")
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            if not future.done():
+                if error is None:
+                    future.set_result(results)
+                elif isinstance(error, Exception):
+                    future.set_exception(error)
+                else:
+                    # Cancellation / KeyboardInterrupt belong to the owner only
+                    future.set_exception(_Interrupted(query))
+
+    def invoke(self, tool_input: Any, config=None, **kwargs) -> Any:
+        query = self._query(tool_input)
+        key = self.cache.make_key(getattr(self.tool, "name", "web_search"), query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        while True:
+            future, owner, cached = self._claim(key)
+            if cached is not None:
+                return cached
+            if owner:
+                break
+            try:
+                return future.result(timeout=self.wait_timeout)
+            except _Interrupted:
+                continue
+        try:
+            results = self.tool.invoke(tool_input, config=config, **kwargs)
+        except BaseException as e:
+            self._settle(key, future, query, error=e)
+            raise
+        self._settle(key, future, query, results)
+        return results
+
+    async def ainvoke(self, tool_input: Any, config=None, **kwargs) -> Any:
+        query = self._query(tool_input)
+        key = self.cache.make_key(getattr(self.tool, "name", "web_search"), query)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached
+        while True:
+            # Claimed on the loop (a short indexed read): a claim made in a
+            # thread could be lost if this task is cancelled meanwhile
+            future, owner, cached = self._claim(key)
+            if cached is not None:
+                return cached
+            if owner:
+                break
+            try:
+                # Shielded: a cancelled waiter must not cancel the shared future
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.wait_timeout)
+            except _Interrupted:
+                continue
+        try:
+            results = await self.tool.ainvoke(tool_input, config=config, **kwargs)
+        except BaseException as e:
+            self._settle(key, future, query, error=e)
+            raise
+        # Runs to completion in its thread even if this task is cancelled
+        await asyncio.to_thread(self._settle, key, future, query, results)
+        return results
@@ -0,0 +1,195 @@
+# semantic_cache.py
+"""
+Semantic cache for short decision prompts.
+
+The classifier and "is web search needed" prompts only differ by the embedded
+`user_input`, so near-duplicate requests can reuse a previous decision. Entries
+are keyed by the embedding of `user_input` (one namespace per node) and looked
+up with an exact cosine scan: each namespace is a bounded float32 matrix
+(LRU eviction), so a lookup is a single matrix-vector product.
+
+Entries are persisted incrementally in SQLite (one row per entry, like the LLM
+cache), outside the lock held by lookups.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except Exception:
+    raise ImportError("Missing dependency: numpy. Try: pip install numpy")
+
+from src import metrics
+
+def _normalize(vector) -> "np.ndarray":
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+class _Namespace:
+    """LRU-bounded entries of one node, stored as the rows of one matrix."""
+
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = capacity
+        self.dim = dim
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        # entry id -> row, oldest first
+        self.rows: "OrderedDict[int, int]" = OrderedDict()
+        self.row_ids: List[Optional[int]] = [None] * capacity
+        self.values: Dict[int, Tuple[str, Any]] = {}
+
+    def add(self, entry_id: int, vector: "np.ndarray", text: str, value: Any) -> Optional[int]:
+        """Insert an entry; returns the id of the evicted entry, if any."""
+        evicted = None
+        if len(self.rows) < self.capacity:
+            row = len(self.rows)
+        else:
+            evicted, row = self.rows.popitem(last=False)
+            del self.values[evicted]
+        self.matrix[row] = vector
+        self.rows[entry_id] = row
+        self.row_ids[row] = entry_id
+        self.values[entry_id] = (text, value)
+        return evicted
+
+    def nearest(self, vector: "np.ndarray") -> Tuple[Optional[int], float]:
+        """Most similar entry (rows are unit vectors, so the dot product is the cosine)."""
+        if not self.rows:
+            return None, -1.0
+        similarities = self.matrix[:len(self.rows)] @ vector
+        row = int(np.argmax(similarities))
+        return self.row_ids[row], float(similarities[row])
+
+    def touch(self, entry_id: int):
+        self.rows.move_to_end(entry_id)
+
+class SemanticCache:
+    """
+    Embedding-keyed cache with exact nearest-neighbour lookup.
+
+    Args:
+        db_path: SQLite file the entries are persisted to
+        embeddings: LangChain embeddings object used to embed `user_input`
+        threshold: Minimum cosine similarity for a hit
+        capacity: Maximum entries per node (LRU eviction)
+    """
+
+    def __init__(self, db_path: str, embeddings, threshold: float = 0.92, capacity: int = 2000):
+        self.db_path = db_path
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._namespaces: Dict[str, _Namespace] = {}
+        # Lookups only take the in-memory lock; disk writes take the database lock
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " node TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._load()
+
+    # --- Public API ------------------------------------------------------
+
+    def embed(self, text: str) -> "np.ndarray":
+        return _normalize(self.embeddings.embed_query(text))
+
+    def lookup(self, node: str, text: str, vector: Optional[List[float]] = None) -> Optional[Any]:
+        """Return the value cached for the most similar `text` of `node`, if similar enough."""
+        vector = _normalize(vector) if vector is not None else self.embed(text)
+        with self._lock:
+            namespace = self._namespaces.get(node)
+            best_id, best_sim = None, -1.0
+            if namespace is not None and namespace.dim == len(vector):
+                best_id, best_sim = namespace.nearest(vector)
+            if best_id is None or best_sim < self.threshold:
+                self.misses += 1
+                return None
+            namespace.touch(best_id)
+            self.hits += 1
+            value = namespace.values[best_id][1]
+        metrics.count(cache_hits=1)
+        with self._db_lock:
+            self._conn.execute("UPDATE semantic_cache SET last_used = ? WHERE id = ?", (time.time(), best_id))
+            self._conn.commit()
+        return value
+
+    def store(self, node: str, text: str, value: Any, vector: Optional[List[float]] = None):
+        """Remember `value` (JSON-serializable) for `text` under `node`."""
+        vector = _normalize(vector) if vector is not None else self.embed(text)
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "INSERT INTO semantic_cache (node, text, value, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                (node, text, json.dumps(value, ensure_ascii=False), vector.tobytes(), time.time())
+            )
+            entry_id = cursor.lastrowid
+            self._conn.commit()
+        with self._lock:
+            evicted = self._add(node, entry_id, vector, text, value)
+        if evicted:
+            with self._db_lock:
+                self._conn.executemany("DELETE FROM semantic_cache WHERE id = ?", [(i,) for i in evicted])
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sizes = {node: len(ns.rows) for node, ns in self._namespaces.items()}
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": sizes,
+        }
+
+    def close(self):
+        with self._db_lock:
+            self._conn.close()
+
+    # --- Storage ---------------------------------------------------------
+
+    def _add(self, node: str, entry_id: int, vector: "np.ndarray", text: str, value: Any) -> List[int]:
+        """Insert into the node's matrix; returns the ids to delete from disk."""
+        namespace = self._namespaces.get(node)
+        evicted = []
+        if namespace is None or namespace.dim != len(vector):
+            # New node, or the embedding model changed: start the node over
+            if namespace is not None:
+                evicted.extend(namespace.rows)
+            namespace = self._namespaces[node] = _Namespace(self.capacity, len(vector))
+        dropped = namespace.add(entry_id, vector, text, value)
+        if dropped is not None:
+            evicted.append(dropped)
+        return evicted
+
+    def _load(self):
+        try:
+            rows = self._conn.execute(
+                "SELECT id, node, text, value, vector FROM semantic_cache ORDER BY last_used ASC, id ASC"
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"⚠️  Could not load semantic cache {self.db_path}: {e}")
+            return
+        evicted = []
+        # Least recently used first, so the LRU order is restored
+        for entry_id, node, text, value, blob in rows:
+            vector = np.frombuffer(blob, dtype=np.float32)
+            evicted += self._add(node, entry_id, vector, text, json.loads(value))
+        if evicted:
+            self._conn.executemany("DELETE FROM semantic_cache WHERE id = ?", [(i,) for i in evicted])
+            self._conn.commit()
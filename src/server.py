@@ -0,0 +1,559 @@
+# server.py
+"""
+HTTP service mode for the email automation agent.
+
+The LLM clients, Chroma store, search tool and SQLite checkpointer are built
+once and one compiled graph serves every request. Each task is a checkpoint
+thread; tasks run on a bounded worker pool and their progress (node updates
+and drafter tokens) is available as server-sent events.
+
+Endpoints (JSON bodies and responses):
+    GET  /health                   pool usage
+    POST /tasks                    {"instruction", "thread_id"?} -> 202 {"task_id", ...}
+    GET  /tasks/<id>               current state (intent, draft, review, history)
+    GET  /tasks/<id>/events        progress as server-sent events
+    POST /tasks/<id>/approve       approve the draft -> final email
+    POST /tasks/<id>/edit          {"draft"} replace the draft and re-run the review
+    POST /tasks/<id>/resume        continue the graph (e.g. revise after a rejection)
+"""
+
+import argparse
+import json
+import re
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.build_agent import build_email_agent, add_agent_arguments, agent_options
+from src.utils import get_checkpointer, reviewer_node, graph_events
+
+# Seconds between SSE keep-alive comments
+SSE_HEARTBEAT = 15.0
+
+# Statuses during which the task's checkpoint thread is being written
+ACTIVE_STATUSES = ("queued", "running", "updating")
+
+class ServiceBusy(Exception):
+    """Raised when the worker pool and its queue are full."""
+
+class TaskNotFound(Exception):
+    pass
+
+class TaskConflict(Exception):
+    """Raised when a task is in a state that does not allow the operation."""
+
+class Task:
+    """
+    In-memory progress of one task (the graph state lives in the checkpointer).
+
+    Node, status and "done" events are kept for replay. Drafter tokens are only
+    kept for the draft being written: the drafter's node event carries the
+    whole draft, so its tokens are dropped once it arrives.
+    """
+
+    def __init__(self, task_id: str):
+        self.id = task_id
+        self.status = "queued"  # queued | running | updating | awaiting_review | approved | error
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self.tokens: List[Dict[str, Any]] = []
+        self.token_round = 0
+        self.closed = False
+        self.touched = time.monotonic()
+        self.cond = threading.Condition()
+
+    def _drop_tokens(self):
+        self.tokens = []
+        self.token_round += 1
+
+    def publish(self, event: Dict[str, Any]):
+        with self.cond:
+            if event.get("type") == "token":
+                self.tokens.append(event)
+            else:
+                if event.get("type") == "node" and "draft" in event:
+                    self._drop_tokens()
+                self.events.append(event)
+            self.cond.notify_all()
+
+    def set_status(self, status: str, error: Optional[str] = None):
+        with self.cond:
+            self.status = status
+            self.error = error
+            self.touched = time.monotonic()
+            self._drop_tokens()
+            self.events.append({"type": "status", "status": status, "error": error})
+            self.cond.notify_all()
+
+    def follow(self, start: int = 0, stop: Optional[threading.Event] = None) -> Iterator[Optional[Dict[str, Any]]]:
+        """Yield events from index `start` until the run ends (None = heartbeat)."""
+        index = start
+        # A follower joining mid-draft gets the tokens written so far
+        token_round, token_index = None, 0
+
+        def has_tokens() -> bool:
+            return len(self.tokens) > (token_index if token_round == self.token_round else 0)
+
+        while True:
+            with self.cond:
+                while (index >= len(self.events) and not has_tokens()
+                       and self.status in ACTIVE_STATUSES and not self.closed):
+                    if not self.cond.wait(timeout=SSE_HEARTBEAT):
+                        break
+                    if stop is not None and stop.is_set():
+                        return
+                pending = self.events[index:]
+                index = len(self.events)
+                if token_round != self.token_round:
+                    token_round, token_index = self.token_round, 0
+                tokens = self.tokens[token_index:]
+                token_index = len(self.tokens)
+                finished = self.status not in ACTIVE_STATUSES or self.closed
+            if not pending and not tokens and not finished:
+                yield None
+            # Tokens always follow the pending node events (the drafter's event drops them)
+            for event in pending + tokens:
+                yield event
+            if finished and index >= len(self.events):
+                return
+
+class TaskManager:
+    """
+    Run tasks on a shared compiled graph with a concurrency limit.
+
+    Args:
+        app: Compiled graph (with a checkpointer and interrupt_after=["reviewer"])
+        llm: Model used to re-run the review after an edit
+        max_concurrent: Tasks running at the same time
+        max_queued: Tasks waiting for a worker before new ones are refused
+        callbacks: LangChain callbacks added to every run (e.g. Langfuse)
+        review_rules: Pre-review rules applied when re-reviewing an edit
+        model_router: Model tiers (the reviewer's tier re-reviews edits instead of `llm`)
+        task_ttl: Seconds a finished task stays in memory after its last use
+        max_tasks: Tasks kept in memory at most (least recently used finished ones go first)
+
+    Evicted tasks are reloaded from the checkpointer when accessed again.
+    """
+
+    def __init__(
+        self,
+        app,
+        llm,
+        max_concurrent: int = 4,
+        max_queued: int = 16,
+        callbacks=None,
+        review_rules=None,
+        model_router=None,
+        task_ttl: float = 3600.0,
+        max_tasks: int = 1000
+    ):
+        self.app = app
+        self.llm = llm
+        self.review_rules = review_rules
+        self.model_router = model_router
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.callbacks = callbacks
+        self.task_ttl = task_ttl
+        self.max_tasks = max_tasks
+        self.tasks: Dict[str, Task] = {}
+        self.accepting = True
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="email-server")
+
+    def _config(self, task_id: str) -> Dict[str, Any]:
+        config: Dict[str, Any] = {"configurable": {"thread_id": task_id}}
+        if self.callbacks:
+            config["callbacks"] = self.callbacks
+        return config
+
+    def _values(self, task_id: str) -> Dict[str, Any]:
+        snap = self.app.get_state(self._config(task_id))
+        return getattr(snap, "values", None) or {}
+
+    def _evict(self):
+        """Forget idle finished tasks, then the least recently used beyond max_tasks (lock held)."""
+        now = time.monotonic()
+        finished = [t for t in self.tasks.values() if t.status not in ACTIVE_STATUSES]
+        for task in finished:
+            if now - task.touched > self.task_ttl:
+                del self.tasks[task.id]
+        excess = len(self.tasks) - self.max_tasks
+        if excess > 0:
+            finished = sorted((t for t in self.tasks.values() if t.status not in ACTIVE_STATUSES),
+                              key=lambda t: t.touched)
+            for task in finished[:excess]:
+                del self.tasks[task.id]
+
+    def _task(self, task_id: str) -> Task:
+        with self._lock:
+            self._evict()
+            task = self.tasks.get(task_id)
+            if task is not None:
+                task.touched = time.monotonic()
+                return task
+        # Task from a previous server run (or evicted): its state is in the
+        # checkpointer, read without holding the manager lock
+        values = self._values(task_id)
+        if not values:
+            raise TaskNotFound(task_id)
+        loaded = Task(task_id)
+        loaded.status = "approved" if values.get("human_approved") else "awaiting_review"
+        with self._lock:
+            task = self.tasks.setdefault(task_id, loaded)
+            task.touched = time.monotonic()
+            return task
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for t in self.tasks.values() if t.status == "running")
+            return {
+                "accepting": self.accepting,
+                "tasks": len(self.tasks),
+                "running": running,
+                "queued": self._pending - running,
+                "max_concurrent": self.max_concurrent,
+                "max_queued": self.max_queued,
+                "review_rules": self.review_rules.stats() if self.review_rules else None,
+                "models": self.model_router.stats() if self.model_router else None,
+            }
+
+    def _schedule(self, task: Task, inputs: Optional[Dict[str, Any]], new: bool = False):
+        """Queue a run of `task` (`new`: register it first); one run or update per task at a time."""
+        with self._lock:
+            if not self.accepting:
+                raise ServiceBusy("server is shutting down")
+            if not new and task.status in ACTIVE_STATUSES:
+                raise TaskConflict(f"task is {task.status}")
+            if self._pending >= self.max_concurrent + self.max_queued:
+                raise ServiceBusy("too many tasks in flight")
+            if new:
+                self._evict()
+                self.tasks[task.id] = task
+            self._pending += 1
+            task.closed = False
+            task.set_status("queued")
+        self._executor.submit(self._run, task, inputs)
+
+    @contextmanager
+    def _updating(self, task: Task) -> Iterator[None]:
+        """
+        Hold `task` in the "updating" status while its state is changed outside
+        a run; the block must end by setting a finished status.
+        """
+        with self._lock:
+            if task.status in ACTIVE_STATUSES:
+                raise TaskConflict(f"task is {task.status}")
+            previous, previous_error = task.status, task.error
+            task.set_status("updating")
+        try:
+            yield
+        except BaseException:
+            task.set_status(previous, previous_error)
+            raise
+
+    def _run(self, task: Task, inputs: Optional[Dict[str, Any]]):
+        try:
+            task.set_status("running")
+            for event in graph_events(self.app, inputs, self._config(task.id)):
+                task.publish(event)
+            task.set_status("awaiting_review")
+        except Exception as e:
+            print(f"⚠️  Task {task.id} failed: {e}")
+            task.set_status("error", str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def create(self, instruction: str, conversation_thread: Optional[str] = None) -> Task:
+        task = Task(str(uuid.uuid4()))
+        inputs = {"user_input": instruction, "history": [], "step_count": 0}
+        if conversation_thread:
+            inputs["thread_id"] = conversation_thread
+        self._schedule(task, inputs, new=True)
+        return task
+
+    def resume(self, task_id: str) -> Task:
+        task = self._task(task_id)
+        self._schedule(task, None)
+        return task
+
+    def state(self, task_id: str) -> Dict[str, Any]:
+        task = self._task(task_id)
+        values = self._values(task_id)
+        return {
+            "task_id": task_id,
+            "status": task.status,
+            "error": task.error,
+            "intent": values.get("intent"),
+            "intent_confidence": values.get("intent_confidence"),
+            "draft": values.get("draft"),
+            "review_approved": values.get("review_approved"),
+            "review_issues": values.get("review_issues", []),
+            "review_suggestions": values.get("review_suggestions", []),
+            "final_email": values.get("final_email"),
+            "history": values.get("history", []),
+        }
+
+    def approve(self, task_id: str) -> Dict[str, Any]:
+        task = self._task(task_id)
+        with self._updating(task):
+            values = self._values(task_id)
+            if not values.get("draft"):
+                raise TaskConflict("no draft to approve")
+            self.app.update_state(self._config(task_id), {"human_approved": True, "final_email": values["draft"]})
+            task.set_status("approved")
+        return self.state(task_id)
+
+    def edit(self, task_id: str, draft: str) -> Dict[str, Any]:
+        task = self._task(task_id)
+        with self._updating(task):
+            config = self._config(task_id)
+            self.app.update_state(config, {"draft": draft, "human_feedback": "User edited draft"})
+            # Re-run the reviewer on the edited draft, as the CLI does
+            values = self._values(task_id)
+            review_llm = self.model_router.bind("reviewer", values.get("intent")) if self.model_router else self.llm
+            review_update = reviewer_node(values, review_llm, rules=self.review_rules)
+            self.app.update_state(config, review_update)
+            task.set_status("awaiting_review")
+        return self.state(task_id)
+
+    def events(self, task_id: str, stop: Optional[threading.Event] = None) -> Iterator[Optional[Dict[str, Any]]]:
+        return self._task(task_id).follow(stop=stop)
+
+    def shutdown(self, timeout: float = 30.0):
+        """Refuse new tasks, let running ones finish (up to `timeout`), then close event streams."""
+        with self._lock:
+            self.accepting = False
+        waiter = threading.Thread(target=self._executor.shutdown, kwargs={"wait": True, "cancel_futures": True})
+        waiter.start()
+        waiter.join(timeout)
+        if waiter.is_alive():
+            print(f"⚠️  Tasks still running after {timeout:.0f}s; stopping anyway.")
+        with self._lock:
+            tasks = list(self.tasks.values())
+        for task in tasks:
+            with task.cond:
+                task.closed = True
+                task.cond.notify_all()
+
+# --- HTTP ----------------------------------------------------------------
+
+ROUTES: List[Tuple[str, "re.Pattern", str]] = [
+    ("GET", re.compile(r"^/health$"), "health"),
+    ("POST", re.compile(r"^/tasks$"), "create"),
+    ("GET", re.compile(r"^/tasks/([\w-]+)$"), "state"),
+    ("GET", re.compile(r"^/tasks/([\w-]+)/events$"), "events"),
+    ("POST", re.compile(r"^/tasks/([\w-]+)/approve$"), "approve"),
+    ("POST", re.compile(r"^/tasks/([\w-]+)/edit$"), "edit"),
+    ("POST", re.compile(r"^/tasks/([\w-]+)/resume$"), "resume"),
+]
+
+def make_handler(manager: TaskManager, stopping: threading.Event):
+    """Request handler class bound to a task manager."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            print(f"🌐 {self.address_string()} {format % args}")
+
+        def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            payload = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not isinstance(payload, dict):
+                raise ValueError("expected a JSON object")
+            return payload
+
+        def _dispatch(self, method: str):
+            path = self.path.split("?", 1)[0]
+            for route_method, pattern, name in ROUTES:
+                match = pattern.match(path)
+                if match and route_method == method:
+                    break
+            else:
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                getattr(self, f"_{name}")(*match.groups())
+            except TaskNotFound as e:
+                self._send_json(404, {"error": f"unknown task {e}"})
+            except TaskConflict as e:
+                self._send_json(409, {"error": str(e)})
+            except ServiceBusy as e:
+                self._send_json(503 if stopping.is_set() else 429, {"error": str(e)}, {"Retry-After": "5"})
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            except Exception as e:
+                print(f"⚠️  Request error: {e}")
+                self._send_json(500, {"error": str(e)})
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        # --- Routes ---------------------------------------------------------
+
+        def _health(self):
+            self._send_json(200, {"status": "stopping" if stopping.is_set() else "ok", **manager.stats()})
+
+        def _create(self):
+            body = self._body()
+            instruction = (body.get("instruction") or "").strip()
+            if not instruction:
+                raise ValueError("missing \"instruction\"")
+            task = manager.create(instruction, body.get("thread_id"))
+            self._send_json(202, {"task_id": task.id, "status": task.status, "events": f"/tasks/{task.id}/events"})
+
+        def _state(self, task_id: str):
+            self._send_json(200, manager.state(task_id))
+
+        def _approve(self, task_id: str):
+            self._send_json(200, manager.approve(task_id))
+
+        def _edit(self, task_id: str):
+            draft = (self._body().get("draft") or "").strip()
+            if not draft:
+                raise ValueError("missing \"draft\"")
+            self._send_json(200, manager.edit(task_id, draft))
+
+        def _resume(self, task_id: str):
+            task = manager.resume(task_id)
+            self._send_json(202, {"task_id": task.id, "status": task.status, "events": f"/tasks/{task.id}/events"})
+
+        def _events(self, task_id: str):
+            events = manager.events(task_id, stop=stopping)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            for event in events:
+                if event is None:
+                    self.wfile.write(b": keep-alive\n\n")
+                else:
+                    data = json.dumps(event, ensure_ascii=False)
+                    self.wfile.write(f"event: {event['type']}\ndata: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+    return Handler
+
+def serve(
+    app,
+    llm,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    max_concurrent: int = 4,
+    max_queued: int = 16,
+    shutdown_timeout: float = 30.0,
+    langfuse_handler=None,
+    review_rules=None,
+    model_router=None,
+    task_ttl: float = 3600.0,
+    max_tasks: int = 1000
+):
+    """Serve the compiled graph until SIGINT/SIGTERM, then drain running tasks."""
+    callbacks = [langfuse_handler] if langfuse_handler else None
+    manager = TaskManager(
+        app, llm,
+        max_concurrent=max_concurrent,
+        max_queued=max_queued,
+        callbacks=callbacks,
+        review_rules=review_rules,
+        model_router=model_router,
+        task_ttl=task_ttl,
+        max_tasks=max_tasks
+    )
+    stopping = threading.Event()
+    server = ThreadingHTTPServer((host, port), make_handler(manager, stopping))
+    server.daemon_threads = True
+
+    def _stop(signum, frame):
+        if not stopping.is_set():
+            print("\n⏹️  Shutting down: no new tasks, waiting for running ones...")
+            stopping.set()
+            # shutdown() blocks until serve_forever returns, so call it from another thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    print(f"✅ Email agent server listening on http://{host}:{port} "
+          f"({max_concurrent} concurrent, {max_queued} queued)")
+    try:
+        server.serve_forever()
+    finally:
+        manager.shutdown(shutdown_timeout)
+        server.server_close()
+        print("👋 Server stopped.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Email Automation Agent HTTP server")
+    add_agent_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--max-concurrent", type=int, default=4, help="Tasks running at the same time")
+    parser.add_argument("--max-queued", type=int, default=16,
+                        help="Tasks waiting for a worker before requests get 429")
+    parser.add_argument("--shutdown-timeout", type=float, default=30.0,
+                        help="Seconds to let running tasks finish on shutdown")
+    parser.add_argument("--task-ttl", type=float, default=3600.0,
+                        help="Seconds a finished task's progress stays in memory after its last use")
+    parser.add_argument("--max-tasks", type=int, default=1000,
+                        help="Tasks kept in memory at most (finished ones are evicted first)")
+    args = parser.parse_args()
+
+    try:
+        workflow, llm, vector_store, search_tool, langfuse_handler, services = build_email_agent(
+            **agent_options(args)
+        )
+        with get_checkpointer(args.db, durability=args.durability or "step") as checkpointer:
+            agent = workflow.compile(
+                checkpointer=checkpointer,
+                interrupt_after=["reviewer"]  # Tasks pause for human approval
+            )
+            serve(
+                agent, llm,
+                host=args.host,
+                port=args.port,
+                max_concurrent=args.max_concurrent,
+                max_queued=args.max_queued,
+                shutdown_timeout=args.shutdown_timeout,
+                langfuse_handler=langfuse_handler,
+                review_rules=services.get("review_rules"),
+                model_router=services.get("model_router"),
+                task_ttl=args.task_ttl,
+                max_tasks=args.max_tasks
+            )
+        if services.get("clients"):
+            services["clients"].close()
+    except Exception as e:
+        print(f"❌ Error building agent: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -18,12 +18,15 @@ try:
 except Exception:
     raise ImportError("Missing dependencies. Try: pip install langchain-tavily or langchain-community tavily-python")
 
-def create_web_search_tool(max_results: int = 3) -> Tool:
+def create_web_search_tool(max_results: int = 8, include_raw_content: bool = True) -> Tool:
     """
     Create a web search tool using Tavily.
     
     Args:
-        max_results: Maximum number of search results to return
+        max_results: Maximum number of search results to return (their passages
+            are ranked and packed into a token budget by the web search node)
+        include_raw_content: Also return the page text of each result, not only
+            Tavily's short snippet, so the packing has whole pages to rank
     
     Returns:
         Tool instance for web search
@@ -37,7 +40,9 @@ def create_web_search_tool(max_results: int = 3) -> Tool:
         # Use new langchain-tavily if available, otherwise fallback
         if TavilySearch is not None:
             # New API
-            search = TavilySearch(api_key=tavily_api_key, max_results=max_results)
+            search = TavilySearch(
+                api_key=tavily_api_key, max_results=max_results, include_raw_content=include_raw_content
+            )
             # TavilySearch is already a tool, but we can wrap it for consistency
             web_search_tool = Tool(
                 name="web_search",
@@ -49,7 +54,9 @@ def create_web_search_tool(max_results: int = 3) -> Tool:
             )
         else:
             # Deprecated API (fallback)
-            search = TavilySearchResults(max_results=max_results, api_key=tavily_api_key)
+            search = TavilySearchResults(
+                max_results=max_results, api_key=tavily_api_key, include_raw_content=include_raw_content
+            )
             web_search_tool = Tool(
                 name="web_search",
                 description=(
@@ -4,18 +4,37 @@ Utility functions and definitions for the email automation agent.
 """
 
 import os
-from typing import List, TypedDict, Dict, Any, Optional
-from contextlib import contextmanager
+import re
+import time
+import asyncio
+import contextvars
+from typing import List, TypedDict, Dict, Any, Optional, Callable, Tuple, Iterator
+from contextlib import contextmanager, asynccontextmanager, nullcontext
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 try:
     from langchain_openai import ChatOpenAI
     from langchain_core.documents import Document
+    from langchain_core.runnables import RunnableConfig
 except Exception:
     raise ImportError("Missing dependency: langchain_openai. Try: pip install langchain-openai")
 
 from langgraph.graph import StateGraph, END
 
+from src.intent import IntentClassifier
+from src.llm_cache import LLMCache, CachedChatModel, model_identity
+from src.semantic_cache import SemanticCache
+from src.review_rules import ReviewRules
+from src.model_router import ModelRouter
+from src.metrics import NodeMetrics, MeteredChatModel
+from src.clients import ClientRegistry
+from src.retrieval import CorpusDirectory, scope_filter, reciprocal_rank_fusion
+from src.context import (
+    DEFAULT_CONTEXT_BUDGETS, DEFAULT_COMPRESSION_RATIOS, DEFAULT_WEB_BUDGET, EXTERNAL_MARKER,
+    pack_context, compress_text, pack_web_results
+)
+
 # --- Agent State -------------------------------------------------------
 
 class EmailAgentState(TypedDict, total=False):
@@ -27,9 +46,11 @@ class EmailAgentState(TypedDict, total=False):
     # Classification
     intent: str  # REPLY_EMAIL | NEW_EMAIL | SUMMARIZE_THREAD
     intent_confidence: float
+    intent_source: str  # rules | centroid | rules+centroid | semantic_cache | llm
     
     # Retrieval
     retrieved_docs: List[Any]  # List[Document]
+    retrieval_scope: Optional[Dict[str, Any]]  # {"sources": [...], "reason": str}
     context: str
     needs_web_search: bool
     
@@ -53,21 +74,122 @@ class EmailAgentState(TypedDict, total=False):
     
     # Tracking
     history: List[str]
-    step_count: int
+    step_count: int  # nodes executed
+    revision_count: int  # reviewer-requested revisions of the draft
 
 # --- LLM Setup ---------------------------------------------------------
 
-def make_llm(model: str = "gpt-4o-mini", temperature: float = 0.7) -> "ChatOpenAI":
-    """Initialize the language model."""
+def make_llm(
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.7,
+    clients: Optional[ClientRegistry] = None,
+    purpose: str = "main"
+) -> "ChatOpenAI":
+    """Initialize the language model (from the shared client registry if given)."""
+    if clients:
+        return clients.get(model, temperature, purpose)
     return ChatOpenAI(model=model, temperature=temperature)
 
+# --- Concurrency -------------------------------------------------------
+
+# Shared pool for independent branches inside a node (threads, because the
+# underlying clients are blocking).
+_BRANCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="email-agent")
+
+def run_branches(branches: Dict[str, Tuple[Callable[[], Any], float, Any]]) -> Dict[str, Any]:
+    """
+    Run independent branches concurrently with partial-result semantics.
+    
+    Args:
+        branches: name -> (function, timeout in seconds, default value)
+    
+    Returns:
+        name -> branch result, or its default if the branch raised or timed out.
+        A timed-out branch keeps running in the background; its result is ignored.
+    """
+    started = time.monotonic()
+    # Each branch runs in a copy of the caller's context (callbacks, node metrics)
+    futures = {
+        name: _BRANCH_POOL.submit(contextvars.copy_context().run, fn)
+        for name, (fn, _, _) in branches.items()
+    }
+    
+    results = {}
+    for name, (_, timeout, default) in branches.items():
+        remaining = max(0.0, started + timeout - time.monotonic())
+        try:
+            results[name] = futures[name].result(timeout=remaining)
+        except FutureTimeoutError:
+            print(f"⚠️  {name} timed out after {timeout:.1f}s; continuing without it.")
+            results[name] = default
+        except Exception as e:
+            print(f"⚠️  {name} error: {e}")
+            results[name] = default
+    return results
+
+async def arun_branches(branches: Dict[str, Tuple[Callable[[], Any], float, Any]]) -> Dict[str, Any]:
+    """
+    Async variant of `run_branches`: each function returns an awaitable.
+    
+    Branches run as concurrent tasks on the event loop; a branch that raises
+    or exceeds its timeout is cancelled and replaced by its default.
+    """
+    async def _run(name: str, fn: Callable[[], Any], timeout: float, default: Any) -> Any:
+        try:
+            return await asyncio.wait_for(fn(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️  {name} timed out after {timeout:.1f}s; continuing without it.")
+        except Exception as e:
+            print(f"⚠️  {name} error: {e}")
+        return default
+    
+    names = list(branches)
+    values = await asyncio.gather(*(_run(name, *branches[name]) for name in names))
+    return dict(zip(names, values))
+
 # --- Node Functions ----------------------------------------------------
 
-def intent_classifier_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[str, Any]:
-    """Classify user intent and route to appropriate workflow."""
+def _local_intent(
+    state: EmailAgentState,
+    classifier: Optional[IntentClassifier],
+    semantic_cache: Optional[SemanticCache]
+) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+    """
+    Classify without the LLM (local classifier, then semantic cache).
+    
+    Returns:
+        (state update or None, local intent guess, local confidence)
+    """
     user_input = state.get("user_input", "")
     
-    prompt = (
+    local_intent, local_confidence, method = None, 0.0, "none"
+    if classifier:
+        local_intent, local_confidence, method = classifier.classify(user_input)
+        if local_intent and local_confidence >= classifier.threshold:
+            return {
+                "intent": local_intent,
+                "intent_confidence": local_confidence,
+                "intent_source": method,
+                "history": state.get("history", []) + [f"Classified intent: {local_intent} ({method})"]
+            }, local_intent, local_confidence
+    
+    if semantic_cache:
+        try:
+            cached = semantic_cache.lookup("intent_classifier", user_input)
+        except Exception as e:
+            print(f"⚠️  Semantic cache error: {e}")
+            cached = None
+        if cached:
+            return {
+                "intent": cached["intent"],
+                "intent_confidence": cached["confidence"],
+                "intent_source": "semantic_cache",
+                "history": state.get("history", []) + [f"Classified intent: {cached['intent']} (semantic cache)"]
+            }, local_intent, local_confidence
+    return None, local_intent, local_confidence
+
+def _intent_prompt(user_input: str) -> str:
+    return (
         f"Analyze the following user request and classify it into one of these categories:\n"
         f"- REPLY_EMAIL: User wants to reply to an existing email or thread\n"
         f"- NEW_EMAIL: User wants to create a new email from scratch\n"
@@ -75,8 +197,16 @@ def intent_classifier_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[st
         f"User request: {user_input}\n\n"
         f"Respond with only the category name (REPLY_EMAIL, NEW_EMAIL, or SUMMARIZE_THREAD)."
     )
-    
-    response = llm.invoke(prompt).content.strip()
+
+def _intent_from_response(
+    state: EmailAgentState,
+    response: str,
+    local_intent: Optional[str],
+    local_confidence: float,
+    semantic_cache: Optional[SemanticCache]
+) -> Dict[str, Any]:
+    """Parse the LLM classification and remember it in the semantic cache."""
+    user_input = state.get("user_input", "")
     
     # Normalize response
     intent = "NEW_EMAIL"  # default
@@ -88,47 +218,89 @@ def intent_classifier_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[st
         intent = "NEW_EMAIL"
     
     confidence = 0.9 if intent in response.upper() else 0.7
+    if intent == local_intent:
+        # The LLM confirms the (low-confidence) local guess
+        confidence = 1.0 - (1.0 - confidence) * (1.0 - local_confidence)
+    
+    if semantic_cache:
+        try:
+            semantic_cache.store("intent_classifier", user_input, {"intent": intent, "confidence": confidence})
+        except Exception as e:
+            print(f"⚠️  Semantic cache error: {e}")
     
     return {
         "intent": intent,
         "intent_confidence": confidence,
+        "intent_source": "llm",
         "history": state.get("history", []) + [f"Classified intent: {intent}"]
     }
 
-def retrieval_node(state: EmailAgentState, vector_store, llm: "ChatOpenAI" = None) -> Dict[str, Any]:
-    """Retrieve relevant context from vector database."""
-    intent = state.get("intent", "NEW_EMAIL")
-    user_input = state.get("user_input", "")
-    thread_id = state.get("thread_id")
-    
-    # Build search query based on intent
-    if intent == "REPLY_EMAIL" or intent == "SUMMARIZE_THREAD":
-        query = f"{user_input} email thread conversation"
-    else:
-        query = user_input
-    
-    # Perform vector search
-    try:
-        if vector_store:
-            docs = vector_store.similarity_search(query, k=5)
-            retrieved_content = "\n\n".join([doc.page_content for doc in docs])
-        else:
-            retrieved_content = "No vector store available."
-            docs = []
-    except Exception as e:
-        print(f"⚠️  Vector search error: {e}")
-        retrieved_content = ""
-        docs = []
+def intent_classifier_node(
+    state: EmailAgentState,
+    llm: "ChatOpenAI",
+    classifier: Optional[IntentClassifier] = None,
+    semantic_cache: Optional[SemanticCache] = None
+) -> Dict[str, Any]:
+    """
+    Classify user intent and route to appropriate workflow.
     
-    # Let the LLM determine if web search is needed
-    # This is more intelligent than keyword matching
-    needs_web_search = False
+    The local classifier (rules + nearest centroid) answers confident cases
+    without an LLM call; below the classifier threshold, a near-duplicate
+    request from the semantic cache is reused before falling back to the LLM.
+    """
+    local, local_intent, local_confidence = _local_intent(state, classifier, semantic_cache)
+    if local:
+        return local
+    response = llm.invoke(_intent_prompt(state.get("user_input", ""))).content.strip()
+    return _intent_from_response(state, response, local_intent, local_confidence, semantic_cache)
+
+async def aintent_classifier_node(
+    state: EmailAgentState,
+    llm: "ChatOpenAI",
+    classifier: Optional[IntentClassifier] = None,
+    semantic_cache: Optional[SemanticCache] = None
+) -> Dict[str, Any]:
+    """Async variant of `intent_classifier_node` (the cache steps may embed, so they run in a thread)."""
+    local, local_intent, local_confidence = await asyncio.to_thread(_local_intent, state, classifier, semantic_cache)
+    if local:
+        return local
+    response = (await llm.ainvoke(_intent_prompt(state.get("user_input", "")))).content.strip()
+    # Storing in the semantic cache embeds the request: keep it off the event loop
+    return await asyncio.to_thread(
+        _intent_from_response, state, response, local_intent, local_confidence, semantic_cache
+    )
+
+def _vector_search(vector_store, query: str, k: int = 5, scope: Optional[Dict[str, Any]] = None) -> List[Any]:
+    """
+    Run the similarity search.
     
-    # Ask LLM if web search is needed
-    web_search_prompt = (
+    With a scope, the search is filtered to those conversations first and only
+    falls back to the whole collection if the scoped search finds nothing.
+    """
+    if not vector_store:
+        return []
+    docs = []
+    if scope:
+        docs = vector_store.similarity_search(query, k=k, filter=scope_filter(scope))
+    if not docs:
+        docs = vector_store.similarity_search(query, k=k)
+    return docs
+
+def _lexical_search(lexical_index, query: str, k: int = 5, scope: Optional[Dict[str, Any]] = None):
+    """Run the BM25 search (scoped first, like the vector search)."""
+    if lexical_index is None:
+        return []
+    hits = []
+    if scope:
+        hits = lexical_index.search(query, k=k, sources=scope["sources"])
+    if not hits:
+        hits = lexical_index.search(query, k=k)
+    return hits
+
+def _web_search_decision_prompt(user_input: str) -> str:
+    return (
         f"You are a decision agent. Analyze this email request and determine if a web search is needed.\n\n"
-        f"User request: \"{user_input}\"\n"
-        f"Available context from internal documents: {len(retrieved_content)} characters\n\n"
+        f"User request: \"{user_input}\"\n\n"
         f"IMPORTANT: Web search is ONLY needed if the email MUST mention:\n"
         f"- Recent news, current events, or breaking news\n"
         f"- Up-to-date information about specific companies/products that changes frequently\n"
@@ -148,124 +320,433 @@ def retrieval_node(state: EmailAgentState, vector_store, llm: "ChatOpenAI" = Non
         f"- 'Email about current market trends' → YES (needs current market data)\n\n"
         f"Based on the user request above, respond with ONLY 'YES' or 'NO' (no explanation)."
     )
+
+def _store_web_search_decision(
+    user_input: str,
+    response: str,
+    semantic_cache: Optional[SemanticCache] = None
+) -> bool:
+    """Parse the YES/NO decision and remember it in the semantic cache."""
+    response = response.strip().upper()
+    
+    # Be very strict: only YES if explicitly stated, default to NO
+    # Check for explicit YES, but also check for NO to be sure
+    has_yes = "YES" in response or "OUI" in response
+    has_no = "NO" in response or "NON" in response
     
+    # Only do web search if YES is explicitly stated AND NO is not present
+    needs_web_search = has_yes and not has_no
+    
+    if semantic_cache:
+        try:
+            semantic_cache.store("web_search_decision", user_input, needs_web_search)
+        except Exception as e:
+            print(f"⚠️  Semantic cache error: {e}")
+    return needs_web_search
+
+def _cached_web_search_decision(user_input: str, semantic_cache: Optional[SemanticCache] = None) -> Optional[bool]:
+    if not semantic_cache:
+        return None
     try:
-        # Use LLM to intelligently decide if web search is needed
-        if llm:
-            # Use lower temperature for more consistent, conservative decisions
-            # Get model name from llm object
-            model_name = "gpt-4o-mini"  # default
-            if hasattr(llm, 'model_name'):
-                model_name = llm.model_name
-            elif hasattr(llm, 'model'):
-                model_name = llm.model
-            elif hasattr(llm, '_default_params') and 'model' in llm._default_params:
-                model_name = llm._default_params['model']
-            
-            from langchain_openai import ChatOpenAI
-            decision_llm = ChatOpenAI(model=model_name, temperature=0.1)
-            response = decision_llm.invoke(web_search_prompt).content.strip().upper()
-            
-            # Be very strict: only YES if explicitly stated, default to NO
-            # Check for explicit YES, but also check for NO to be sure
-            has_yes = "YES" in response or "OUI" in response
-            has_no = "NO" in response or "NON" in response
-            
-            # Only do web search if YES is explicitly stated AND NO is not present
-            needs_web_search = has_yes and not has_no
-        else:
-            # Fallback: conservative approach - no search by default if no LLM available
-            needs_web_search = False
+        return semantic_cache.lookup("web_search_decision", user_input)
     except Exception as e:
-        print(f"⚠️  Error determining web search need: {e}")
-        # Fallback: conservative approach - no search by default
-        needs_web_search = False
+        print(f"⚠️  Semantic cache error: {e}")
+        return None
+
+def _decide_web_search(
+    user_input: str,
+    llm: "ChatOpenAI" = None,
+    semantic_cache: Optional[SemanticCache] = None
+) -> bool:
+    """
+    Ask the LLM whether the request needs external (web) information.
+    
+    `llm` should be a low-temperature client for consistent, conservative decisions.
+    The decision only depends on the request itself, so it can run while the
+    vector search is still in flight.
+    """
+    if not llm:
+        # Fallback: conservative approach - no search by default if no LLM available
+        return False
+    cached = _cached_web_search_decision(user_input, semantic_cache)
+    if cached is not None:
+        return cached
+    response = llm.invoke(_web_search_decision_prompt(user_input)).content
+    return _store_web_search_decision(user_input, response, semantic_cache)
+
+async def _adecide_web_search(
+    user_input: str,
+    llm: "ChatOpenAI" = None,
+    semantic_cache: Optional[SemanticCache] = None
+) -> bool:
+    """Async variant of `_decide_web_search`."""
+    if not llm:
+        return False
+    cached = await asyncio.to_thread(_cached_web_search_decision, user_input, semantic_cache)
+    if cached is not None:
+        return cached
+    response = (await llm.ainvoke(_web_search_decision_prompt(user_input))).content
+    return await asyncio.to_thread(_store_web_search_decision, user_input, response, semantic_cache)
+
+def _plan_retrieval(
+    state: EmailAgentState,
+    corpus_directory: Optional[CorpusDirectory],
+    lexical_index,
+    lexical_only_confidence: float,
+    candidate_k: int
+) -> Tuple[str, Optional[Dict[str, Any]], List[Any], bool]:
+    """
+    Resolve the query and scope and run the (local) lexical search.
+    
+    Returns:
+        (vector query, scope, lexical documents, whether the lexical hits are enough)
+    """
+    intent = state.get("intent", "NEW_EMAIL")
+    user_input = state.get("user_input", "")
+    thread_id = state.get("thread_id")
+    
+    # Build search query based on intent
+    if intent == "REPLY_EMAIL" or intent == "SUMMARIZE_THREAD":
+        query = f"{user_input} email thread conversation"
+    else:
+        query = user_input
+    
+    scope = corpus_directory.resolve_scope(user_input, thread_id) if corpus_directory else None
+    
+    # Lexical search is local and fast: run it first to see if it is enough
+    lexical_hits = _lexical_search(lexical_index, user_input, k=candidate_k, scope=scope)
+    lexical_docs = [doc for doc, _, _ in lexical_hits]
+    lexical_only = bool(lexical_hits) and lexical_hits[0][2] >= lexical_only_confidence
+    return query, scope, lexical_docs, lexical_only
+
+def _retrieval_result(
+    state: EmailAgentState,
+    results: Dict[str, Any],
+    vector_store,
+    scope: Optional[Dict[str, Any]],
+    lexical_index,
+    lexical_docs: List[Any],
+    lexical_only: bool,
+    embeddings,
+    context_budgets: Optional[Dict[str, int]],
+    tokenizer_model: str,
+    candidate_k: int
+) -> Dict[str, Any]:
+    """Fuse the branch results, pack them into the token budget and build the state update."""
+    intent = state.get("intent", "NEW_EMAIL")
+    user_input = state.get("user_input", "")
+    needs_web_search = results["web_search_decision"]
+    
+    if lexical_only:
+        docs = lexical_docs
+    elif lexical_docs:
+        docs = reciprocal_rank_fusion([results["vector_search"], lexical_docs], k=candidate_k)
+    else:
+        docs = results["vector_search"]
+    
+    budgets = context_budgets or DEFAULT_CONTEXT_BUDGETS
+    docs, packing_report = pack_context(
+        docs,
+        user_input,
+        budgets.get(intent, DEFAULT_CONTEXT_BUDGETS["NEW_EMAIL"]),
+        embeddings=embeddings,
+        model=tokenizer_model
+    )
+    
+    if docs:
+        retrieved_content = "\n\n".join([doc.page_content for doc in docs])
+    elif not vector_store and lexical_index is None:
+        retrieved_content = "No vector store available."
+    else:
+        retrieved_content = ""
+    
+    history_entry = "Retrieved context from lexical index" if lexical_only else "Retrieved context from vector DB"
+    if scope:
+        history_entry += f" (scope: {scope['reason']})"
     
     return {
         "retrieved_docs": docs,
+        "retrieval_scope": scope,
         "context": retrieved_content,
         "needs_web_search": needs_web_search,
-        "history": state.get("history", []) + ["Retrieved context from vector DB"]
+        "draft_metadata": {**state.get("draft_metadata", {}), "context_packing": packing_report},
+        "history": state.get("history", []) + [history_entry]
     }
 
-def web_search_node(state: EmailAgentState, search_tool, llm: "ChatOpenAI" = None) -> Dict[str, Any]:
-    """Perform web search to enhance context."""
+def retrieval_node(
+    state: EmailAgentState,
+    vector_store,
+    llm: "ChatOpenAI" = None,
+    vector_timeout: float = 15.0,
+    decision_timeout: float = 15.0,
+    semantic_cache: Optional[SemanticCache] = None,
+    corpus_directory: Optional[CorpusDirectory] = None,
+    lexical_index=None,
+    lexical_only_confidence: float = 0.6,
+    embeddings=None,
+    context_budgets: Optional[Dict[str, int]] = None,
+    tokenizer_model: str = "gpt-4o-mini",
+    candidate_k: int = 8
+) -> Dict[str, Any]:
+    """
+    Retrieve relevant context from vector database.
+    
+    `llm` is the (low-temperature) client used for the web-search decision.
+    The vector search and the web-search decision are independent, so they run
+    concurrently. Each branch has its own timeout; a branch that fails or times
+    out falls back to its conservative default (no documents / no web search)
+    instead of failing the whole node.
+    
+    When `corpus_directory` is given, the search is scoped to the conversation
+    or correspondent the request is about (thread ID, file name, or a person
+    named in the instruction).
+    
+    With a `lexical_index`, BM25 and vector results are merged with
+    reciprocal-rank fusion. When the best lexical hit is a strong match
+    (confidence >= `lexical_only_confidence`), the vector search (and its
+    query embedding) is skipped entirely.
+    
+    The `candidate_k` candidates are then packed into the intent's token budget
+    by maximal marginal relevance; what was dropped is recorded in
+    `draft_metadata["context_packing"]`.
+    """
+    user_input = state.get("user_input", "")
+    query, scope, lexical_docs, lexical_only = _plan_retrieval(
+        state, corpus_directory, lexical_index, lexical_only_confidence, candidate_k
+    )
+    
+    branches = {
+        "web_search_decision": (lambda: _decide_web_search(user_input, llm, semantic_cache), decision_timeout, False),
+    }
+    if not lexical_only:
+        branches["vector_search"] = (lambda: _vector_search(vector_store, query, k=candidate_k, scope=scope), vector_timeout, [])
+    results = run_branches(branches)
+    return _retrieval_result(
+        state, results, vector_store, scope, lexical_index, lexical_docs, lexical_only,
+        embeddings, context_budgets, tokenizer_model, candidate_k
+    )
+
+async def aretrieval_node(
+    state: EmailAgentState,
+    vector_store,
+    llm: "ChatOpenAI" = None,
+    vector_timeout: float = 15.0,
+    decision_timeout: float = 15.0,
+    semantic_cache: Optional[SemanticCache] = None,
+    corpus_directory: Optional[CorpusDirectory] = None,
+    lexical_index=None,
+    lexical_only_confidence: float = 0.6,
+    embeddings=None,
+    context_budgets: Optional[Dict[str, int]] = None,
+    tokenizer_model: str = "gpt-4o-mini",
+    candidate_k: int = 8
+) -> Dict[str, Any]:
+    """
+    Async variant of `retrieval_node`.
+    
+    The web-search decision awaits the model; the vector store client is
+    blocking, so the vector search and the local steps run in threads.
+    """
     user_input = state.get("user_input", "")
+    query, scope, lexical_docs, lexical_only = await asyncio.to_thread(
+        _plan_retrieval, state, corpus_directory, lexical_index, lexical_only_confidence, candidate_k
+    )
+    
+    branches = {
+        "web_search_decision": (lambda: _adecide_web_search(user_input, llm, semantic_cache), decision_timeout, False),
+    }
+    if not lexical_only:
+        branches["vector_search"] = (
+            lambda: asyncio.to_thread(_vector_search, vector_store, query, candidate_k, scope), vector_timeout, []
+        )
+    results = await arun_branches(branches)
+    return await asyncio.to_thread(
+        _retrieval_result, state, results, vector_store, scope, lexical_index, lexical_docs, lexical_only,
+        embeddings, context_budgets, tokenizer_model, candidate_k
+    )
+
+def _search_query_prompt(user_input: str) -> str:
+    # Use current date in the instruction to help the model reason about recency
+    today_str = datetime.now().strftime("%B %Y")  # e.g. "November 2025"
+    return (
+        f"Today's date is {today_str}.\n\n"
+        f"Based on this email request, generate an optimal web search query for finding recent, relevant information.\n\n"
+        f"User request: {user_input}\n\n"
+        f"Generate a search query that will find:\n"
+        f"- Recent news or current information (from roughly the last 6–12 months)\n"
+        f"- Specific and relevant details\n"
+        f"- Up-to-date facts\n\n"
+        f"Make the query concise but specific. Include:\n"
+        f"- Key entity names (companies, people, products)\n"
+        f"- Important keywords\n"
+        f"- Words like 'latest', 'recent', 'current' if helpful\n"
+        f"- DO NOT include any explicit year (no 2023, 2024, 2025, etc.)\n\n"
+        f"Example: If request is 'email about Meta company news', a good query is: Meta company latest news\n\n"
+        f"Respond with ONLY the search query (no explanation, no quotes, just the query text)."
+    )
+
+def _clean_search_query(raw_query: str) -> str:
+    # Clean up the query (remove quotes and explicit years if present)
+    search_query = raw_query.strip().strip('"\'')
+    
+    # Post-process: remove any explicit four-digit years starting with 20xx
+    search_query = re.sub(r"\b20[0-9]{2}\b", "", search_query)
+    # Normalize spaces
+    search_query = " ".join(search_query.split())
+    print(f"🔍 LLM-generated search query: {search_query}")
+    return search_query
+
+def _result_list(results: Any) -> Any:
+    """Result dicts from either tool output shape ({"results": [...]} for langchain-tavily)."""
+    if isinstance(results, dict) and isinstance(results.get("results"), list):
+        return results["results"]
+    return results
+
+def _web_search_result(
+    state: EmailAgentState,
+    results: Any,
+    embeddings=None,
+    budget_tokens: int = DEFAULT_WEB_BUDGET,
+    tokenizer_model: str = "gpt-4o-mini"
+) -> Dict[str, Any]:
+    """Pack the most relevant passages of the results and append them to the context."""
     context = state.get("context", "")
+    update: Dict[str, Any] = {}
+    if isinstance(results, list):
+        web_info, report = pack_web_results(
+            results, state.get("user_input", ""), budget_tokens, embeddings=embeddings, model=tokenizer_model
+        )
+        update["draft_metadata"] = {**state.get("draft_metadata", {}), "web_packing": report}
+    elif results is None:
+        web_info = "Web search tool not available."
+    else:
+        web_info = str(results)
+    
+    # Enhance context
+    enhanced_context = f"{context}\n\n{EXTERNAL_MARKER}\n{web_info}"
+    
+    return {
+        **update,
+        "web_results": results if isinstance(results, list) else [],
+        "enhanced_context": enhanced_context,
+        "history": state.get("history", []) + ["Performed web search"]
+    }
+
+def web_search_node(
+    state: EmailAgentState,
+    search_tool,
+    llm: "ChatOpenAI" = None,
+    embeddings=None,
+    budget_tokens: int = DEFAULT_WEB_BUDGET,
+    tokenizer_model: str = "gpt-4o-mini"
+) -> Dict[str, Any]:
+    """
+    Perform web search to enhance context.
+    
+    The results are split into passages, ranked against the instruction and
+    packed into `budget_tokens` with their source (see context.pack_web_results).
+    """
+    user_input = state.get("user_input", "")
     
     # Let LLM generate an optimal search query for Tavily
+    search_query = user_input  # Fallback if no LLM
     if llm:
-        # Use current date in the instruction to help the model reason about recency
-        today_str = datetime.now().strftime("%B %Y")  # e.g. "November 2025"
-        search_query_prompt = (
-            f"Today's date is {today_str}.\n\n"
-            f"Based on this email request, generate an optimal web search query for finding recent, relevant information.\n\n"
-            f"User request: {user_input}\n\n"
-            f"Generate a search query that will find:\n"
-            f"- Recent news or current information (from roughly the last 6–12 months)\n"
-            f"- Specific and relevant details\n"
-            f"- Up-to-date facts\n\n"
-            f"Make the query concise but specific. Include:\n"
-            f"- Key entity names (companies, people, products)\n"
-            f"- Important keywords\n"
-            f"- Words like 'latest', 'recent', 'current' if helpful\n"
-            f"- DO NOT include any explicit year (no 2023, 2024, 2025, etc.)\n\n"
-            f"Example: If request is 'email about Meta company news', a good query is: Meta company latest news\n\n"
-            f"Respond with ONLY the search query (no explanation, no quotes, just the query text)."
-        )
-        
         try:
-            raw_query = llm.invoke(search_query_prompt).content.strip()
-            # Clean up the query (remove quotes and explicit years if present)
-            search_query = raw_query.strip('"\'')
-
-            # Post-process: remove any explicit four-digit years starting with 20xx
-            import re
-            search_query = re.sub(r"\b20[0-9]{2}\b", "", search_query)
-            # Normalize spaces
-            search_query = " ".join(search_query.split())
-            print(f"🔍 LLM-generated search query: {search_query}")
+            search_query = _clean_search_query(llm.invoke(_search_query_prompt(user_input)).content)
         except Exception as e:
             print(f"⚠️  Error generating search query: {e}")
-            search_query = user_input  # Fallback to user input
-    else:
-        search_query = user_input  # Fallback if no LLM
     
     # Perform search (minimal logging, detailed traces go to Langfuse)
+    results = None
     try:
         if search_tool:
             results = search_tool.invoke({"query": search_query})
-            # Format results with more content
-            if isinstance(results, list):
-                web_info = "\n\n".join([
-                    f"Source: {r.get('url', 'N/A')}\nTitle: {r.get('title', 'N/A')}\nContent: {r.get('content', '')[:800]}"
-                    for r in results[:3]
-                ])
-            else:
-                web_info = str(results)
-        else:
-            web_info = "Web search tool not available."
-            results = []
     except Exception as e:
         print(f"⚠️  Web search error: {e}")
-        web_info = ""
-        results = []
+        results = ""
+    return _web_search_result(state, _result_list(results), embeddings, budget_tokens, tokenizer_model)
+
+async def aweb_search_node(
+    state: EmailAgentState,
+    search_tool,
+    llm: "ChatOpenAI" = None,
+    embeddings=None,
+    budget_tokens: int = DEFAULT_WEB_BUDGET,
+    tokenizer_model: str = "gpt-4o-mini"
+) -> Dict[str, Any]:
+    """Async variant of `web_search_node`."""
+    user_input = state.get("user_input", "")
     
-    # Enhance context
-    enhanced_context = f"{context}\n\n--- External Information ---\n{web_info}"
+    search_query = user_input
+    if llm:
+        try:
+            search_query = _clean_search_query((await llm.ainvoke(_search_query_prompt(user_input))).content)
+        except Exception as e:
+            print(f"⚠️  Error generating search query: {e}")
     
-    return {
-        "web_results": results if isinstance(results, list) else [],
-        "enhanced_context": enhanced_context,
-        "history": state.get("history", []) + ["Performed web search"]
-    }
+    results = None
+    try:
+        if search_tool:
+            results = await search_tool.ainvoke({"query": search_query})
+    except Exception as e:
+        print(f"⚠️  Web search error: {e}")
+        results = ""
+    return await asyncio.to_thread(
+        _web_search_result, state, _result_list(results), embeddings, budget_tokens, tokenizer_model
+    )
 
-def drafter_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[str, Any]:
-    """Draft the email or summary based on intent."""
+def compression_node(
+    state: EmailAgentState,
+    embeddings=None,
+    ratios: Optional[Dict[str, float]] = None,
+    tokenizer_model: str = "gpt-4o-mini"
+) -> Dict[str, Any]:
+    """
+    Compress the context before drafting.
+    
+    Keeps the sentences most relevant to the instruction (with their email
+    headers) so that about the intent's ratio of the tokens reaches the
+    drafter. The internal context and the web results are compressed
+    separately so both stay represented in `enhanced_context`.
+    """
+    intent = state.get("intent", "NEW_EMAIL")
+    user_input = state.get("user_input", "")
+    ratio = (ratios or DEFAULT_COMPRESSION_RATIOS).get(intent, DEFAULT_COMPRESSION_RATIOS["NEW_EMAIL"])
+    
+    context, report = compress_text(
+        state.get("context", ""), user_input, ratio, embeddings=embeddings, model=tokenizer_model
+    )
+    result: Dict[str, Any] = {"context": context}
+    
+    enhanced_context = state.get("enhanced_context")
+    if enhanced_context and EXTERNAL_MARKER in enhanced_context:
+        web_info = enhanced_context.split(EXTERNAL_MARKER, 1)[1].strip()
+        web_info, web_report = compress_text(
+            web_info, user_input, ratio, embeddings=embeddings, model=tokenizer_model
+        )
+        result["enhanced_context"] = f"{context}\n\n{EXTERNAL_MARKER}\n{web_info}"
+        report = {key: report[key] + web_report[key] for key in report}
+    
+    report["ratio"] = ratio
+    result["draft_metadata"] = {**state.get("draft_metadata", {}), "context_compression": report}
+    result["history"] = state.get("history", []) + [
+        f"Compressed context ({report['original_tokens']} -> {report['compressed_tokens']} tokens)"
+    ]
+    return result
+
+async def acompression_node(
+    state: EmailAgentState,
+    embeddings=None,
+    ratios: Optional[Dict[str, float]] = None,
+    tokenizer_model: str = "gpt-4o-mini"
+) -> Dict[str, Any]:
+    """Async variant of `compression_node` (local scoring, run in a thread)."""
+    return await asyncio.to_thread(compression_node, state, embeddings, ratios, tokenizer_model)
+
+def _drafter_prompt(state: EmailAgentState) -> str:
     intent = state.get("intent", "NEW_EMAIL")
     user_input = state.get("user_input", "")
     context = state.get("enhanced_context") or state.get("context", "")
-    thread_id = state.get("thread_id")
     
     # Build prompt based on intent
     if intent == "REPLY_EMAIL":
@@ -335,7 +816,35 @@ def drafter_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[str, Any]:
                 f"Email:"
             )
     
-    draft = llm.invoke(prompt).content.strip()
+    return prompt
+
+def _needs_revision(state: EmailAgentState) -> bool:
+    """A rejected draft is revised in place rather than redrafted from scratch."""
+    return bool(state.get("draft")) and state.get("review_approved") is False
+
+def _revision_prompt(state: EmailAgentState) -> str:
+    user_input = state.get("user_input", "")
+    context = state.get("enhanced_context") or state.get("context", "")
+    issues = "\n".join(f"- {i}" for i in state.get("review_issues", [])) or "- none"
+    suggestions = "\n".join(f"- {s}" for s in state.get("review_suggestions", [])) or "- none"
+    return (
+        f"Revise the email draft below to address the reviewer's feedback.\n\n"
+        f"User instruction: {user_input}\n\n"
+        f"Context (for facts only):\n{context}\n\n"
+        f"Current draft:\n{state.get('draft', '')}\n\n"
+        f"Reviewer issues:\n{issues}\n\n"
+        f"Reviewer suggestions:\n{suggestions}\n\n"
+        f"Make targeted edits that fix these points and keep everything else unchanged "
+        f"(same structure, tone and 'Subject:' line format). "
+        f"Respond with ONLY the revised email.\n\n"
+        f"Revised email:"
+    )
+
+def _drafter_result(state: EmailAgentState, draft: str, revision: bool = False) -> Dict[str, Any]:
+    intent = state.get("intent", "NEW_EMAIL")
+    thread_id = state.get("thread_id")
+    draft = draft.strip()
+    revision_count = state.get("revision_count", 0) + (1 if revision else 0)
     
     # Extract subject and body if present
     subject = None
@@ -350,10 +859,12 @@ def drafter_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[str, Any]:
     
     # Extract metadata (subject, etc.)
     metadata = {
+        **state.get("draft_metadata", {}),
         "intent": intent,
         "thread_id": thread_id,
         "draft_length": len(draft),
-        "subject": subject
+        "subject": subject,
+        "revision": revision_count
     }
     
     # Store formatted draft with subject separated
@@ -361,19 +872,37 @@ def drafter_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[str, Any]:
     if subject:
         formatted_draft = f"Subject: {subject}\n\n{body}"
     
+    entry = f"Revised draft (revision {revision_count})" if revision else f"Drafted {intent}"
     return {
         "draft": formatted_draft,
         "draft_metadata": metadata,
-        "history": state.get("history", []) + [f"Drafted {intent}"]
+        "revision_count": revision_count,
+        "history": state.get("history", []) + [entry]
     }
 
-def reviewer_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[str, Any]:
-    """Review the draft for quality, safety, and compliance."""
+def drafter_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[str, Any]:
+    """
+    Draft the email or summary based on intent.
+    
+    After a rejected review, the previous draft is revised with the reviewer's
+    issues and suggestions instead of being regenerated from scratch.
+    """
+    revision = _needs_revision(state)
+    prompt = _revision_prompt(state) if revision else _drafter_prompt(state)
+    return _drafter_result(state, llm.invoke(prompt).content, revision)
+
+async def adrafter_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[str, Any]:
+    """Async variant of `drafter_node`."""
+    revision = _needs_revision(state)
+    prompt = _revision_prompt(state) if revision else _drafter_prompt(state)
+    return _drafter_result(state, (await llm.ainvoke(prompt)).content, revision)
+
+def _reviewer_prompt(state: EmailAgentState) -> str:
     draft = state.get("draft", "")
     intent = state.get("intent", "NEW_EMAIL")
     user_input = state.get("user_input", "")
     
-    prompt = (
+    return (
         f"Review the following email draft for quality, professionalism, and compliance.\n\n"
         f"Original user request: {user_input}\n"
         f"Intent: {intent}\n\n"
@@ -389,9 +918,37 @@ def reviewer_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[str, Any]:
         f"ISSUES: [list any issues found, or 'none']\n"
         f"SUGGESTIONS: [suggestions for improvement, or 'none']\n"
     )
+
+def _review_update(
+    state: EmailAgentState,
+    approved: bool,
+    issues: List[str],
+    suggestions: List[str],
+    max_revisions: Optional[int] = None,
+    pre_review: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    entry = f"Review: {'Approved' if approved else 'Needs revision'}"
+    if pre_review is not None and pre_review["verdict"] != "llm":
+        entry += " (rules)"
+    if not approved and max_revisions is not None and state.get("revision_count", 0) >= max_revisions:
+        entry += f" (revision budget of {max_revisions} exhausted)"
     
-    response = llm.invoke(prompt).content
-    
+    update = {
+        "review_approved": approved,
+        "review_issues": issues,
+        "review_suggestions": suggestions,
+        "history": state.get("history", []) + [entry]
+    }
+    if pre_review is not None:
+        update["draft_metadata"] = {**state.get("draft_metadata", {}), "pre_review": pre_review}
+    return update
+
+def _review_result(
+    state: EmailAgentState,
+    response: str,
+    max_revisions: Optional[int] = None,
+    pre_review: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
     # Parse response
     approved = "APPROVED: yes" in response.upper() or "APPROVED:true" in response.upper()
     
@@ -413,41 +970,238 @@ def reviewer_node(state: EmailAgentState, llm: "ChatOpenAI") -> Dict[str, Any]:
         approved = True
         issues = ["Minor review - approved with suggestions"]
     
-    return {
-        "review_approved": approved,
-        "review_issues": issues,
-        "review_suggestions": suggestions,
-        "history": state.get("history", []) + [f"Review: {'Approved' if approved else 'Needs revision'}"]
-    }
+    # Rule warnings are surfaced to the human alongside the LLM's suggestions
+    if pre_review and pre_review["warnings"]:
+        suggestions = suggestions + [f"Check: {w}" for w in pre_review["warnings"]]
+    
+    return _review_update(state, approved, issues, suggestions, max_revisions, pre_review)
+
+def _pre_review(state: EmailAgentState, rules: Optional[ReviewRules]) -> Optional[Dict[str, Any]]:
+    """Run the local rules; None when they are disabled."""
+    if rules is None:
+        return None
+    return rules.check(state.get("draft", ""), state.get("intent", "NEW_EMAIL"), state.get("user_input", ""))
+
+def _rule_verdict(
+    state: EmailAgentState,
+    pre_review: Optional[Dict[str, Any]],
+    max_revisions: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """Review decided by the rules alone, or None when the LLM reviewer is needed."""
+    if pre_review is None or pre_review["verdict"] == "llm":
+        return None
+    if pre_review["verdict"] == "reject":
+        suggestions = [f"Fix: {f}" for f in pre_review["failures"]] + [f"Check: {w}" for w in pre_review["warnings"]]
+        return _review_update(state, False, pre_review["failures"], suggestions, max_revisions, pre_review)
+    return _review_update(state, True, [], [], max_revisions, pre_review)
+
+def reviewer_node(
+    state: EmailAgentState,
+    llm: "ChatOpenAI",
+    max_revisions: Optional[int] = None,
+    rules: Optional[ReviewRules] = None
+) -> Dict[str, Any]:
+    """
+    Review the draft for quality, safety, and compliance.
+    
+    The local rules run first: a draft that breaks a "fail" rule goes back to
+    revision, and (with the "low_risk" policy) a short clean draft is approved,
+    both without calling the LLM.
+    """
+    pre_review = _pre_review(state, rules)
+    verdict = _rule_verdict(state, pre_review, max_revisions)
+    if verdict is not None:
+        return verdict
+    return _review_result(state, llm.invoke(_reviewer_prompt(state)).content, max_revisions, pre_review)
+
+async def areviewer_node(
+    state: EmailAgentState,
+    llm: "ChatOpenAI",
+    max_revisions: Optional[int] = None,
+    rules: Optional[ReviewRules] = None
+) -> Dict[str, Any]:
+    """Async variant of `reviewer_node`."""
+    pre_review = _pre_review(state, rules)
+    verdict = _rule_verdict(state, pre_review, max_revisions)
+    if verdict is not None:
+        return verdict
+    response = (await llm.ainvoke(_reviewer_prompt(state))).content
+    return _review_result(state, response, max_revisions, pre_review)
 
 # --- Workflow Builder --------------------------------------------------
 
-def build_workflow(llm: "ChatOpenAI", vector_store=None, search_tool=None) -> StateGraph:
-    """Build the LangGraph workflow for the email automation agent."""
+def build_workflow(
+    llm: "ChatOpenAI",
+    vector_store=None,
+    search_tool=None,
+    retrieval_timeout: float = 15.0,
+    intent_classifier: Optional[IntentClassifier] = None,
+    llm_cache: Optional[LLMCache] = None,
+    cache_opt_out: Tuple[str, ...] = ("drafter",),
+    semantic_cache: Optional[SemanticCache] = None,
+    clients: Optional[ClientRegistry] = None,
+    decision_llm: Optional["ChatOpenAI"] = None,
+    corpus_directory: Optional[CorpusDirectory] = None,
+    lexical_index=None,
+    embeddings=None,
+    context_budgets: Optional[Dict[str, int]] = None,
+    compression_ratios: Optional[Dict[str, float]] = None,
+    enable_compression: bool = True,
+    use_async: bool = False,
+    web_budget_tokens: int = DEFAULT_WEB_BUDGET,
+    max_revisions: int = 2,
+    review_rules: Optional[ReviewRules] = None,
+    model_router: Optional[ModelRouter] = None,
+    metrics: Optional[NodeMetrics] = None
+) -> StateGraph:
+    """
+    Build the LangGraph workflow for the email automation agent.
+    
+    Args:
+        llm: Chat model shared by the nodes
+        vector_store: Vector store used by the retrieval node
+        search_tool: Web search tool used by the web search node
+        retrieval_timeout: Per-branch timeout (seconds) inside the retrieval node
+        intent_classifier: Local intent classifier (LLM-only classification if None)
+        llm_cache: Shared LLM response cache (no caching if None)
+        cache_opt_out: Nodes that always call the model (non-deterministic output)
+        semantic_cache: Near-duplicate cache for the classifier and web-search decision
+        clients: Shared client registry (pooled HTTP connections)
+        decision_llm: Client for the web-search decision (temperature 0.1 by default)
+        corpus_directory: Conversations/correspondents used to scope retrieval
+        lexical_index: BM25 index fused with the vector results (see vector_db.BM25Index)
+        embeddings: Embeddings used to rank passages when packing the context
+        context_budgets: Token budget of the retrieved context per intent
+        compression_ratios: Share of the context tokens kept before drafting, per intent
+        enable_compression: Whether to compress the context between retrieval and drafting
+        use_async: Use the async node variants (run the compiled graph with
+            ainvoke/astream and an async checkpointer, see get_async_checkpointer)
+        web_budget_tokens: Token budget of the web passages appended to the context
+        max_revisions: Reviewer-requested revisions before the draft is handed to
+            the human as is
+        review_rules: Local rules run before the LLM reviewer (LLM review only if None)
+        model_router: Per-node (and per-intent) model tiers with latency-SLO
+            fallback; when given, `llm` and `decision_llm` are not used by the nodes
+        metrics: Store of per-node wall time, LLM calls, tokens and cache hits
+            (keyed by the run's thread_id)
+    """
     workflow = StateGraph(EmailAgentState)
     
+    # Build the low-temperature decision client once, not per request
+    if decision_llm is None and model_router is None:
+        decision_llm = make_llm(
+            model=model_identity(llm)["model"],
+            temperature=0.1,
+            clients=clients,
+            purpose="web_search_decision"
+        )
+    
+    def _node_llm(node: str, base=llm):
+        if llm_cache is not None and node not in cache_opt_out:
+            base = CachedChatModel(base, llm_cache, node=node)
+        return MeteredChatModel(base) if metrics is not None else base
+    
+    classifier_llm = _node_llm("intent_classifier")
+    retrieval_llm = _node_llm("retrieval", decision_llm)
+    web_search_llm = _node_llm("web_search")
+    drafter_llm = _node_llm("drafter")
+    reviewer_llm = _node_llm("reviewer")
+    
+    def _llm_for(node: str, state: EmailAgentState, default):
+        """The node's model for this run: routed by tier and intent, or the fixed one."""
+        if model_router is None:
+            return default
+        return model_router.bind(node, state.get("intent"), wrap=_node_llm)
+    
+    if model_router is not None:
+        tokenizer_model = model_router.tiers[model_router.preferred_tier("drafter")]["model"]
+    else:
+        tokenizer_model = model_identity(drafter_llm)["model"]
+    retrieval_kwargs = {
+        "vector_timeout": retrieval_timeout,
+        "decision_timeout": retrieval_timeout,
+        "semantic_cache": semantic_cache,
+        "corpus_directory": corpus_directory,
+        "lexical_index": lexical_index,
+        "embeddings": embeddings,
+        "context_budgets": context_budgets,
+        "tokenizer_model": tokenizer_model,
+    }
+    web_kwargs = {"embeddings": embeddings, "budget_tokens": web_budget_tokens, "tokenizer_model": tokenizer_model}
+    
     # Define node wrappers
     def _intent_classifier(state: EmailAgentState):
-        return intent_classifier_node(state, llm)
+        classifier = _llm_for("intent_classifier", state, classifier_llm)
+        return intent_classifier_node(state, classifier, intent_classifier, semantic_cache)
     
     def _retrieval(state: EmailAgentState):
-        return retrieval_node(state, vector_store, llm)
+        return retrieval_node(state, vector_store, _llm_for("retrieval", state, retrieval_llm), **retrieval_kwargs)
     
     def _web_search(state: EmailAgentState):
-        return web_search_node(state, search_tool, llm)
+        return web_search_node(state, search_tool, _llm_for("web_search", state, web_search_llm), **web_kwargs)
+    
+    def _compression(state: EmailAgentState):
+        return compression_node(state, embeddings, compression_ratios, tokenizer_model=tokenizer_model)
     
     def _drafter(state: EmailAgentState):
-        return drafter_node(state, llm)
+        return drafter_node(state, _llm_for("drafter", state, drafter_llm))
     
     def _reviewer(state: EmailAgentState):
-        return reviewer_node(state, llm)
+        return reviewer_node(state, _llm_for("reviewer", state, reviewer_llm), max_revisions, review_rules)
+    
+    # Async node wrappers (the graph must then be run with ainvoke/astream)
+    async def _aintent_classifier(state: EmailAgentState):
+        classifier = _llm_for("intent_classifier", state, classifier_llm)
+        return await aintent_classifier_node(state, classifier, intent_classifier, semantic_cache)
+    
+    async def _aretrieval(state: EmailAgentState):
+        decider = _llm_for("retrieval", state, retrieval_llm)
+        return await aretrieval_node(state, vector_store, decider, **retrieval_kwargs)
+    
+    async def _aweb_search(state: EmailAgentState):
+        rewriter = _llm_for("web_search", state, web_search_llm)
+        return await aweb_search_node(state, search_tool, rewriter, **web_kwargs)
+    
+    async def _acompression(state: EmailAgentState):
+        return await acompression_node(state, embeddings, compression_ratios, tokenizer_model=tokenizer_model)
+    
+    async def _adrafter(state: EmailAgentState):
+        return await adrafter_node(state, _llm_for("drafter", state, drafter_llm))
+    
+    async def _areviewer(state: EmailAgentState):
+        return await areviewer_node(state, _llm_for("reviewer", state, reviewer_llm), max_revisions, review_rules)
+    
+    def _counted(node: str, fn):
+        """Count executed nodes in `step_count` and record each run in `metrics`."""
+        def _measure(state: EmailAgentState, config: Optional[RunnableConfig]):
+            if metrics is None:
+                return nullcontext()
+            thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+            return metrics.measure(node, thread_id, state.get("intent"))
+        
+        if asyncio.iscoroutinefunction(fn):
+            async def wrapper(state: EmailAgentState, config: RunnableConfig):
+                with _measure(state, config):
+                    update = await fn(state)
+                return {**update, "step_count": state.get("step_count", 0) + 1}
+        else:
+            def wrapper(state: EmailAgentState, config: RunnableConfig):
+                with _measure(state, config):
+                    update = fn(state)
+                return {**update, "step_count": state.get("step_count", 0) + 1}
+        return wrapper
     
     # Add nodes
-    workflow.add_node("intent_classifier", _intent_classifier)
-    workflow.add_node("retrieval", _retrieval)
-    workflow.add_node("web_search", _web_search)
-    workflow.add_node("drafter", _drafter)
-    workflow.add_node("reviewer", _reviewer)
+    def _add_node(name: str, sync_fn, async_fn):
+        workflow.add_node(name, _counted(name, async_fn if use_async else sync_fn))
+    
+    _add_node("intent_classifier", _intent_classifier, _aintent_classifier)
+    _add_node("retrieval", _retrieval, _aretrieval)
+    _add_node("web_search", _web_search, _aweb_search)
+    if enable_compression:
+        _add_node("compression", _compression, _acompression)
+    _add_node("drafter", _drafter, _adrafter)
+    _add_node("reviewer", _reviewer, _areviewer)
     
     # Set entry point
     workflow.set_entry_point("intent_classifier")
@@ -455,6 +1209,9 @@ def build_workflow(llm: "ChatOpenAI", vector_store=None, search_tool=None) -> St
     # Add edges
     workflow.add_edge("intent_classifier", "retrieval")
     
+    # Context is compressed once before drafting (revisions reuse it)
+    before_drafter = "compression" if enable_compression else "drafter"
+    
     # Conditional: web search if needed
     def route_after_retrieval(state: EmailAgentState) -> str:
         if state.get("needs_web_search", False):
@@ -466,18 +1223,22 @@ def build_workflow(llm: "ChatOpenAI", vector_store=None, search_tool=None) -> St
         route_after_retrieval,
         {
             "web_search": "web_search",
-            "drafter": "drafter"
+            "drafter": before_drafter
         }
     )
     
-    workflow.add_edge("web_search", "drafter")
+    workflow.add_edge("web_search", before_drafter)
+    if enable_compression:
+        workflow.add_edge("compression", "drafter")
     workflow.add_edge("drafter", "reviewer")
     
     # Conditional: reviewer approval
     def route_after_review(state: EmailAgentState) -> str:
         if state.get("review_approved", False):
             return "end"
-        return "drafter"  # Loop back to drafter with feedback
+        if state.get("revision_count", 0) >= max_revisions:
+            return "end"  # Revision budget spent: the human decides
+        return "drafter"  # Loop back to drafter to revise with the feedback
     
     workflow.add_conditional_edges(
         "reviewer",
@@ -490,23 +1251,113 @@ def build_workflow(llm: "ChatOpenAI", vector_store=None, search_tool=None) -> St
     
     return workflow
 
+# --- Streaming ---------------------------------------------------------
+
+def graph_events(app, inputs, config) -> Iterator[Dict[str, Any]]:
+    """
+    Run the compiled graph and yield JSON-serializable progress events.
+    
+    Uses the graph's "updates" stream for node progress and its "messages"
+    stream for the drafter's tokens:
+        {"type": "token", "text"}                          drafter token
+        {"type": "node", "node", "detail", "elapsed", ...}  node finished; the
+            drafter adds "draft" and "streamed", the reviewer its verdict
+        {"type": "done", "elapsed", "first_token"}         run finished or paused
+    """
+    start = time.perf_counter()
+    first_token = None
+    draft_streamed = False
+    for mode, chunk in app.stream(inputs, config=config, stream_mode=["updates", "messages"], **run_options(app)):
+        if mode == "messages":
+            message, metadata = chunk
+            if metadata.get("langgraph_node") != "drafter" or not isinstance(message.content, str):
+                continue
+            if not message.content:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            draft_streamed = True
+            yield {"type": "token", "text": message.content}
+            continue
+        
+        for node, update in chunk.items():
+            if node.startswith("__"):
+                continue
+            update = update or {}
+            history = update.get("history") or []
+            event = {
+                "type": "node",
+                "node": node,
+                "detail": history[-1] if history else "done",
+                "elapsed": round(time.perf_counter() - start, 3),
+            }
+            if node == "drafter":
+                event.update({"draft": update.get("draft", ""), "streamed": draft_streamed})
+                draft_streamed = False
+            elif node == "reviewer":
+                event.update({
+                    "review_approved": update.get("review_approved", False),
+                    "review_issues": update.get("review_issues", []),
+                    "review_suggestions": update.get("review_suggestions", []),
+                })
+            yield event
+    
+    yield {
+        "type": "done",
+        "elapsed": round(time.perf_counter() - start, 3),
+        "first_token": round(first_token, 3) if first_token is not None else None,
+    }
+
 # --- Checkpointer Loader -----------------------------------------------
 
 @contextmanager
-def get_checkpointer(db_path: str):
+def get_checkpointer(db_path: str, durability: str = "step"):
     """
-    Yield a real checkpointer object. If SQLite is available, open it;
-    otherwise yield MemorySaver. This function itself is the only
-    context manager.
+    Yield a real checkpointer object. If SQLite is available, open it
+    (with the given durability, see checkpointer.py); otherwise yield
+    MemorySaver. This function itself is the only context manager.
     """
     try:
-        from langgraph.checkpoint.sqlite import SqliteSaver
-        with SqliteSaver.from_conn_string(db_path) as mem:
-            yield mem
-    except Exception:
+        from src.checkpointer import WriteBehindSqliteSaver
+        saver_cm = WriteBehindSqliteSaver.from_conn_string(db_path, durability=durability)
+    except ImportError:
+        saver_cm = None
+    if saver_cm is None:
         from langgraph.checkpoint.memory import MemorySaver
-        mem = MemorySaver()
         print("⚠️  SQLite unavailable; using in-memory saver.")
         # No close needed for MemorySaver
+        yield MemorySaver()
+        return
+    with saver_cm as mem:
         yield mem
 
+@asynccontextmanager
+async def get_async_checkpointer(db_path: str, durability: str = "step"):
+    """
+    Async counterpart of `get_checkpointer` for graphs built with
+    `use_async=True`: AsyncSqliteSaver (needs aiosqlite), else MemorySaver.
+    Saves already run off the event loop there, so durability only sets the
+    connection tuning and the graph's durability run option.
+    """
+    try:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        from src.checkpointer import GRAPH_DURABILITY, SYNCHRONOUS
+        saver_cm = AsyncSqliteSaver.from_conn_string(db_path)
+    except Exception:
+        saver_cm = None
+    if saver_cm is None:
+        from langgraph.checkpoint.memory import MemorySaver
+        print("⚠️  Async SQLite unavailable (pip install aiosqlite); using in-memory saver.")
+        yield MemorySaver()
+        return
+    async with saver_cm as mem:
+        await mem.conn.execute("PRAGMA journal_mode=WAL")
+        await mem.conn.execute(f"PRAGMA synchronous={SYNCHRONOUS[durability]}")
+        mem.graph_durability = GRAPH_DURABILITY[durability]
+        yield mem
+
+def run_options(app) -> Dict[str, Any]:
+    """Run keyword arguments for the app's checkpointer (its LangGraph durability, if set)."""
+    durability = getattr(getattr(app, "checkpointer", None), "graph_durability", None)
+    return {"durability": durability} if durability else {}
+
@@ -4,7 +4,12 @@ Vector database setup and management for RAG.
 """
 
 import os
-from typing import List
+import re
+import json
+import math
+import hashlib
+import threading
+from typing import List, Optional, Dict, Any, Tuple
 from pathlib import Path
 
 try:
@@ -27,6 +32,77 @@ try:
 except Exception:
     raise ImportError("Missing dependencies. Try: pip install langchain-chroma chromadb (or langchain-community)")
 
+from src.embedding_cache import CachedEmbeddings
+from src.retrieval import normalize_text
+
+def default_embedding_cache_dir(persist_directory: str) -> str:
+    """Embedding cache lives next to the Chroma directory so rebuilds can reuse it."""
+    return os.path.join(os.path.dirname(os.path.abspath(persist_directory)), "embedding_cache")
+
+# Bump when the way files are turned into documents changes (forces a re-index)
+INDEX_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+
+# "## Email 2 - De : Mme Rossi → toi"
+EMAIL_HEADER_RE = re.compile(r"^##\s*Email\s+(\d+)\s*-\s*De\s*:\s*(.+?)\s*(?:→|->)\s*(.+?)\s*$", re.MULTILINE)
+# "**Objet** : Re: Suivi de notre collaboration"
+SUBJECT_RE = re.compile(r"^\*\*Objet\*\*\s*:\s*(.+?)\s*$", re.MULTILINE)
+TITLE_RE = re.compile(r"^#\s+(.+?)\s*$", re.MULTILINE)
+
+def _person_name(raw: str) -> str:
+    """'Sophie (Manager)' -> 'Sophie'."""
+    return re.sub(r"\s*\(.*?\)", "", raw).strip()
+
+def split_conversation(doc: Document) -> List[Document]:
+    """
+    Split a conversation file into one document per email.
+    
+    Each chunk keeps the thread title and its email header, and carries sender,
+    recipient, subject and position metadata. Files that do not follow the
+    `## Email N - De : X → Y` structure are returned unchanged.
+    """
+    text = doc.page_content
+    headers = list(EMAIL_HEADER_RE.finditer(text))
+    if not headers:
+        return [doc]
+    
+    title_match = TITLE_RE.search(text)
+    title = title_match.group(1) if title_match else ""
+    chunks = []
+    for position, header in enumerate(headers):
+        end = headers[position + 1].start() if position + 1 < len(headers) else len(text)
+        section = text[header.start():end].strip()
+        # Drop the trailing "---" separator between emails
+        section = re.sub(r"\n-{3,}\s*$", "", section).strip()
+        subject_match = SUBJECT_RE.search(section)
+        metadata = dict(doc.metadata)
+        metadata.update({
+            "thread": title,
+            "email_index": int(header.group(1)),
+            "position": position,
+            "email_count": len(headers),
+            "sender": _person_name(header.group(2)),
+            "recipient": _person_name(header.group(3)),
+            "sender_raw": header.group(2),
+            "recipient_raw": header.group(3),
+            "subject": subject_match.group(1) if subject_match else "",
+        })
+        content = f"# {title}\n\n{section}" if title else section
+        chunks.append(Document(page_content=content, metadata=metadata))
+    return chunks
+
+def load_markdown_file(md_file: Path) -> List[Document]:
+    """Load one markdown file as per-email documents with source metadata."""
+    loader = TextLoader(str(md_file), encoding="utf-8")
+    docs = loader.load()
+    chunks = []
+    for doc in docs:
+        # Add metadata
+        doc.metadata["source"] = str(md_file.name)
+        doc.metadata["file_type"] = "markdown"
+        chunks.extend(split_conversation(doc))
+    return chunks
+
 def load_markdown_files(data_dir: str = "data/vector_data") -> List[Document]:
     """Load all markdown files from the data directory."""
     documents = []
@@ -39,78 +115,398 @@ def load_markdown_files(data_dir: str = "data/vector_data") -> List[Document]:
     
     for md_file in data_path.glob("*.md"):
         try:
-            loader = TextLoader(str(md_file), encoding="utf-8")
-            docs = loader.load()
-            # Add metadata
-            for doc in docs:
-                doc.metadata["source"] = str(md_file.name)
-                doc.metadata["file_type"] = "markdown"
-            documents.extend(docs)
+            documents.extend(load_markdown_file(md_file))
             print(f"✅ Loaded {md_file.name}")
         except Exception as e:
             print(f"⚠️  Error loading {md_file}: {e}")
     
     return documents
 
+# --- Lexical index (BM25) ----------------------------------------------
+
+LEXICAL_INDEX_FILE = "bm25.json"
+
+# Very common words that carry no lexical signal (French + English)
+LEXICAL_STOPWORDS = {
+    "the", "and", "for", "with", "this", "that", "about", "from", "to", "of", "in", "on", "a", "an",
+    "email", "mail", "write", "reply", "le", "la", "les", "de", "des", "du", "un", "une", "et",
+    "pour", "sur", "avec", "dans", "au", "aux", "ce", "cette", "qui", "que", "est", "je", "tu", "vous",
+}
+
+def lexical_tokens(text: str) -> List[str]:
+    """Accent-insensitive word tokens used by the BM25 index."""
+    return [t for t in re.findall(r"[a-z0-9]+", normalize_text(text)) if len(t) > 1 and t not in LEXICAL_STOPWORDS]
+
+class BM25Index:
+    """
+    In-process BM25 inverted index kept alongside the Chroma collection.
+    
+    Documents are added/removed by the same ids as in Chroma, so the index is
+    maintained incrementally by `sync_vector_store`, and persisted as JSON in
+    the Chroma directory.
+    """
+    
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        # id -> {"text", "metadata", "tf", "length"}
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        # term -> {id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.docs)
+    
+    def add(self, ids: List[str], documents: List[Document]):
+        """Add (or replace) documents."""
+        with self._lock:
+            for doc_id, doc in zip(ids, documents):
+                self._remove(doc_id)
+                tf: Dict[str, int] = {}
+                for token in lexical_tokens(doc.page_content):
+                    tf[token] = tf.get(token, 0) + 1
+                length = sum(tf.values())
+                self.docs[doc_id] = {"text": doc.page_content, "metadata": dict(doc.metadata), "tf": tf, "length": length}
+                self._total_length += length
+                for term, count in tf.items():
+                    self.postings.setdefault(term, {})[doc_id] = count
+    
+    def remove(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+    
+    def _remove(self, doc_id: str):
+        entry = self.docs.pop(doc_id, None)
+        if not entry:
+            return
+        self._total_length -= entry["length"]
+        for term in entry["tf"]:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+    
+    def _idf(self, term: str) -> float:
+        n = len(self.docs)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+    
+    def search(self, query: str, k: int = 5, sources: Optional[List[str]] = None) -> List[Tuple[Document, float, float]]:
+        """
+        Rank documents for `query`.
+        
+        Returns:
+            (document, bm25 score, confidence) tuples, best first. The confidence
+            is the score relative to one occurrence of every query term in an
+            average-length document (capped at 1), halved for single-term
+            queries which are too short to be conclusive.
+        """
+        terms = list(dict.fromkeys(lexical_tokens(query)))
+        with self._lock:
+            if not terms or not self.docs:
+                return []
+            avg_length = self._total_length / len(self.docs)
+            allowed = set(sources) if sources else None
+            scores: Dict[str, float] = {}
+            max_score = 0.0
+            for term in terms:
+                idf = self._idf(term)
+                # Score of a single occurrence in a document of average length
+                max_score += idf
+                for doc_id, tf in self.postings.get(term, {}).items():
+                    entry = self.docs[doc_id]
+                    if allowed is not None and entry["metadata"].get("source") not in allowed:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * entry["length"] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+            # Single-term queries are too short to be conclusive on their own
+            damping = 0.5 if len(terms) < 2 else 1.0
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+            return [
+                (
+                    Document(page_content=self.docs[doc_id]["text"], metadata=dict(self.docs[doc_id]["metadata"]), id=doc_id),
+                    score,
+                    damping * min(1.0, score / max_score) if max_score else 0.0
+                )
+                for doc_id, score in ranked
+            ]
+    
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                "version": INDEX_VERSION,
+                "docs": {doc_id: {"text": e["text"], "metadata": e["metadata"]} for doc_id, e in self.docs.items()},
+            }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+    
+    def load(self, vector_store: Optional[Chroma] = None) -> bool:
+        """
+        Load the persisted index, or rebuild it from the Chroma collection when
+        the file is missing or was written by another index version.
+        
+        Returns:
+            True if the index was rebuilt from Chroma
+        """
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == INDEX_VERSION:
+                    docs = data.get("docs", {})
+                    self.add(
+                        list(docs),
+                        [Document(page_content=d["text"], metadata=d["metadata"]) for d in docs.values()]
+                    )
+                    return False
+            except Exception as e:
+                print(f"⚠️  Could not read lexical index {self.path}: {e}")
+        if vector_store is not None:
+            stored = vector_store.get(include=["documents", "metadatas"])
+            self.add(
+                stored["ids"],
+                [Document(page_content=text or "", metadata=meta or {})
+                 for text, meta in zip(stored["documents"], stored["metadatas"])]
+            )
+        return True
+
+# --- Incremental indexing ----------------------------------------------
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def load_manifest(persist_directory: str) -> Dict[str, Any]:
+    """Load the index manifest: file name -> {mtime, size, sha256, ids}."""
+    path = os.path.join(persist_directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️  Could not read manifest {path}: {e}")
+        return {}
+
+def save_manifest(persist_directory: str, manifest: Dict[str, Any]):
+    """Write the manifest atomically."""
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def _adopt_legacy_index(vector_store: Chroma, data_path: Path) -> Dict[str, Any]:
+    """
+    Build manifest entries for an index created before manifests existed.
+    
+    A file is adopted (not re-embedded) when the documents it produces today
+    match what is stored. Sources missing from `data_path` are left in the
+    index untracked: without a manifest, a missing file is more likely a
+    wrong data directory than a deletion.
+    """
+    files = {}
+    stored = vector_store.get(include=["metadatas", "documents"])
+    by_source: Dict[str, Dict[str, List]] = {}
+    for doc_id, meta, text in zip(stored["ids"], stored["metadatas"], stored["documents"]):
+        entry = by_source.setdefault((meta or {}).get("source", ""), {"ids": [], "texts": []})
+        entry["ids"].append(doc_id)
+        entry["texts"].append(text or "")
+    untracked = 0
+    for source, entry in by_source.items():
+        md_file = data_path / source
+        if not md_file.exists():
+            untracked += 1
+            continue
+        sha = None
+        expected = sorted(doc.page_content for doc in load_markdown_file(md_file))
+        if sorted(entry["texts"]) == expected:
+            sha = _content_hash(md_file.read_bytes())
+        # sha=None marks the entry as stale: it is re-indexed on this sync
+        files[source] = {"mtime": None, "size": None, "sha256": sha, "ids": entry["ids"]}
+    if untracked:
+        print(f"ℹ️  {untracked} indexed source(s) not found in {data_path}; kept as is")
+    return files
+
+def sync_vector_store(
+    vector_store: Chroma,
+    persist_directory: str,
+    data_dir: str,
+    lexical_index: Optional[BM25Index] = None
+) -> Dict[str, int]:
+    """
+    Bring the index in line with the markdown files in `data_dir`.
+    
+    Only added or changed files are (re-)embedded; vectors of removed files are
+    deleted, unless `data_dir` is missing or has no markdown file at all (a
+    wrong path, not an empty corpus), in which case nothing is deleted.
+    Changes are detected from (mtime, size) first and confirmed with a content
+    hash, and recorded in a manifest stored next to the index. The lexical
+    index, if given, receives the same additions and deletions.
+    
+    Returns:
+        Counts of added / updated / removed / unchanged files
+    """
+    data_path = Path(data_dir)
+    data_existed = data_path.exists()
+    if not data_existed:
+        print(f"⚠️  Directory {data_dir} does not exist; nothing to index.")
+    md_files = sorted(data_path.glob("*.md"))
+    
+    manifest = load_manifest(persist_directory)
+    if manifest.get("version") != INDEX_VERSION:
+        if manifest:
+            print("ℹ️  Index format changed; re-indexing all files")
+            files = {name: dict(entry, sha256=None) for name, entry in manifest.get("files", {}).items()}
+        else:
+            files = _adopt_legacy_index(vector_store, data_path)
+    else:
+        files = manifest.get("files", {})
+    
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+    seen = set()
+    for md_file in md_files:
+        name = md_file.name
+        seen.add(name)
+        stat = md_file.stat()
+        entry = files.get(name)
+        if entry and entry.get("sha256") and entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size:
+            stats["unchanged"] += 1
+            continue
+        
+        content = md_file.read_bytes()
+        sha = _content_hash(content)
+        if entry and entry.get("sha256") == sha:
+            # Touched but identical: only refresh the fingerprint
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            stats["unchanged"] += 1
+            continue
+        
+        try:
+            docs = load_markdown_file(md_file)
+        except Exception as e:
+            print(f"⚠️  Error loading {md_file}: {e}")
+            continue
+        ids = [f"{name}:{i}" for i in range(len(docs))]
+        if docs:
+            # add_documents upserts, so existing ids are updated in place
+            vector_store.add_documents(docs, ids=ids)
+            if lexical_index is not None:
+                lexical_index.add(ids, docs)
+        stale = [doc_id for doc_id in (entry or {}).get("ids", []) if doc_id not in ids]
+        if stale:
+            vector_store.delete(ids=stale)
+            if lexical_index is not None:
+                lexical_index.remove(stale)
+        files[name] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": sha, "ids": ids}
+        stats["updated" if entry else "added"] += 1
+        print(f"✅ Indexed {name} ({len(docs)} documents)")
+    
+    removed = [n for n in files if n not in seen]
+    if removed and not (data_existed and md_files):
+        print(f"⚠️  No markdown files in {data_dir}; keeping the {len(removed)} indexed file(s)")
+        removed = []
+    for name in removed:
+        ids = files.pop(name).get("ids", [])
+        if ids:
+            vector_store.delete(ids=ids)
+            if lexical_index is not None:
+                lexical_index.remove(ids)
+        stats["removed"] += 1
+        print(f"🗑️  Removed {name} from index")
+    
+    save_manifest(persist_directory, {"version": INDEX_VERSION, "files": files})
+    if lexical_index is not None:
+        lexical_index.save()
+    return stats
+
 def create_vector_store(
     persist_directory: str = "artifacts/chroma_db",
     data_dir: str = "data/vector_data",
-    embedding_model: str = "text-embedding-3-small"
+    embedding_model: str = "text-embedding-3-small",
+    embedding_cache_dir: Optional[str] = None,
+    lexical_index: Optional[BM25Index] = None,
+    embeddings=None,
+    enable_embedding_cache: bool = True
 ) -> Chroma:
     """
-    Create or load a Chroma vector store.
+    Create or load a Chroma vector store and sync it with the markdown files.
     
     Args:
         persist_directory: Directory to persist the vector store
         data_dir: Directory containing markdown files to index
         embedding_model: OpenAI embedding model to use
+        embedding_cache_dir: On-disk embedding cache used for indexing and queries
+            (defaults to `embedding_cache/` next to persist_directory)
+        lexical_index: BM25 index to load (or rebuild) and keep in sync with Chroma
+        embeddings: Embeddings to use instead of OpenAI's `embedding_model`
+            (e.g. an offline stand-in); cached the same way
+        enable_embedding_cache: Whether to wrap the embeddings in the on-disk cache
     
     Returns:
         Chroma vector store instance
     """
-    embeddings = OpenAIEmbeddings(model=embedding_model)
+    if embeddings is None:
+        embeddings = OpenAIEmbeddings(model=embedding_model)
+    if enable_embedding_cache:
+        embeddings = CachedEmbeddings(
+            embeddings,
+            embedding_cache_dir or default_embedding_cache_dir(persist_directory)
+        )
     
     # Inform user which version is being used
     if not USING_NEW_CHROMA:
         print("ℹ️  Using langchain-community Chroma (consider installing langchain-chroma to remove deprecation warning)")
     
-    # Check if vector store already exists
     if os.path.exists(persist_directory) and os.listdir(persist_directory):
         print(f"📂 Loading existing vector store from {persist_directory}")
-        vector_store = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=embeddings
-        )
     else:
         print(f"🆕 Creating new vector store in {persist_directory}")
-        # Load documents
-        documents = load_markdown_files(data_dir)
-        
-        if not documents:
-            print("⚠️  No documents found. Creating empty vector store.")
-            # Create empty vector store
-            vector_store = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=embeddings
-            )
-        else:
-            print(f"📄 Indexing {len(documents)} documents...")
-            # Create vector store with documents
-            vector_store = Chroma.from_documents(
-                documents=documents,
-                embedding=embeddings,
-                persist_directory=persist_directory
-            )
-            print(f"✅ Vector store created with {len(documents)} documents")
+    vector_store = Chroma(
+        persist_directory=persist_directory,
+        embedding_function=embeddings
+    )
+    
+    if lexical_index is not None:
+        if lexical_index.path is None:
+            lexical_index.path = os.path.join(persist_directory, LEXICAL_INDEX_FILE)
+        if lexical_index.load(vector_store):
+            print(f"ℹ️  Lexical index rebuilt from vector store ({len(lexical_index)} documents)")
+    
+    stats = sync_vector_store(vector_store, persist_directory, data_dir, lexical_index)
+    print(
+        f"✅ Vector store synced: {stats['added']} added, {stats['updated']} updated, "
+        f"{stats['removed']} removed, {stats['unchanged']} unchanged"
+    )
     
     return vector_store
 
 def get_vector_store(
     persist_directory: str = "./chroma_db",
-    data_dir: str = "vector_data"
+    data_dir: str = "data/vector_data",
+    embedding_cache_dir: Optional[str] = None,
+    lexical_index: Optional[BM25Index] = None,
+    embeddings=None,
+    enable_embedding_cache: bool = True
 ) -> Chroma:
     """
     Get or create vector store (convenience function).
     """
-    return create_vector_store(persist_directory, data_dir)
+    return create_vector_store(
+        persist_directory,
+        data_dir,
+        embedding_cache_dir=embedding_cache_dir,
+        lexical_index=lexical_index,
+        embeddings=embeddings,
+        enable_embedding_cache=enable_embedding_cache
+    )
 
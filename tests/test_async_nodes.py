@@ -0,0 +1,57 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from src.utils import _adecide_web_search, aintent_classifier_node
+
+
+class FakeLLM:
+    def __init__(self, answer):
+        self.answer = answer
+
+    async def ainvoke(self, prompt):
+        return SimpleNamespace(content=self.answer)
+
+
+class RecordingCache:
+    """Semantic cache stand-in that records the thread each call runs on."""
+
+    def __init__(self):
+        self.threads = []
+        self.stored = {}
+
+    def lookup(self, node, text):
+        self.threads.append(threading.current_thread())
+        return None
+
+    def store(self, node, text, value):
+        self.threads.append(threading.current_thread())
+        self.stored[node] = value
+
+
+def test_async_intent_classifier_embeds_off_the_event_loop():
+    cache = RecordingCache()
+
+    async def scenario():
+        update = await aintent_classifier_node({"user_input": "Reply to Sophie"}, FakeLLM("REPLY_EMAIL"), None, cache)
+        return update, threading.current_thread()
+
+    update, loop_thread = asyncio.run(scenario())
+
+    assert update["intent"] == "REPLY_EMAIL"
+    assert cache.stored["intent_classifier"]["intent"] == "REPLY_EMAIL"
+    assert cache.threads and loop_thread not in cache.threads
+
+
+def test_async_web_search_decision_embeds_off_the_event_loop():
+    cache = RecordingCache()
+
+    async def scenario():
+        decision = await _adecide_web_search("Latest news about Meta", FakeLLM("YES"), cache)
+        return decision, threading.current_thread()
+
+    decision, loop_thread = asyncio.run(scenario())
+
+    assert decision is True
+    assert cache.stored["web_search_decision"] is True
+    assert cache.threads and loop_thread not in cache.threads
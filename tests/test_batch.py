@@ -0,0 +1,76 @@
+import json
+from types import SimpleNamespace
+
+from src.batch import finished_ids, run_batch, run_prefix_for
+
+
+class FakeApp:
+    """Compiled-graph stand-in that drafts instantly and remembers each thread."""
+
+    def __init__(self):
+        self.states = {}
+        self.runs = []
+
+    def get_state(self, config):
+        return SimpleNamespace(values=self.states.get(config["configurable"]["thread_id"], {}), next=())
+
+    def stream(self, inputs, config=None, stream_mode=None, **kwargs):
+        thread_id = config["configurable"]["thread_id"]
+        self.runs.append(thread_id)
+        self.states[thread_id] = {"intent": "NEW_EMAIL", "draft": f"Re: {inputs['user_input']}",
+                                  "review_approved": True}
+        yield {"drafter": {}}
+        yield {"reviewer": {}}
+
+
+def _write_input(path, ids):
+    path.write_text("".join(json.dumps({"id": i, "instruction": f"Écris à {i}"}) + "\n" for i in ids),
+                    encoding="utf-8")
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def test_resume_after_a_line_cut_inside_a_multibyte_character(tmp_path):
+    source, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_input(source, ["a", "b"])
+    cut = json.dumps({"id": "b", "status": "ok", "draft": "Écrit"}, ensure_ascii=False).encode("utf-8")
+    cut = cut[:cut.index("É".encode("utf-8")) + 1]  # the crash left half of "É"
+    out.write_bytes(json.dumps({"id": "a", "status": "ok"}).encode("utf-8") + b"\n" + cut)
+    app = FakeApp()
+
+    counts = run_batch(app, str(source), str(out), workers=1)
+
+    assert counts == {"total": 2, "skipped": 1, "ok": 1, "error": 0}
+    lines = out.read_bytes().split(b"\n")
+    assert lines[1] == cut
+    assert json.loads(lines[2])["id"] == "b"
+    assert finished_ids(str(out)) == {"a", "b"}
+
+
+def test_resume_skips_finished_lines_and_recovers_checkpoints(tmp_path):
+    source, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_input(source, ["a", "b", "c"])
+    app = FakeApp()
+    prefix = run_prefix_for(str(source), str(out))
+    app.states[f"{prefix}:b"] = {"draft": "already drafted", "review_approved": False}
+    out.write_text(json.dumps({"id": "a", "status": "ok"}) + "\n", encoding="utf-8")
+
+    counts = run_batch(app, str(source), str(out), workers=2)
+
+    assert counts == {"total": 3, "skipped": 1, "ok": 2, "error": 0}
+    assert app.runs == [f"{prefix}:c"]
+    recovered = {r["id"]: r for r in _records(out)}["b"]
+    assert recovered["recovered"] and recovered["draft"] == "already drafted"
+
+
+def test_same_input_name_in_different_directories_gets_separate_threads(tmp_path):
+    (tmp_path / "x").mkdir()
+    (tmp_path / "y").mkdir()
+    first = run_prefix_for(str(tmp_path / "x" / "in.jsonl"), str(tmp_path / "x" / "out.jsonl"))
+    second = run_prefix_for(str(tmp_path / "y" / "in.jsonl"), str(tmp_path / "y" / "out.jsonl"))
+
+    assert first != second
+    assert first.startswith("batch-in-")
+    assert first == run_prefix_for(str(tmp_path / "x" / "in.jsonl"), str(tmp_path / "x" / "out.jsonl"))
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from src.cassette import Cassette, CassetteChatModel, CassetteEmbeddings, CassetteMiss, CassetteSearchTool
+from test_vector_db import FakeEmbeddings
+
+
+class SlowSearch:
+    name = "web_search"
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, tool_input, config=None, **kwargs):
+        self.calls += 1
+        time.sleep(0.05)
+        return [{"url": "https://example.com", "content": f"news about {tool_input['query']}"}]
+
+
+def test_llm_embeddings_and_search_round_trip(tmp_path):
+    path = str(tmp_path / "tape.jsonl.gz")
+    recording = Cassette(path, mode="record")
+    llm = CassetteChatModel(FakeListChatModel(responses=["REPLY_EMAIL", "Subject: Q4"]), recording)
+    embeddings = CassetteEmbeddings(FakeEmbeddings(), recording)
+    search = SlowSearch()
+    tool = CassetteSearchTool(search, recording)
+    recorded = [
+        llm.invoke("classify").content,
+        llm.invoke("draft").content,
+        embeddings.embed_documents(["a", "b"]),
+        embeddings.embed_query("b"),
+        tool.invoke({"query": "Meta news"}),
+    ]
+    recording.close()
+
+    replay = Cassette(path, mode="replay", timing="recorded")
+    llm = CassetteChatModel(None, replay)
+    embeddings = CassetteEmbeddings(FakeEmbeddings(), replay)
+    tool = CassetteSearchTool(None, replay)
+    start = time.perf_counter()
+    replayed = [
+        llm.invoke("classify").content,
+        llm.invoke("draft").content,
+        embeddings.embed_documents(["b", "a"])[::-1],
+        embeddings.embed_query("b"),
+        tool.invoke({"query": "meta  news?"}),
+    ]
+
+    assert replayed == [
+        recorded[0], recorded[1], [pytest.approx(v, abs=1e-6) for v in recorded[2]],
+        pytest.approx(recorded[3], abs=1e-6), recorded[4],
+    ]
+    assert time.perf_counter() - start >= 0.05  # the search's recorded latency
+    assert search.calls == 1
+    assert replay.stats()["missed"] == 0
+
+
+def test_replay_miss_raises(tmp_path):
+    path = str(tmp_path / "tape.jsonl")
+    Cassette(path, mode="record").close()
+    replay = Cassette(path, mode="replay")
+
+    with pytest.raises(CassetteMiss):
+        CassetteChatModel(None, replay).invoke("never recorded")
+    with pytest.raises(CassetteMiss):
+        CassetteEmbeddings(FakeEmbeddings(), replay).embed_query("never recorded")
+    assert replay.stats()["missed"] == 2
+
+
+def test_agent_with_cassette_bypasses_persistent_caches(tmp_path, monkeypatch):
+    from src.build_agent import build_email_agent
+
+    monkeypatch.delenv("TAVILY_API_KEY", raising=False)
+    (tmp_path / "data").mkdir()
+    tape = tmp_path / "tape.jsonl"
+    tape.write_text("")
+
+    _, _, vector_store, _, _, services = build_email_agent(
+        db_path=str(tmp_path / "agent.db"),
+        vector_db_path=str(tmp_path / "chroma"),
+        vector_data_dir=str(tmp_path / "data"),
+        enable_langfuse=False,
+        enable_metrics=False,
+        cassette_path=str(tape),
+        cassette_mode="replay"
+    )
+
+    assert services["llm_cache"] is None
+    assert services["semantic_cache"] is None
+    assert services["search_cache"] is None
+    assert isinstance(vector_store.embeddings, CassetteEmbeddings)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["data", "tape.jsonl"]
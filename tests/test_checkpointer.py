@@ -0,0 +1,82 @@
+from typing import TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+
+from src.checkpointer import WriteBehindSqliteSaver
+from src.utils import get_checkpointer, run_options
+
+
+class State(TypedDict):
+    steps: list
+
+
+def _graph(checkpointer):
+    graph = StateGraph(State)
+    for name in ("a", "b", "c"):
+        graph.add_node(name, lambda state, name=name: {"steps": state["steps"] + [name]})
+    graph.add_edge(START, "a")
+    graph.add_edge("a", "b")
+    graph.add_edge("b", "c")
+    graph.add_edge("c", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def _run(db_path, durability, threads=3):
+    with get_checkpointer(db_path, durability=durability) as saver:
+        app = _graph(saver)
+        for i in range(threads):
+            app.invoke({"steps": []}, config={"configurable": {"thread_id": f"t{i}"}}, **run_options(app))
+        return saver.stats()
+
+
+def _reopened_steps(db_path, thread_id="t0"):
+    with get_checkpointer(db_path) as saver:
+        return _graph(saver).get_state({"configurable": {"thread_id": thread_id}}).values["steps"]
+
+
+def test_default_durability_commits_every_step(tmp_path):
+    with get_checkpointer(str(tmp_path / "cp.db")) as saver:
+        assert saver.durability == "step"
+        assert run_options(_graph(saver)) == {"durability": "sync"}
+
+
+@pytest.mark.parametrize("durability", ["step", "interrupt", "async"])
+def test_every_mode_persists_the_final_state(tmp_path, durability):
+    db_path = str(tmp_path / "cp.db")
+    _run(db_path, durability)
+
+    assert _reopened_steps(db_path, "t2") == ["a", "b", "c"]
+
+
+def test_async_mode_batches_commits(tmp_path):
+    step = _run(str(tmp_path / "step.db"), "step")
+    batched = _run(str(tmp_path / "async.db"), "async")
+
+    assert batched["writes"] == step["writes"]
+    assert step["commits"] >= step["writes"]
+    assert batched["commits"] < step["commits"]
+    assert batched["queued"] == 0
+
+
+def test_interrupt_mode_saves_once_per_run(tmp_path):
+    step = _run(str(tmp_path / "step.db"), "step", threads=1)
+    interrupt = _run(str(tmp_path / "interrupt.db"), "interrupt", threads=1)
+
+    assert interrupt["writes"] < step["writes"]
+
+
+def test_queued_writes_are_visible_before_their_commit(tmp_path):
+    with get_checkpointer(str(tmp_path / "cp.db"), durability="async") as saver:
+        saver.commit_interval = 10.0  # nothing is committed during the test
+        app = _graph(saver)
+        config = {"configurable": {"thread_id": "t"}}
+        app.invoke({"steps": []}, config=config, **run_options(app))
+
+        assert app.get_state(config).values["steps"] == ["a", "b", "c"]
+
+
+def test_unknown_durability_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        with WriteBehindSqliteSaver.from_conn_string(str(tmp_path / "cp.db"), durability="never"):
+            pass
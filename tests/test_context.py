@@ -0,0 +1,86 @@
+from src.context import RAW_CONTENT_CHARS, _cached_similarities, _split_units, compress_text, pack_web_results
+from src.embedding_cache import CachedEmbeddings
+from test_vector_db import FakeEmbeddings
+
+
+def _result(url, content, raw_content=None):
+    result = {"url": url, "title": url, "content": content}
+    if raw_content is not None:
+        result["raw_content"] = raw_content
+    return result
+
+
+def test_web_packing_ranks_passages_of_the_page_text():
+    filler = " ".join(f"Navigation item number {i} of the site menu." for i in range(30))
+    raw = f"{filler} Meta announced its quarterly revenue grew 22 percent to 40 billion dollars."
+    results = [
+        _result("https://a.example", "Company news roundup.", raw),
+        _result("https://b.example", "Weather forecast for the weekend."),
+    ]
+
+    web_info, report = pack_web_results(results, "Meta quarterly revenue", budget_tokens=200)
+
+    assert "revenue grew 22 percent" in web_info
+    assert report["passages"] > 2
+    assert report["sources"][0]["url"] == "https://a.example"
+
+
+def test_web_packing_reads_only_the_start_of_long_pages():
+    raw = "Intro sentence about nothing. " * (RAW_CONTENT_CHARS // 30 + 10) + "Meta revenue secret."
+    web_info, _ = pack_web_results([_result("https://a.example", "", raw)], "Meta revenue secret", budget_tokens=2000)
+
+    assert "secret" not in web_info
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+CONTEXT = "\n".join(
+    [f"Sentence {i} about the office plants and the coffee machine schedule." for i in range(40)]
+    + ["Sophie confirmed the Q4 budget review is moved to Friday."]
+)
+
+
+def test_compression_never_embeds_new_sentences(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, str(tmp_path / "cache"))
+
+    compressed, report = compress_text(CONTEXT, "Q4 budget review with Sophie", 0.2, embeddings=embeddings)
+
+    assert model.calls == 0
+    assert "Q4 budget review" in compressed
+    assert report["sentences_kept"] < report["sentences_total"]
+
+
+def test_compression_uses_vectors_already_cached(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, str(tmp_path / "cache"))
+    query = "Q4 budget review with Sophie"
+    sentences = [unit[2] for unit in _split_units(CONTEXT) if unit[1] == "sentence"]
+    embeddings.embed_documents([query] + sentences)
+    model.calls = 0
+
+    assert _cached_similarities(embeddings, query, sentences) is not None
+    compress_text(CONTEXT, query, 0.2, embeddings=embeddings)
+    assert model.calls == 0
+
+
+def test_web_packing_never_embeds_new_passages(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, str(tmp_path / "cache"))
+    results = [_result("https://a.example", "Meta announced its quarterly revenue grew 22 percent.")]
+
+    web_info, _ = pack_web_results(results, "Meta quarterly revenue", embeddings=embeddings)
+
+    assert model.calls == 0
+    assert "22 percent" in web_info
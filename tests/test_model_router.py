@@ -0,0 +1,52 @@
+import pytest
+
+from src.model_router import ModelRouter
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+
+    def invoke(self, prompt, config=None, **kwargs):
+        return self.name
+
+
+def _router(**kwargs):
+    return ModelRouter.from_config("big", "small", lambda model, temperature, tier: FakeModel(model), **kwargs)
+
+
+def test_nodes_use_their_configured_tier():
+    router = _router(config={"intents": {"drafter": {"SUMMARIZE_THREAD": "fast"}}})
+
+    assert router.bind("intent_classifier").invoke("hi") == "small"
+    assert router.bind("drafter").invoke("hi") == "big"
+    assert router.bind("drafter", "SUMMARIZE_THREAD").invoke("hi") == "small"
+
+
+def test_slow_preferred_tier_falls_back_until_the_cooldown_ends():
+    router = _router(latency_slo={"drafter": 1.0})
+
+    router.record("drafter", "quality", 0.5)
+    assert router.select("drafter") == "quality"
+    router.record("drafter", "quality", 5.0)
+    assert router.select("drafter") == "fast"
+    router.record("drafter", "fast", 5.0)  # fallback calls do not extend the period
+    assert router.stats()["nodes"]["drafter"]["fallbacks"] == 1
+
+    router._degraded_until["drafter"] = 0.0  # cool-down over
+    assert router.select("drafter") == "quality"
+    assert router.stats()["nodes"]["drafter"]["latency"] is None
+
+
+def test_nodes_without_slo_never_fall_back():
+    router = _router()
+    router.record("drafter", "quality", 100.0)
+
+    assert router.select("drafter") == "quality"
+
+
+def test_unknown_tiers_and_nodes_are_rejected():
+    with pytest.raises(ValueError):
+        _router(node_tiers={"drafter": "premium"})
+    with pytest.raises(ValueError):
+        _router(latency_slo={"summarizer": 1.0})
@@ -0,0 +1,60 @@
+import pytest
+
+from src.review_rules import ReviewRules
+
+BODY = (
+    "Je vous propose de faire un point sur le plan Q4 jeudi à 14h, "
+    "afin de valider ensemble le budget et les prochaines étapes du projet."
+)
+
+
+def _draft(greeting="Bonjour Sophie,", closing="Cordialement,\nMarc", subject="Subject: Point Q4", body=BODY):
+    return "\n".join(part for part in (subject, "", greeting, body, closing) if part is not None)
+
+
+def test_clean_draft_goes_to_the_llm_reviewer():
+    result = ReviewRules().check(_draft())
+
+    assert result["verdict"] == "llm"
+    assert not result["failures"] and not result["warnings"]
+
+
+def test_bare_name_greeting_and_closing_are_only_warnings():
+    result = ReviewRules().check(_draft(greeting="Sophie,", closing="Marc"))
+
+    assert result["verdict"] == "llm"
+    assert set(result["rules"]) == {"greeting", "closing"}
+    assert not result["failures"]
+
+
+@pytest.mark.parametrize("draft, rule", [
+    (_draft(subject=None), "subject"),
+    (_draft(body=BODY + " Merci [Name]."), "placeholder"),
+    (_draft(body="Point Q4 ?"), "length"),
+    (_draft(body=BODY + " IBAN : FR76 3000 6000 0112 3456 7890 189."), "iban"),
+])
+def test_clear_defects_reject_without_the_llm(draft, rule):
+    result = ReviewRules().check(draft)
+
+    assert result["verdict"] == "reject"
+    assert rule in result["rules"]
+
+
+def test_sensitive_data_from_the_request_is_allowed():
+    draft = _draft(body=BODY + " Vous pouvez me joindre au 06 12 34 56 78.")
+
+    assert "phone" in ReviewRules().check(draft)["rules"]
+    assert "phone" not in ReviewRules().check(draft, allowed_text="rappelle-moi au 06 12 34 56 78")["rules"]
+
+
+def test_low_risk_policy_skips_the_llm_for_clean_short_drafts():
+    rules = ReviewRules(skip_llm="low_risk")
+
+    assert rules.check(_draft())["verdict"] == "approve"
+    assert rules.check(_draft(closing="Marc"))["verdict"] == "llm"
+    assert rules.stats()["skipped_llm"] == 1
+
+
+def test_unknown_rule_names_are_rejected():
+    with pytest.raises(ValueError):
+        ReviewRules(disabled=("spelling",))
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.search_cache import CachedSearchTool, SearchCache
+
+
+class SlowTool:
+    name = "web_search"
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, tool_input, config=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return [{"url": "https://example.com", "content": tool_input["query"]}]
+
+    async def ainvoke(self, tool_input, config=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return [{"url": "https://example.com", "content": tool_input["query"]}]
+
+
+def _tool(tmp_path, delay=0.2, **kwargs):
+    tool = SlowTool(delay)
+    return tool, CachedSearchTool(tool, SearchCache(str(tmp_path / "search.db")), **kwargs)
+
+
+def test_concurrent_identical_queries_share_one_call(tmp_path):
+    tool, cached = _tool(tmp_path)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cached.invoke({"query": "Meta latest news"})))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert tool.calls == 1
+    assert len(results) == 4 and all(r == results[0] for r in results)
+    assert cached.invoke({"query": "meta  latest news?"}) == results[0]
+    assert tool.calls == 1
+    assert not cached._inflight
+
+
+def test_cancelled_owner_releases_the_query(tmp_path):
+    tool, cached = _tool(tmp_path)
+
+    async def scenario():
+        owner = asyncio.ensure_future(cached.ainvoke({"query": "q"}))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.ensure_future(cached.ainvoke({"query": "q"}))
+        await asyncio.sleep(0.05)
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        # The waiter takes the search over instead of hanging
+        return await asyncio.wait_for(waiter, 2)
+
+    assert asyncio.run(scenario())[0]["content"] == "q"
+    assert tool.calls == 2
+    assert not cached._inflight
+
+
+def test_cancelled_waiter_does_not_cancel_the_search(tmp_path):
+    tool, cached = _tool(tmp_path)
+
+    async def scenario():
+        owner = asyncio.ensure_future(cached.ainvoke({"query": "q"}))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.ensure_future(cached.ainvoke({"query": "q"}))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        return await asyncio.wait_for(owner, 2)
+
+    assert asyncio.run(scenario())[0]["content"] == "q"
+    assert tool.calls == 1
+    assert not cached._inflight
+
+
+def test_failed_cache_write_still_settles_waiters(tmp_path):
+    tool, cached = _tool(tmp_path)
+
+    def broken_put(*args):
+        raise RuntimeError("disk full")
+
+    cached.cache.put = broken_put
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cached.invoke({"query": "q"}))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=2)
+
+    assert len(results) == 3
+    assert not cached._inflight
+
+
+def test_waiters_give_up_after_wait_timeout(tmp_path):
+    tool, cached = _tool(tmp_path, delay=0.5, wait_timeout=0.05)
+    errors = []
+
+    def wait():
+        try:
+            cached.invoke({"query": "q"})
+        except Exception as e:
+            errors.append(e)
+
+    owner = threading.Thread(target=lambda: cached.invoke({"query": "q"}))
+    owner.start()
+    time.sleep(0.05)
+    wait()
+    owner.join()
+
+    assert len(errors) == 1 and isinstance(errors[0], TimeoutError)
+
+
+def test_claim_finds_results_stored_after_a_miss(tmp_path):
+    tool, cached = _tool(tmp_path)
+    key = cached.cache.make_key("web_search", "q")
+    assert cached.cache.get(key) is None
+    cached.cache.put(key, "q", [{"content": "done"}])  # another caller settled meanwhile
+
+    future, owner, hit = cached._claim(key)
+
+    assert (future, owner) == (None, False)
+    assert hit == [{"content": "done"}]
+    assert not cached._inflight
@@ -0,0 +1,42 @@
+import sqlite3
+
+from src.semantic_cache import SemanticCache
+from test_vector_db import FakeEmbeddings
+
+
+def _rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [text for (text,) in conn.execute("SELECT text FROM semantic_cache ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def test_entries_survive_a_reopen(tmp_path):
+    db_path = str(tmp_path / "semantic.db")
+    cache = SemanticCache(db_path, FakeEmbeddings())
+    cache.store("intent_classifier", "Reply to Sophie about Q4", {"intent": "REPLY_EMAIL"})
+    cache.close()
+
+    reopened = SemanticCache(db_path, FakeEmbeddings())
+
+    assert reopened.lookup("intent_classifier", "Reply to Sophie about Q4") == {"intent": "REPLY_EMAIL"}
+    assert reopened.lookup("web_search", "Reply to Sophie about Q4") is None
+    assert reopened.lookup("intent_classifier", "Summarize the thread") is None
+    reopened.close()
+
+
+def test_eviction_deletes_the_least_recently_used_rows(tmp_path):
+    db_path = str(tmp_path / "semantic.db")
+    cache = SemanticCache(db_path, FakeEmbeddings(), capacity=2)
+    cache.store("intent_classifier", "a", "A")
+    cache.store("intent_classifier", "b", "B")
+    assert cache.lookup("intent_classifier", "a") == "A"  # "b" is now the oldest
+    cache.store("intent_classifier", "c", "C")
+    cache.close()
+
+    assert _rows(db_path) == ["a", "c"]
+    reopened = SemanticCache(db_path, FakeEmbeddings(), capacity=1)
+    assert reopened.stats()["entries"] == {"intent_classifier": 1}
+    assert _rows(db_path) == ["c"]
+    reopened.close()
@@ -0,0 +1,156 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import server
+from src.server import TaskConflict, TaskManager, TaskNotFound
+
+
+class FakeApp:
+    """Compiled-graph stand-in: per-thread state dicts and a gated run."""
+
+    def __init__(self):
+        self.states = {}
+        self.gate = threading.Event()
+        self.gate.set()
+        self.runs = 0
+        self.manager = None
+        self.read_under_lock = False
+
+    def get_state(self, config):
+        if self.manager is not None and self.manager._lock.locked():
+            self.read_under_lock = True
+        return SimpleNamespace(values=dict(self.states.get(config["configurable"]["thread_id"], {})))
+
+    def update_state(self, config, values):
+        self.states.setdefault(config["configurable"]["thread_id"], {}).update(values)
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    app = FakeApp()
+
+    def fake_events(app, inputs, config):
+        app.runs += 1
+        app.gate.wait(5)
+        app.update_state(config, {"draft": "Subject: Q4\n\nBonjour Sophie,", "intent": "NEW_EMAIL"})
+        yield {"type": "node", "node": "drafter", "draft": "Subject: Q4"}
+
+    monkeypatch.setattr(server, "graph_events", fake_events)
+    manager = TaskManager(app, llm=None, max_concurrent=2, max_queued=2)
+    app.manager = manager
+    yield manager
+    app.gate.set()
+    manager.shutdown(timeout=5)
+
+
+def _wait_for(task, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while task.status != status and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert task.status == status
+
+
+def test_task_runs_to_review_and_can_be_approved(manager):
+    task = manager.create("Write to Sophie")
+    _wait_for(task, "awaiting_review")
+
+    state = manager.approve(task.id)
+
+    assert state["status"] == "approved"
+    assert state["final_email"].startswith("Subject: Q4")
+
+
+def test_running_task_refuses_resume_approve_and_edit(manager):
+    manager.app.gate.clear()
+    task = manager.create("Write to Sophie")
+    _wait_for(task, "running")
+
+    for call in (lambda: manager.resume(task.id), lambda: manager.approve(task.id),
+                 lambda: manager.edit(task.id, "new draft"), lambda: manager._schedule(task, None)):
+        with pytest.raises(TaskConflict):
+            call()
+
+    manager.app.gate.set()
+    _wait_for(task, "awaiting_review")
+    assert manager.app.runs == 1
+
+
+def test_concurrent_resumes_start_one_run(manager):
+    task = manager.create("Write to Sophie")
+    _wait_for(task, "awaiting_review")
+    manager.app.gate.clear()
+    outcomes = []
+
+    def resume():
+        try:
+            manager.resume(task.id)
+            outcomes.append("scheduled")
+        except TaskConflict:
+            outcomes.append("conflict")
+
+    threads = [threading.Thread(target=resume) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manager.app.gate.set()
+    _wait_for(task, "awaiting_review")
+
+    assert outcomes.count("scheduled") == 1
+    assert manager.app.runs == 2
+
+
+def test_edit_holds_the_task_until_the_review_is_written(manager, monkeypatch):
+    task = manager.create("Write to Sophie")
+    _wait_for(task, "awaiting_review")
+    reviewing, release = threading.Event(), threading.Event()
+
+    def slow_review(values, llm, rules=None):
+        reviewing.set()
+        release.wait(5)
+        return {"review_approved": True}
+
+    monkeypatch.setattr(server, "reviewer_node", slow_review)
+    editor = threading.Thread(target=manager.edit, args=(task.id, "Subject: Q4\n\nBonjour,"))
+    editor.start()
+    reviewing.wait(5)
+
+    assert task.status == "updating"
+    with pytest.raises(TaskConflict):
+        manager.resume(task.id)
+
+    release.set()
+    editor.join()
+    assert task.status == "awaiting_review"
+    assert manager.app.runs == 1
+
+
+def test_failed_update_restores_the_status(manager):
+    task = manager.create("Write to Sophie")
+    _wait_for(task, "awaiting_review")
+    manager.app.states[task.id]["draft"] = ""
+
+    with pytest.raises(TaskConflict):
+        manager.approve(task.id)
+
+    assert task.status == "awaiting_review"
+
+
+def test_evicted_task_is_reloaded_without_holding_the_lock(manager):
+    task = manager.create("Write to Sophie")
+    _wait_for(task, "awaiting_review")
+    manager.task_ttl = 0.0
+    time.sleep(0.01)
+    with manager._lock:
+        manager._evict()
+    assert task.id not in manager.tasks
+
+    reloaded = manager._task(task.id)
+
+    assert reloaded is not task and reloaded.status == "awaiting_review"
+    assert not manager.app.read_under_lock
+    with pytest.raises(TaskNotFound):
+        manager._task("unknown-id")
@@ -0,0 +1,51 @@
+import hashlib
+
+from langchain_core.embeddings import Embeddings
+
+from src.vector_db import Chroma, load_manifest, save_manifest, sync_vector_store
+
+
+class FakeEmbeddings(Embeddings):
+    def _embed(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255 for b in digest[:16]]
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def _store(tmp_path, name="synced"):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "sophie.md").write_text("# Sophie\n\nBonjour Sophie, point sur le plan Q4.\n", encoding="utf-8")
+    persist = str(tmp_path / "chroma")
+    store = Chroma(collection_name=name, persist_directory=persist, embedding_function=FakeEmbeddings())
+    sync_vector_store(store, persist, str(data_dir))
+    return store, persist
+
+
+def test_sync_against_missing_dir_deletes_nothing(tmp_path):
+    store, persist = _store(tmp_path)
+    count = len(store.get()["ids"])
+    assert count > 0
+
+    stats = sync_vector_store(store, persist, str(tmp_path / "vector_data"))
+
+    assert stats["removed"] == 0
+    assert len(store.get()["ids"]) == count
+    assert load_manifest(persist)["files"]
+    assert not (tmp_path / "vector_data").exists()
+
+
+def test_legacy_adoption_keeps_sources_missing_from_dir(tmp_path):
+    store, persist = _store(tmp_path, name="legacy")
+    count = len(store.get()["ids"])
+    save_manifest(persist, {})  # index created before manifests existed
+
+    stats = sync_vector_store(store, persist, str(tmp_path / "vector_data"))
+
+    assert stats["removed"] == 0
+    assert len(store.get()["ids"]) == count